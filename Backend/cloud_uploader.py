@@ -1,20 +1,18 @@
-from Backend import cloudinary_config 
+from Backend import cloudinary_config, evidence_encoding
 import cloudinary.uploader
-import cv2
-import tempfile
 import os
 
 def upload_image_to_cloudinary(image_path_or_array, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
     folder = f"cheating_snapshots/{class_id}/face_{face_id}"
     try:
         if isinstance(image_path_or_array, str):
-            upload_path = image_path_or_array
-            temp_file_created = False
+            upload_source = image_path_or_array
         else:
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
-                upload_path = tmp_file.name
-                cv2.imwrite(upload_path, image_path_or_array)
-                temp_file_created = True
+            # Encoded straight into memory; no temp file per snapshot
+            upload_source = evidence_encoding.encode_jpeg(image_path_or_array)
+            if upload_source is None:
+                print("[Cloudinary Image Upload Error] Could not encode image")
+                return None
 
         # Prepare tags including class_id and face_id if not already in tags
         final_tags = tags if tags else []
@@ -24,30 +22,25 @@ def upload_image_to_cloudinary(image_path_or_array, public_id=None, tags=None, c
             final_tags.append(face_id)
 
         response = cloudinary.uploader.upload(
-            upload_path,
+            upload_source,
             folder=folder,
             public_id=public_id,
             tags=final_tags
         )
 
-        # Clean up temp file if created
-        if temp_file_created:
-            try:
-                os.remove(upload_path)
-            except Exception as e:
-                print(f"[Temp file cleanup error] {e}")
-
         return response.get('secure_url')
     except Exception as e:
         print(f"[Cloudinary Image Upload Error] {e}")
         return None
 
-def upload_video_to_cloudinary(video_path, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+def upload_video_to_cloudinary(video_path_or_file, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+    """Upload an MP4 given as a path or as a file object opened for binary reading."""
     folder = f"cheating_videos/{class_id}/face_{face_id}"
     try:
-        if not os.path.exists(video_path) or os.path.getsize(video_path) < 1000:
-            print(f"[ERROR] Video path is invalid or too small: {video_path}")
-            return None
+        if isinstance(video_path_or_file, str):
+            if not os.path.exists(video_path_or_file) or os.path.getsize(video_path_or_file) < 1000:
+                print(f"[ERROR] Video path is invalid or too small: {video_path_or_file}")
+                return None
 
         final_tags = tags if tags else []
         if class_id not in final_tags:
@@ -56,7 +49,7 @@ def upload_video_to_cloudinary(video_path, public_id=None, tags=None, class_id="
             final_tags.append(face_id)
 
         response = cloudinary.uploader.upload_large(
-            video_path,
+            video_path_or_file,
             resource_type="video",
             folder=folder,
             public_id=public_id,
@@ -71,42 +64,39 @@ def upload_video_to_cloudinary(video_path, public_id=None, tags=None, class_id="
     except Exception as e:
         print(f"[Cloudinary Video Upload Error] {e}")
         return None
-    
-def upload_video_clip_from_frames(frames, class_id="LR-10", face_id="unknown_face", fps=20):
-    import tempfile
-    import cv2
 
+def upload_video_clip_from_frames(frames, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face", fps=None):
     if not frames:
         print("[Upload Clip] No frames to write.")
         return None
 
-    height, width = frames[0].shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp_video:
-            temp_path = tmp_video.name
-            out = cv2.VideoWriter(temp_path, fourcc, fps, (width, height))
-
-            for frame in frames:
-                if frame.shape[:2] != (height, width):
-                    frame = cv2.resize(frame, (width, height))
-                out.write(frame)
-
-            out.release()
-
-            # Upload to Cloudinary using your existing function
+        with evidence_encoding.encoded_clip(frames, fps=fps) as clip:
+            if clip is None:
+                return None
             return upload_video_to_cloudinary(
-                video_path=temp_path,
+                clip,
+                public_id=public_id,
+                tags=tags,
                 class_id=class_id,
                 face_id=face_id
             )
     except Exception as e:
         print(f"[Upload Clip Error] {e}")
         return None
-    finally:
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception as e:
-                print(f"[Temp Video Cleanup Error] {e}")
\ No newline at end of file
+
+def thumbnail_url(url, width=240, height=180, resource_type="image"):
+    """Cloudinary delivery URL for a small thumbnail of an uploaded asset.
+
+    Images are resized on Cloudinary's side; for videos the first frame is
+    delivered as a JPEG poster. URLs that are not Cloudinary uploads are
+    returned unchanged.
+    """
+    if not url or "/upload/" not in url:
+        return url
+    transform = f"c_fill,w_{width},h_{height},q_auto,f_auto"
+    if resource_type == "video":
+        transform = "so_0," + transform
+        url = os.path.splitext(url)[0] + ".jpg"
+    base, path = url.split("/upload/", 1)
+    return f"{base}/upload/{transform}/{path}"
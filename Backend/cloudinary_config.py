@@ -1,8 +1,15 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
 import cloudinary
 
-cloudinary.config(
-    cloud_name="dbxzu8vni",
-    api_key="833318263948862",
-    api_secret="Qt5pRmE0iusTDdFq61k3S33hwLs",
-    secure=True
-)
\ No newline at end of file
+# Credentials come from the environment (or .env): either CLOUDINARY_URL, which the SDK
+# reads on its own, or the three CLOUDINARY_* values below.
+_settings = {
+    "cloud_name": os.getenv("CLOUDINARY_CLOUD_NAME"),
+    "api_key": os.getenv("CLOUDINARY_API_KEY"),
+    "api_secret": os.getenv("CLOUDINARY_API_SECRET"),
+}
+
+cloudinary.config(secure=True, **{key: value for key, value in _settings.items() if value})
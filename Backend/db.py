@@ -1,12 +1,16 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import atexit
 import os
 from pymongo import MongoClient
 from datetime import datetime
 import numpy as np
 from urllib.parse import quote_plus
 
+from Backend import log_rollups
+from Backend.log_batcher import LogBatcher
+
 MONGO_USERNAME = os.getenv("MONGO_USERNAME")
 MONGO_PASSWORD = os.getenv("MONGO_PASSWORD")
 
@@ -23,12 +27,25 @@ MONGO_URI = f"mongodb+srv://{MONGO_USERNAME}:{encoded_password}@{MONGO_CLUSTER}/
 client = MongoClient(MONGO_URI)
 db = client[MONGO_DBNAME]
 logs_collection = db["logs"]
+# Per-hour counters by class, activity and severity, kept in step with "logs" by the batcher
+rollups_collection = db["log_rollups"]
+
+# Logs are written behind the caller in batches; see Backend/log_batcher.py
+log_batcher = LogBatcher(
+    logs_collection,
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("LOG_FLUSH_SECONDS", "2")),
+    journal_path=os.getenv("LOG_JOURNAL_PATH", "logs_journal.jsonl"),
+    max_buffered=int(os.getenv("LOG_MAX_BUFFERED", "10000")),
+    on_stored=lambda docs: log_rollups.apply_rollups(docs, rollups_collection),
+)
+atexit.register(log_batcher.close)
 
 print(f"Username: {MONGO_USERNAME}")
 print(f"Password: {MONGO_PASSWORD}")
 
 
-def insert_log(class_id, face_id, activity, severity, image_url=None, video_url=None):
+def insert_log(class_id, face_id, activity, severity, image_url=None, video_url=None, timestamp=None):
     if isinstance(image_url, np.ndarray):
         raise TypeError("insert_log got image_url as numpy array! Should be a URL string or None.")
     if isinstance(video_url, list) or (
@@ -37,7 +54,7 @@ def insert_log(class_id, face_id, activity, severity, image_url=None, video_url=
         raise TypeError("insert_log got video_url as raw video frames! Should be a URL string or None.")
 
     log = {
-        "timestamp": datetime.utcnow(),
+        "timestamp": timestamp or datetime.utcnow(),
         "class_id": class_id,
         "face_id": face_id,
         "activity": activity,
@@ -46,8 +63,4 @@ def insert_log(class_id, face_id, activity, severity, image_url=None, video_url=
         "video_url": video_url
     }
 
-    try:
-        logs_collection.insert_one(log)
-        print("[MongoDB] Log inserted successfully")
-    except Exception as e:
-        print(f"[MongoDB ERROR] {e}")
+    log_batcher.add(log)
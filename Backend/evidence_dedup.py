@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+# A face that trips several activities within seconds produces near-identical crops.
+# Snapshots whose dHash is within DEDUP_MAX_DISTANCE bits (of 64) of one stored for the
+# same face in the last DEDUP_WINDOW_SECONDS reuse that upload's ref instead of uploading again.
+DEDUP_ENABLED = os.getenv("EVIDENCE_DEDUP", "1") == "1"
+DEDUP_MAX_DISTANCE = int(os.getenv("EVIDENCE_DEDUP_MAX_DISTANCE", "6"))
+DEDUP_WINDOW_SECONDS = float(os.getenv("EVIDENCE_DEDUP_WINDOW_SECONDS", "60"))
+DEDUP_MAX_FACES = int(os.getenv("EVIDENCE_DEDUP_MAX_FACES", "256"))
+DEDUP_HASHES_PER_FACE = int(os.getenv("EVIDENCE_DEDUP_HASHES_PER_FACE", "8"))
+
+HASH_SIZE = 8
+_BIT_WEIGHTS = 1 << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)
+
+
+def dhash(image):
+    """64-bit difference hash: signs of the horizontal gradients of a 9x8 grayscale thumbnail."""
+    if image is None or image.size == 0:
+        return None
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(_BIT_WEIGHTS[bits].sum())
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class SnapshotDeduper:
+    """Bounded LRU of recently stored snapshot hashes per (class_id, face_id).
+
+    Holds at most `max_faces` faces (least recently used evicted first) and the
+    last `per_face` hashes of each, so memory stays flat over a long exam.
+    """
+
+    def __init__(self, max_distance=None, window_seconds=None, max_faces=None, per_face=None):
+        self.max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.window_seconds = DEDUP_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.max_faces = DEDUP_MAX_FACES if max_faces is None else max_faces
+        self.per_face = DEDUP_HASHES_PER_FACE if per_face is None else per_face
+        self._faces = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, image_hash, now):
+        """Ref of a recent snapshot of `key` within max_distance of `image_hash`, else None."""
+        if image_hash is None:
+            return None
+        with self._lock:
+            recent = self._faces.get(key)
+            if recent:
+                self._faces.move_to_end(key)
+                for stored_at, stored_hash, ref in reversed(recent):
+                    if now - stored_at <= self.window_seconds and hamming(stored_hash, image_hash) <= self.max_distance:
+                        self.hits += 1
+                        return ref
+            self.misses += 1
+            return None
+
+    def remember(self, key, image_hash, ref, now):
+        if image_hash is None or not ref:
+            return
+        with self._lock:
+            recent = self._faces.get(key)
+            if recent is None:
+                recent = self._faces[key] = deque(maxlen=self.per_face)
+            self._faces.move_to_end(key)
+            recent.append((now, image_hash, ref))
+            while len(self._faces) > self.max_faces:
+                self._faces.popitem(last=False)
+
+
+deduper = SnapshotDeduper()
@@ -0,0 +1,95 @@
+import atexit
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+# Evidence snapshots are JPEG-encoded in memory; clips go to a spool file on a RAM-backed
+# filesystem (/dev/shm when available) because cv2.VideoWriter can only write to a path.
+JPEG_QUALITY = int(os.getenv("EVIDENCE_JPEG_QUALITY", "85"))
+MAX_IMAGE_SIDE = int(os.getenv("EVIDENCE_MAX_IMAGE_SIDE", "640"))
+MAX_CLIP_SIDE = int(os.getenv("EVIDENCE_MAX_CLIP_SIDE", "640"))
+CLIP_FPS = float(os.getenv("EVIDENCE_CLIP_FPS", "10"))
+MAX_CLIP_BYTES = int(os.getenv("EVIDENCE_MAX_CLIP_MB", "50")) * 1024 * 1024
+SPOOL_DIR = os.getenv("EVIDENCE_SPOOL_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+_local = threading.local()
+_spool_paths = set()
+
+
+def limit_size(image, max_side):
+    """Downscale so the longest side is at most max_side (no-op when it already fits or max_side <= 0)."""
+    h, w = image.shape[:2]
+    if max_side <= 0 or max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    return cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def encode_jpeg(image, quality=None, max_side=None):
+    """JPEG-encode a BGR image into an in-memory file object, or None if it cannot be encoded."""
+    if image is None or image.size == 0:
+        return None
+    image = limit_size(image, MAX_IMAGE_SIDE if max_side is None else max_side)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY if quality is None else quality])
+    if not ok:
+        return None
+    data = io.BytesIO(buffer.tobytes())
+    data.name = "evidence.jpg"
+    return data
+
+
+def _spool_path():
+    # One spool file per thread, overwritten by every clip that thread encodes
+    path = getattr(_local, "spool_path", None)
+    if path is None:
+        path = os.path.join(SPOOL_DIR, f"evidence_{os.getpid()}_{threading.get_ident()}.mp4")
+        _local.spool_path = path
+        _spool_paths.add(path)
+    return path
+
+
+@atexit.register
+def remove_spool_files():
+    for path in list(_spool_paths):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def encoded_clip(frames, fps=None, max_side=None):
+    """Encode frames to MP4 in this thread's spool file and yield it opened for reading.
+
+    Yields None when there is nothing usable to upload (no frames, a failed
+    encode or a clip over MAX_CLIP_BYTES).
+    """
+    if not frames:
+        yield None
+        return
+    max_side = MAX_CLIP_SIDE if max_side is None else max_side
+    first = limit_size(frames[0], max_side)
+    height, width = first.shape[:2]
+    path = _spool_path()
+
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps or CLIP_FPS, (width, height))
+    try:
+        for frame in frames:
+            frame = limit_size(frame, max_side)
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height))
+            out.write(frame)
+    finally:
+        out.release()
+
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size < 1000 or size > MAX_CLIP_BYTES:
+        print(f"[Evidence] Clip not uploaded, encoded size {size} bytes")
+        yield None
+        return
+    with open(path, "rb") as f:
+        yield f
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+
+from bson import json_util
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class LogBatcher:
+    """Write-behind buffer that stores log documents with insert_many.
+
+    Documents are flushed when `batch_size` of them are buffered or every
+    `flush_interval` seconds. A failed batch is retried with exponential
+    backoff; if the database stays unreachable the batch is appended to a
+    JSON-lines journal on disk and replayed after the next successful write.
+    While a flush is stuck retrying, a buffer that grows past `max_buffered`
+    documents is spilled straight to the journal so memory stays bounded.
+
+    Works with any pymongo-compatible collection (e.g. a mongomock collection in tests).
+    `on_stored(docs)` is called with every group of newly stored documents,
+    e.g. to keep rollup counters up to date.
+    """
+
+    def __init__(self, collection, batch_size=100, flush_interval=2.0, max_retries=4,
+                 backoff_base=0.5, journal_path="logs_journal.jsonl", on_stored=None, start=True,
+                 max_buffered=10000):
+        self.collection = collection
+        self.on_stored = on_stored
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.journal_path = journal_path
+        self.max_buffered = max(max_buffered, batch_size)
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+        self.inserted = 0
+        self.journaled = 0
+        self.replayed = 0
+
+        if start:
+            self.start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mongo-log-batcher", daemon=True)
+        self._thread.start()
+
+    def add(self, doc):
+        spill = None
+        with self._cond:
+            self._buffer.append(doc)
+            if len(self._buffer) > self.max_buffered:
+                spill, self._buffer = self._buffer, []
+            elif len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        if spill:
+            self._journal(spill)
+
+    def _take(self):
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of documents stored in the DB."""
+        batch = self._take()
+        if not batch:
+            return 0
+        with self._write_lock:
+            failed = self._write_with_retry(batch)
+            if failed:
+                self._journal(failed)
+                return len(batch) - len(failed)
+            self._replay_journal()
+        return len(batch)
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    # ======= Writing =======
+    def _insert(self, docs):
+        """insert_many(ordered=False). Returns the documents that were not stored."""
+        try:
+            self.collection.insert_many(docs, ordered=False)
+            self._notify_stored(docs)
+            return []
+        except Exception as e:
+            details = getattr(e, "details", None)
+            if not details or "writeErrors" not in details:
+                raise
+            # Duplicate keys come from documents stored by an earlier attempt of this batch
+            error_codes = {err["index"]: err.get("code") for err in details["writeErrors"]}
+            self._notify_stored([doc for i, doc in enumerate(docs) if i not in error_codes])
+            return [doc for i, doc in enumerate(docs) if i in error_codes and error_codes[i] != DUPLICATE_KEY_ERROR]
+
+    def _notify_stored(self, docs):
+        if not docs or self.on_stored is None:
+            return
+        try:
+            self.on_stored(docs)
+        except Exception as e:
+            print(f"[MongoDB ERROR] on_stored hook failed: {e}")
+
+    def _write_with_retry(self, docs):
+        pending = docs
+        for attempt in range(self.max_retries + 1):
+            try:
+                stored = len(pending)
+                pending = self._insert(pending)
+                self.inserted += stored - len(pending)
+                if not pending:
+                    return []
+            except Exception as e:
+                print(f"[MongoDB ERROR] Batch of {len(pending)} failed (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_base * (2 ** attempt))
+        return pending
+
+    # ======= On-disk journal =======
+    def _journal(self, docs):
+        try:
+            with self._journal_lock, open(self.journal_path, "a", encoding="utf-8") as f:
+                for doc in docs:
+                    f.write(json_util.dumps(doc) + "\n")
+            self.journaled += len(docs)
+            print(f"[MongoDB] Database unreachable, journaled {len(docs)} logs to {self.journal_path}")
+        except OSError as e:
+            print(f"[MongoDB ERROR] Could not write journal, {len(docs)} logs lost: {e}")
+
+    def _replay_journal(self):
+        replay_path = self.journal_path + ".replay"
+        # add() may spill to the journal at any time; take the file over under the same lock
+        with self._journal_lock:
+            leftover = os.path.exists(replay_path)
+            if os.path.exists(self.journal_path):
+                if leftover:
+                    # A replay that crashed left its file behind; add the journal to it instead of overwriting it
+                    with open(self.journal_path, encoding="utf-8") as src, open(replay_path, "a", encoding="utf-8") as dst:
+                        dst.writelines(src)
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, replay_path)
+            elif not leftover:
+                return
+        with open(replay_path, encoding="utf-8") as f:
+            docs = [json_util.loads(line) for line in f if line.strip()]
+
+        failed = []
+        for start in range(0, len(docs), self.batch_size):
+            chunk = docs[start:start + self.batch_size]
+            if failed:
+                failed.extend(chunk)
+                continue
+            try:
+                failed.extend(self._insert(chunk))
+            except Exception as e:
+                print(f"[MongoDB ERROR] Journal replay failed: {e}")
+                failed.extend(chunk)
+        replayed = len(docs) - len(failed)
+        self.replayed += replayed
+        if failed:
+            self._journal(failed)
+        os.remove(replay_path)
+        if replayed:
+            print(f"[MongoDB] Replayed {replayed} journaled logs")
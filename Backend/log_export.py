@@ -0,0 +1,106 @@
+import csv
+import os
+import tempfile
+
+from Backend import log_queries
+
+EXPORT_CHUNK_SIZE = 5000
+# Excel files are built in memory by openpyxl, so only small exports may use it
+EXCEL_MAX_ROWS = 50000
+
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+class ExportTooLarge(Exception):
+    pass
+
+
+def iter_chunks(query, chunk_size=EXPORT_CHUNK_SIZE, fields=None, collection=None):
+    """Yield the matching logs as DataFrames of at most `chunk_size` rows, newest first.
+
+    Documents are pulled from a single Mongo cursor, so only one chunk is held in memory.
+    """
+    collection = log_queries._collection(collection)
+    cursor = (
+        collection.find(query, log_queries.projection(fields))
+        .sort([("timestamp", -1), ("_id", -1)])
+        .batch_size(chunk_size)
+    )
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield _chunk_frame(chunk, fields)
+            chunk = []
+    if chunk:
+        yield _chunk_frame(chunk, fields)
+
+
+def _chunk_frame(docs, fields):
+    df = log_queries.docs_to_frame(docs, fields=fields).drop(columns="_id")
+    # Mixed int/str face ids would otherwise give every chunk a different column type
+    return df.astype({col: "string" for col in df.columns if col != "timestamp"})
+
+
+def write_csv(query, path, **kwargs):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(iter_chunks(query, **kwargs)):
+            chunk.to_csv(f, index=False, header=i == 0, quoting=csv.QUOTE_MINIMAL)
+            rows += len(chunk)
+    return rows
+
+
+def write_parquet(query, path, **kwargs):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in iter_chunks(query, **kwargs):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_excel(query, path, max_rows=EXCEL_MAX_ROWS, collection=None, **kwargs):
+    import pandas as pd
+
+    total = log_queries.count(query, collection=collection)
+    if total > max_rows:
+        raise ExportTooLarge(f"{total} rows is over the Excel limit of {max_rows}; use CSV or Parquet")
+    chunks = list(iter_chunks(query, collection=collection, **kwargs))
+    df = pd.concat(chunks, ignore_index=True) if chunks else log_queries.docs_to_frame([]).drop(columns="_id")
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False)
+    return len(df)
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet, "Excel": write_excel}
+
+
+def export_logs(query, export_format, directory=None, **kwargs):
+    """Write the matching logs to a temporary file. Returns (path, rows, mime)."""
+    suffix, mime = EXPORT_FORMATS[export_format]
+    fd, path = tempfile.mkstemp(prefix="cheating_logs_", suffix=suffix, dir=directory)
+    os.close(fd)
+    try:
+        rows = WRITERS[export_format](query, path, **kwargs)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, rows, mime
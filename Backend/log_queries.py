@@ -0,0 +1,96 @@
+from datetime import datetime, time as dt_time
+
+import pandas as pd
+
+from Backend import db
+
+LOG_FIELDS = ["timestamp", "class_id", "face_id", "activity", "severity", "image_url", "video_url"]
+DEFAULT_PAGE_SIZE = 50
+
+
+def _collection(collection):
+    return db.logs_collection if collection is None else collection
+
+
+def ensure_indexes(collection=None):
+    """Create the indexes every dashboard query relies on (no-op if they already exist)."""
+    collection = _collection(collection)
+    collection.create_index([("class_id", 1), ("timestamp", -1)])
+    collection.create_index([("severity", 1), ("timestamp", -1)])
+    collection.create_index([("timestamp", -1), ("_id", -1)])
+
+
+def build_filter(severity=None, class_id=None, start_date=None, end_date=None, extra=None):
+    """Mongo filter for the dashboard controls; "All"/None means no restriction."""
+    query = {}
+    if severity and severity != "All":
+        query["severity"] = severity
+    if class_id and class_id != "All":
+        query["class_id"] = class_id
+    if start_date or end_date:
+        ts = {}
+        if start_date:
+            ts["$gte"] = datetime.combine(start_date, dt_time.min)
+        if end_date:
+            ts["$lte"] = datetime.combine(end_date, dt_time.max)
+        query["timestamp"] = ts
+    if extra:
+        query.update(extra)
+    return query
+
+
+def projection(fields=None):
+    return {field: 1 for field in (fields or LOG_FIELDS)}
+
+
+def fetch_page(query, page_size=DEFAULT_PAGE_SIZE, after=None, fields=None, collection=None):
+    """One page of logs, newest first, using keyset pagination.
+
+    `after` is the cursor returned for the previous page. Returns (docs, next_cursor);
+    next_cursor is None on the last page.
+    """
+    collection = _collection(collection)
+    if after is not None:
+        after_ts, after_id = after
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$lt": after_ts}},
+            {"timestamp": after_ts, "_id": {"$lt": after_id}},
+        ]}]}
+    docs = list(
+        collection.find(query, projection(fields))
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(page_size + 1)
+    )
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = (docs[-1]["timestamp"], docs[-1]["_id"])
+    return docs, next_cursor
+
+
+def count(query, collection=None):
+    return _collection(collection).count_documents(query)
+
+
+def distinct_class_ids(collection=None):
+    return sorted(str(c) for c in _collection(collection).distinct("class_id") if c is not None)
+
+
+def date_bounds(query=None, collection=None):
+    """(oldest, newest) timestamp matching the query, or (None, None) when empty."""
+    collection = _collection(collection)
+    query = query or {}
+    oldest = collection.find_one(query, {"timestamp": 1}, sort=[("timestamp", 1)])
+    newest = collection.find_one(query, {"timestamp": 1}, sort=[("timestamp", -1)])
+    if not oldest or not newest:
+        return None, None
+    return oldest["timestamp"], newest["timestamp"]
+
+
+def docs_to_frame(docs, fields=None):
+    fields = fields or LOG_FIELDS
+    df = pd.DataFrame(docs, columns=["_id"] + fields)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    # The dashboard has always called the snapshot URL column "image_path"
+    return df.rename(columns={"image_url": "image_path"})
+
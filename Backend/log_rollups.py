@@ -0,0 +1,104 @@
+from collections import Counter
+
+from pymongo import UpdateOne
+
+# Every rollup document counts the logs of one (class_id, activity, severity, hour)
+ROLLUP_KEYS = ["class_id", "activity", "severity", "bucket"]
+
+
+def bucket_of(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def ensure_rollup_indexes(rollup_collection):
+    rollup_collection.create_index([(key, 1) for key in ROLLUP_KEYS], unique=True)
+    rollup_collection.create_index([("bucket", -1)])
+
+
+def apply_rollups(docs, rollup_collection):
+    """Add freshly stored log documents to the rollup counters with one bulk upsert."""
+    counts = Counter(
+        (doc.get("class_id"), doc.get("activity"), doc.get("severity"), bucket_of(doc["timestamp"]))
+        for doc in docs if doc.get("timestamp") is not None
+    )
+    if not counts:
+        return
+    rollup_collection.bulk_write([
+        UpdateOne(dict(zip(ROLLUP_KEYS, key)), {"$inc": {"count": n}}, upsert=True)
+        for key, n in counts.items()
+    ], ordered=False)
+
+
+def rebuild_rollups(logs_collection, rollup_collection):
+    """Recompute every rollup from the raw logs (used to backfill an empty rollup collection).
+
+    The counts are built in a side collection that is then renamed over the live one,
+    so apply_rollups() from a running detector never sees a half-empty collection.
+    Logs stored while the aggregation runs are only counted if the scan reached them.
+    """
+    staging = rollup_collection.database[rollup_collection.name + "_rebuild"]
+    staging.drop()
+    ensure_rollup_indexes(staging)
+    logs_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "class_id": "$class_id",
+                "activity": "$activity",
+                "severity": "$severity",
+                "bucket": {"$dateFromParts": {
+                    "year": {"$year": "$timestamp"},
+                    "month": {"$month": "$timestamp"},
+                    "day": {"$dayOfMonth": "$timestamp"},
+                    "hour": {"$hour": "$timestamp"},
+                }},
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "class_id": "$_id.class_id",
+            "activity": "$_id.activity",
+            "severity": "$_id.severity",
+            "bucket": "$_id.bucket",
+            "count": 1,
+        }},
+        {"$out": staging.name},
+    ])
+    staging.rename(rollup_collection.name, dropTarget=True)
+
+
+# ======= Dashboard aggregations =======
+def rollup_match(class_id=None, start=None, end=None):
+    match = {}
+    if class_id and class_id != "All":
+        match["class_id"] = class_id
+    if start or end:
+        match["bucket"] = {}
+        if start:
+            match["bucket"]["$gte"] = bucket_of(start)
+        if end:
+            match["bucket"]["$lte"] = end
+    return match
+
+
+def counts_by(rollup_collection, field, match=None):
+    """{value: count} summed over the rollups, grouped by one of ROLLUP_KEYS."""
+    pipeline = [
+        {"$match": match or {}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": "$count"}}},
+        {"$sort": {"count": -1}},
+    ]
+    return {row["_id"]: row["count"] for row in rollup_collection.aggregate(pipeline)}
+
+
+def counts_by_day(rollup_collection, match=None):
+    """[(YYYY-MM-DD, severity, count)] for a time-series chart."""
+    pipeline = [
+        {"$match": match or {}},
+        {"$group": {
+            "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$bucket"}}, "severity": "$severity"},
+            "count": {"$sum": "$count"},
+        }},
+        {"$sort": {"_id.day": 1}},
+    ]
+    return [(row["_id"]["day"], row["_id"]["severity"], row["count"]) for row in rollup_collection.aggregate(pipeline)]
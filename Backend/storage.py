@@ -0,0 +1,256 @@
+import abc
+import hashlib
+import os
+import tempfile
+
+from Backend import evidence_encoding
+
+# Where evidence snapshots and clips are kept: "cloudinary", "local" (a content-addressed
+# directory, for sites without internet) or "s3" (any S3-compatible endpoint, e.g. MinIO).
+# Logs store a reference per file; refs of every backend stay readable whichever one is active.
+STORAGE_BACKEND = os.getenv("EVIDENCE_STORAGE", "cloudinary")
+LOCAL_STORE_DIR = os.getenv("EVIDENCE_STORE_DIR", "evidence_store")
+S3_BUCKET = os.getenv("EVIDENCE_S3_BUCKET", "exam-evidence")
+S3_PREFIX = os.getenv("EVIDENCE_S3_PREFIX", "evidence")
+S3_ENDPOINT_URL = os.getenv("EVIDENCE_S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("EVIDENCE_S3_REGION") or None
+S3_URL_EXPIRY_SECONDS = int(os.getenv("EVIDENCE_S3_URL_EXPIRY", "3600"))
+
+LOCAL_SCHEME = "local://"
+S3_SCHEME = "s3://"
+# Mongo regex matching a stored evidence reference of any backend
+REF_PATTERN = r"^(https?://|local://|s3://)"
+
+CONTENT_TYPES = {".jpg": "image/jpeg", ".mp4": "video/mp4"}
+
+
+def content_key(data, suffix):
+    """Sharded name of a blob from its SHA-256: ab/cd/abcd...ef.jpg."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+def poster_key(clip_key):
+    """Name of a clip's poster image (works on keys and refs alike)."""
+    return os.path.splitext(clip_key)[0] + ".jpg"
+
+
+# ======= Backends =======
+class CloudinaryStorage:
+    """Uploads to Cloudinary; refs are the https delivery URLs."""
+
+    def put_image(self, image, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+        from Backend import cloud_uploader
+        return cloud_uploader.upload_image_to_cloudinary(
+            image, public_id=public_id, tags=tags, class_id=class_id, face_id=face_id)
+
+    def put_clip(self, frames, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+        from Backend import cloud_uploader
+        return cloud_uploader.upload_video_clip_from_frames(
+            frames, public_id=public_id, tags=tags, class_id=class_id, face_id=face_id)
+
+    def url(self, ref):
+        return ref
+
+    def thumbnail_url(self, ref, resource_type="image"):
+        from Backend import cloud_uploader
+        return cloud_uploader.thumbnail_url(ref, resource_type=resource_type)
+
+
+class ContentAddressedStorage(abc.ABC):
+    """Base for stores that name every blob by the hash of its bytes.
+
+    Identical evidence (the same encoded snapshot or clip) is written once.
+    A clip is stored together with a JPEG poster of its first frame under the
+    same name, which the dashboard uses as its thumbnail.
+    """
+
+    scheme = None
+
+    @abc.abstractmethod
+    def exists(self, key):
+        pass
+
+    @abc.abstractmethod
+    def write(self, key, data):
+        pass
+
+    def put_bytes(self, data, suffix):
+        key = content_key(data, suffix)
+        if not self.exists(key):
+            self.write(key, data)
+        return key
+
+    def put_image(self, image, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+        encoded = evidence_encoding.encode_jpeg(image)
+        if encoded is None:
+            print("[Storage] Could not encode image")
+            return None
+        return self.ref(self.put_bytes(encoded.getvalue(), ".jpg"))
+
+    def put_clip(self, frames, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+        if not frames:
+            return None
+        with evidence_encoding.encoded_clip(frames) as clip:
+            if clip is None:
+                return None
+            key = self.put_bytes(clip.read(), ".mp4")
+        poster = evidence_encoding.encode_jpeg(frames[0], max_side=evidence_encoding.MAX_CLIP_SIDE)
+        if poster is not None and not self.exists(poster_key(key)):
+            self.write(poster_key(key), poster.getvalue())
+        return self.ref(key)
+
+    def ref(self, key):
+        return self.scheme + key
+
+    def key_of(self, ref):
+        return ref[len(self.scheme):]
+
+    def thumbnail_url(self, ref, resource_type="image"):
+        # There is no separate snapshot thumbnail: the snapshot itself is returned (stored at up to
+        # EVIDENCE_MAX_IMAGE_SIDE, 640 px by default). Clips have a poster next to them.
+        if resource_type == "video":
+            ref = poster_key(ref)
+        return self.url(ref)
+
+
+class LocalStorage(ContentAddressedStorage):
+    """Content-addressed directory tree; refs are local://ab/cd/<sha256>.<ext>."""
+
+    scheme = LOCAL_SCHEME
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or LOCAL_STORE_DIR)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def write(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the target and rename, so a reader never sees a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def url(self, ref):
+        """Filesystem path of the blob (Streamlit's st.image / st.video accept paths)."""
+        return self.path(self.key_of(ref))
+
+
+class S3Storage(ContentAddressedStorage):
+    """Content-addressed objects in an S3-compatible bucket; refs are s3://bucket/prefix/ab/cd/<sha256>.<ext>.
+
+    Set EVIDENCE_S3_ENDPOINT_URL to use MinIO or another local stand-in instead of AWS.
+    Needs boto3, which is only imported when this backend is used.
+    """
+
+    scheme = S3_SCHEME
+
+    def __init__(self, bucket=None, prefix=None, endpoint_url=None, region=None, client=None):
+        self.bucket = bucket or S3_BUCKET
+        self.prefix = (S3_PREFIX if prefix is None else prefix).strip("/")
+        self.endpoint_url = endpoint_url or S3_ENDPOINT_URL
+        self.region = region or S3_REGION
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("S3 evidence storage needs the 'boto3' package")
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    def object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except Exception as e:
+            status = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if status in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def write(self, key, data):
+        content_type = CONTENT_TYPES.get(os.path.splitext(key)[1], "application/octet-stream")
+        self.client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=data, ContentType=content_type)
+
+    def ref(self, key):
+        return f"{self.scheme}{self.bucket}/{self.object_key(key)}"
+
+    def url(self, ref):
+        """Presigned GET URL of the object the ref points to."""
+        bucket, key = ref[len(self.scheme):].split("/", 1)
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=S3_URL_EXPIRY_SECONDS)
+
+
+BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_instances = {}
+
+
+def get_storage(name=None):
+    name = name or STORAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown evidence storage '{name}', expected one of {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def backend_for(ref):
+    """Backend that can read `ref`, judged by its scheme rather than by the active backend."""
+    if ref.startswith(LOCAL_SCHEME):
+        return get_storage("local")
+    if ref.startswith(S3_SCHEME):
+        return get_storage("s3")
+    return get_storage("cloudinary")
+
+
+# ======= Writing (async logger) =======
+def store_image(image, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+    """Store a snapshot (BGR array) with the active backend. Returns its ref, or None on failure."""
+    return get_storage().put_image(image, public_id=public_id, tags=tags, class_id=class_id, face_id=face_id)
+
+
+def store_clip(frames, public_id=None, tags=None, class_id="LR-10", face_id="unknown_face"):
+    """Store a clip (list of BGR frames) with the active backend. Returns its ref, or None on failure."""
+    return get_storage().put_clip(frames, public_id=public_id, tags=tags, class_id=class_id, face_id=face_id)
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(("http://", "https://", LOCAL_SCHEME, S3_SCHEME))
+
+
+# ======= Reading (dashboard) =======
+def resolve_url(ref):
+    """Something st.image / st.video can load for a stored ref: a URL or a local path."""
+    if not ref:
+        return ref
+    return backend_for(ref).url(ref)
+
+
+def thumbnail_url(ref, resource_type="image"):
+    if not ref:
+        return ref
+    return backend_for(ref).thumbnail_url(ref, resource_type=resource_type)
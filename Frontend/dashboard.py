@@ -5,7 +5,6 @@ import os
 from PIL import Image
 import plotly.express as px
 from datetime import datetime
-import io
 from base64 import b64encode
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -13,32 +12,119 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from detection import face_detection, object_detection, pose_detection
 from utils import cheating_logic, tracker
 from utils.detection_helpers import compute_iou, merge_pose_to_tracked
-from Backend import db
-
-
-def get_logs_from_db():
-    try:
-        logs_cursor = db.logs_collection.find().sort("timestamp", -1)
-        logs_list = list(logs_cursor)
-        if not logs_list:
-            return pd.DataFrame(columns=["timestamp", "class_id", "face_id", "activity", "severity", "image_path", "video_url"])
-        records = []
-        for log in logs_list:
-            records.append({
-                "timestamp": log.get("timestamp"),
-                "class_id": log.get("class_id"),
-                "face_id": log.get("face_id"),
-                "activity": log.get("activity"),
-                "severity": log.get("severity"),
-                "image_path": log.get("image_url"),
-                "video_url": log.get("video_url")
-            })
-        df = pd.DataFrame(records)
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        return df
-    except Exception as e:
-        st.error(f"Error fetching logs from MongoDB: {e}")
-        return pd.DataFrame(columns=["timestamp", "class_id", "face_id", "activity", "severity", "image_path", "video_url"])
+from Backend import db, log_export, log_queries, log_rollups, storage
+
+
+LOG_CACHE_TTL_SECONDS = 30
+PAGE_SIZE = 50
+# Thumbnails per page on the Flagged Snapshots / Video Clips grids
+MEDIA_PER_PAGE = 24
+GRID_COLUMNS = 4
+# st.download_button keeps the whole file in the server's memory, so bigger exports are refused
+DOWNLOAD_MAX_MB = int(os.getenv("EXPORT_DOWNLOAD_MAX_MB", "200"))
+
+
+@st.cache_resource
+def init_log_indexes():
+    log_queries.ensure_indexes()
+    return True
+
+
+@st.cache_resource
+def get_rollups_collection():
+    """Rollup counters kept up to date by the log batcher; backfilled from the raw logs once."""
+    rollups = db.rollups_collection
+    log_rollups.ensure_rollup_indexes(rollups)
+    if rollups.estimated_document_count() == 0 and db.logs_collection.estimated_document_count() > 0:
+        log_rollups.rebuild_rollups(db.logs_collection, rollups)
+    return rollups
+
+
+@st.cache_data(ttl=LOG_CACHE_TTL_SECONDS)
+def get_counts_by(field, class_id=None):
+    return log_rollups.counts_by(get_rollups_collection(), field, log_rollups.rollup_match(class_id=class_id))
+
+
+@st.cache_data(ttl=LOG_CACHE_TTL_SECONDS)
+def get_counts_by_day(class_id=None):
+    return log_rollups.counts_by_day(get_rollups_collection(), log_rollups.rollup_match(class_id=class_id))
+
+
+@st.cache_data(ttl=LOG_CACHE_TTL_SECONDS)
+def get_class_ids():
+    return log_queries.distinct_class_ids()
+
+
+@st.cache_data(ttl=LOG_CACHE_TTL_SECONDS)
+def get_date_bounds():
+    return log_queries.date_bounds()
+
+
+def paged_query(key, query, fields=None, page_size=PAGE_SIZE):
+    """Render Previous/Next controls for a keyset-paginated query and return the current page's docs.
+
+    The cursors of visited pages are kept in session state under `key`, and are
+    reset whenever the query changes.
+    """
+    state = st.session_state.setdefault(key, {"query": None, "cursors": [None]})
+    if state["query"] != repr(query):
+        state.update(query=repr(query), cursors=[None])
+
+    docs, next_cursor = log_queries.fetch_page(query, page_size=page_size, after=state["cursors"][-1], fields=fields)
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=len(state["cursors"]) == 1):
+            state["cursors"].pop()
+            st.rerun()
+    with info_col:
+        st.caption(f"Page {len(state['cursors'])}")
+    with next_col:
+        if st.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+            state["cursors"].append(next_cursor)
+            st.rerun()
+    return docs
+
+
+def media_date_filter(label):
+    min_ts, max_ts = get_date_bounds()
+    today = datetime.now().date()
+    min_date = min_ts.date() if min_ts else today
+    max_date = max_ts.date() if max_ts else today
+    date_range = st.date_input(label, [min_date, max_date])
+    if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+        return date_range
+    return min_date, min_date
+
+
+def media_grid(docs, url_field, resource_type):
+    """Thumbnail grid for one page of logs; the full image/video is loaded only for the opened item."""
+    open_key = f"open_{resource_type}"
+    opened = st.session_state.get(open_key)
+    icon = "📸" if resource_type == "image" else "🎥"
+
+    for row_start in range(0, len(docs), GRID_COLUMNS):
+        columns = st.columns(GRID_COLUMNS)
+        for col, doc in zip(columns, docs[row_start:row_start + GRID_COLUMNS]):
+            doc_id = str(doc["_id"])
+            with col:
+                st.image(storage.thumbnail_url(doc[url_field], resource_type=resource_type),
+                         use_container_width=True)
+                st.caption(f"{icon} {doc['timestamp']:%Y-%m-%d %H:%M:%S} | Face {doc.get('face_id')}")
+                if st.button("Close" if opened == doc_id else "Open", key=f"{open_key}_{doc_id}"):
+                    st.session_state[open_key] = None if opened == doc_id else doc_id
+                    st.rerun()
+
+    selected = next((doc for doc in docs if str(doc["_id"]) == opened), None)
+    if selected is not None:
+        st.divider()
+        st.subheader(f"{icon} {selected['timestamp']:%Y-%m-%d %H:%M:%S} | Face {selected.get('face_id')}")
+        if resource_type == "image":
+            st.image(storage.resolve_url(selected[url_field]))
+        else:
+            st.video(storage.resolve_url(selected[url_field]))
+        st.write(f"*Activity*: {selected.get('activity')}")
+        st.write(f"*Severity*: {format_severity(selected.get('severity'))}")
 
 
 def format_severity(sev):
@@ -52,6 +138,7 @@ def format_severity(sev):
 
 def dashboard():
     st.set_page_config(page_title="Cheating Detection", layout="wide")
+    init_log_indexes()
 
     st.markdown("""
         <style>
@@ -90,8 +177,6 @@ def dashboard():
         </style>
     """, unsafe_allow_html=True)
 
-    df = get_logs_from_db()
-
     with st.sidebar:
         # Combined Logo + Title
         logo_path = "Frontend/assets/logo.png"
@@ -133,129 +218,128 @@ def dashboard():
     if page == "Activity Logs":
         st.header("Activity Logs")
 
+        min_ts, max_ts = get_date_bounds()
+        today = datetime.now().date()
+        min_date = min_ts.date() if min_ts else today
+        max_date = max_ts.date() if max_ts else today
+
         col1, col2, col3 = st.columns([1, 1, 2])
         with col1:
             severity_filter = st.selectbox("Severity", ["All", "warning", "critical"])
         with col2:
-            class_ids = ["All"] + sorted(df["class_id"].dropna().astype(str).unique().tolist())
+            class_ids = ["All"] + get_class_ids()
             class_filter = st.selectbox("Class ID", class_ids)
         with col3:
-            date_range = st.date_input("Date range", [df["timestamp"].min().date(), df["timestamp"].max().date()])
+            date_range = st.date_input("Date range", [min_date, max_date])
             if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
                 start_date, end_date = date_range
             else:
-                start_date = end_date = df["timestamp"].min().date()
-
-        filtered_df = df.copy()
-        if severity_filter != "All":
-            filtered_df = filtered_df[filtered_df["severity"] == severity_filter]
-        if class_filter != "All":
-            filtered_df = filtered_df[filtered_df["class_id"].astype(str) == class_filter]
-        filtered_df = filtered_df[
-            (filtered_df["timestamp"].dt.date >= start_date) &
-            (filtered_df["timestamp"].dt.date <= end_date)
-        ]
-
-        display_df = filtered_df.copy()
+                start_date = end_date = min_date
+
+        # Remembered so "Download Logs" can export exactly what is shown here
+        st.session_state.log_filters = {
+            "severity": severity_filter,
+            "class_id": class_filter,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+        query = log_queries.build_filter(**st.session_state.log_filters)
+
+        fields = ["timestamp", "class_id", "face_id", "activity", "severity"]
+        docs = paged_query("activity_logs_page", query, fields=fields)
+        display_df = log_queries.docs_to_frame(docs, fields=fields)
         display_df["severity"] = display_df["severity"].apply(format_severity)
         st.dataframe(
-            display_df[["timestamp", "class_id", "face_id", "activity", "severity"]],
+            display_df[fields],
             use_container_width=True,
             hide_index=True,
         )
 
+        severity_counts = get_counts_by("severity")
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Incidents", len(df))
-        col2.metric("Critical", len(df[df["severity"] == "critical"]))
-        col3.metric("Warnings", len(df[df["severity"] == "warning"]))
+        col1.metric("Total Incidents", sum(severity_counts.values()))
+        col2.metric("Critical", severity_counts.get("critical", 0))
+        col3.metric("Warnings", severity_counts.get("warning", 0))
 
     elif page == "Flagged Snapshots":
         st.header("Flagged Snapshots")
+        start_date, end_date = media_date_filter("Filter snapshots by Date Range")
+        query = log_queries.build_filter(
+            start_date=start_date, end_date=end_date, extra={"image_url": {"$regex": storage.REF_PATTERN}}
+        )
+        docs = paged_query("snapshots_page", query, page_size=MEDIA_PER_PAGE)
 
-        if df.empty:
+        if not docs:
             st.info("No snapshot data.")
         else:
-            min_date = df["timestamp"].min().date()
-            max_date = df["timestamp"].max().date()
-            date_range = st.date_input("Filter snapshots by Date Range", [min_date, max_date])
-            if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
-                start_date, end_date = date_range
-            else:
-                start_date = end_date = min_date
-
-            filtered_snapshots = df[
-                (df["image_path"].notna()) &
-                (df["image_path"].str.startswith("http")) &
-                (df["timestamp"].dt.date >= start_date) &
-                (df["timestamp"].dt.date <= end_date)
-            ]
-
-            for i, row in filtered_snapshots.iterrows():
-                with st.expander(f"📸 {row['timestamp']} | Face {row['face_id']}"):
-                    st.image(row["image_path"], width=200)
-                    st.write(f"*Activity*: {row['activity']}")
-                    st.write(f"*Severity*: {format_severity(row['severity'])}")
+            media_grid(docs, "image_url", "image")
 
     elif page == "Video Clips":
         st.header("Flagged Video Clips")
+        start_date, end_date = media_date_filter("Filter videos by Date Range")
+        query = log_queries.build_filter(
+            start_date=start_date, end_date=end_date, extra={"video_url": {"$nin": [None, ""]}}
+        )
+        docs = paged_query("videos_page", query, page_size=MEDIA_PER_PAGE)
 
-        if df.empty:
-            st.info("No video clips.")
+        if not docs:
+            st.info("No video clips in this date range.")
         else:
-            min_date = df["timestamp"].min().date()
-            max_date = df["timestamp"].max().date()
-            date_range = st.date_input("Filter videos by Date Range", [min_date, max_date])
-            if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
-                start_date, end_date = date_range
-            else:
-                start_date = end_date = min_date
-
-            filtered_videos = df[
-                (df["video_url"].notna()) &
-                (df["video_url"] != "") &
-                (df["timestamp"].dt.date >= start_date) &
-                (df["timestamp"].dt.date <= end_date)
-            ]
-
-            if filtered_videos.empty:
-                st.info("No video clips in this date range.")
-            else:
-                for _, row in filtered_videos.iterrows():
-                    with st.expander(f"🎥 {row['timestamp']} | Face {row['face_id']}"):
-                        st.video(row["video_url"])
-                        st.write(f"*Activity*: {row['activity']}")
+            media_grid(docs, "video_url", "video")
 
     elif page == "Download Logs":
         st.header("Download Logs")
 
         export_scope = st.radio("Export", ["All Logs", "Filtered Logs"])
-        export_format = st.radio("Format", ["CSV", "Excel"], horizontal=True)
+        export_format = st.radio("Format", list(log_export.EXPORT_FORMATS), horizontal=True)
+        if export_format == "Excel":
+            st.caption(f"Excel exports are limited to {log_export.EXCEL_MAX_ROWS:,} rows; use CSV or Parquet for more.")
 
-        data_to_export = df if export_scope == "All Logs" else filtered_df
+        st.caption(f"Downloads are limited to {DOWNLOAD_MAX_MB} MB; narrow the filters or use Parquet for larger exports.")
 
-        if not data_to_export.empty:
-            if export_format == "CSV":
-                data = data_to_export.to_csv(index=False).encode("utf-8")
-                mime = "text/csv"
-                filename = "cheating_logs.csv"
+        query = {}
+        if export_scope == "Filtered Logs":
+            log_filters = st.session_state.get("log_filters")
+            if log_filters is None:
+                query = None
             else:
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-                    data_to_export.to_excel(writer, index=False)
-                data = buffer.getvalue()
-                mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                filename = "cheating_logs.xlsx"
-
-            st.download_button("📥 Download Logs", data=data, file_name=filename, mime=mime)
-        else:
+                st.caption("Filters: " + ", ".join(f"{name.replace('_', ' ')}={value}" for name, value in log_filters.items()))
+                query = log_queries.build_filter(**log_filters)
+
+        if query is None:
+            # Without this the filtered export would quietly be every log
+            st.info("Set the filters on the Activity Logs page first.")
+        elif log_queries.count(query) == 0:
             st.info("No data available for export.")
+        elif st.button("Prepare export"):
+            path = None
+            try:
+                with st.spinner("Exporting logs..."):
+                    path, rows, mime = log_export.export_logs(query, export_format)
+                size_mb = os.path.getsize(path) / (1024 * 1024)
+                if size_mb > DOWNLOAD_MAX_MB:
+                    st.warning(f"The export is {size_mb:,.0f} MB, over the {DOWNLOAD_MAX_MB} MB download limit.")
+                else:
+                    with open(path, "rb") as f:
+                        st.download_button(
+                            f"📥 Download Logs ({rows:,} rows)",
+                            data=f,
+                            file_name="cheating_logs" + os.path.splitext(path)[1],
+                            mime=mime,
+                        )
+            except (log_export.ExportTooLarge, RuntimeError) as e:
+                st.warning(str(e))
+            finally:
+                if path is not None:
+                    os.remove(path)
 
     elif page == "Summary":
         st.header("Detection Summary")
+        class_filter = st.selectbox("Class ID", ["All"] + get_class_ids(), key="summary_class")
+        activity = get_counts_by("activity", class_filter)
 
-        if not df.empty:
-            activity_counts = df["activity"].value_counts().reset_index()
-            activity_counts.columns = ["activity", "count"]
+        if activity:
+            activity_counts = pd.DataFrame(list(activity.items()), columns=["activity", "count"])
             fig1 = px.bar(
                 activity_counts,
                 x="activity",
@@ -267,14 +351,35 @@ def dashboard():
             st.plotly_chart(fig1, use_container_width=True)
 
             st.subheader("⚠ Severity Breakdown")
+            severity = get_counts_by("severity", class_filter)
             fig2 = px.pie(
-                df,
-                names="severity",
+                names=list(severity.keys()),
+                values=list(severity.values()),
                 title="Severity Split",
+                color=list(severity.keys()),
                 color_discrete_map={"warning": "#facc15", "critical": "#ef4444"},
                 hole=0.3,
             )
             st.plotly_chart(fig2)
+
+            st.subheader("📅 Incidents per Day")
+            daily = pd.DataFrame(get_counts_by_day(class_filter), columns=["day", "severity", "count"])
+            fig3 = px.bar(
+                daily,
+                x="day",
+                y="count",
+                color="severity",
+                labels={"day": "Day", "count": "Incidents"},
+                color_discrete_map={"warning": "#facc15", "critical": "#ef4444"},
+            )
+            st.plotly_chart(fig3, use_container_width=True)
+
+            if class_filter == "All":
+                st.subheader("🏫 Incidents by Class")
+                by_class = get_counts_by("class_id")
+                class_counts = pd.DataFrame(list(by_class.items()), columns=["class_id", "count"])
+                fig4 = px.bar(class_counts, x="class_id", y="count", labels={"class_id": "Class ID", "count": "Incidents"})
+                st.plotly_chart(fig4, use_container_width=True)
         else:
             st.info("No data to summarize.")
 
@@ -0,0 +1,152 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import cv2
+
+from utils import config
+
+# Models loaded once per worker process by init_worker()
+_models = None
+
+
+class EventCollector:
+    """Log sink for ScoreState that keeps events in memory instead of uploading them."""
+
+    def __init__(self, video):
+        self.video = video
+        self.events = []
+
+    def __call__(self, timestamp_str, face_id, activity, severity, cropped_face=None, class_id="LR-10", video_clip=None, now=None):
+        self.events.append({
+            "timestamp": datetime.utcfromtimestamp(now).isoformat() + "Z",
+            "class_id": class_id,
+            "face_id": str(face_id),
+            "activity": activity,
+            "severity": severity,
+            "video": self.video,
+        })
+        return True
+
+
+def parse_video(spec):
+    """CLASS_ID=PATH or just PATH, in which case the file name is used as the class id."""
+    if "=" in spec and not os.path.exists(spec):
+        class_id, path = spec.split("=", 1)
+    else:
+        path = spec
+        class_id = os.path.splitext(os.path.basename(path))[0]
+    return class_id, path
+
+
+def recording_start(path, start=None):
+    """Epoch seconds of the first frame: --start if given, else file mtime minus the video length."""
+    if start:
+        return datetime.fromisoformat(start).timestamp()
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frame_count / fps if fps > 0 else 0.0
+    return os.path.getmtime(path) - duration
+
+
+def init_worker(device):
+    global _models
+    from detection import face_detection, object_detection, pose_detection
+
+    _models = {
+        'phone': object_detection.load_model('models/yolov5su.pt', device=device),
+        'face': face_detection.load_face_model() if config.DETECTION_MODE == "classic" else None,
+        'pose': pose_detection.init_pose(),
+    }
+    print(f"[BATCH] Worker {os.getpid()} ready ({config.DETECTION_MODE} detection on {device})")
+
+
+def process_video(class_id, path, sink, start=None, stride=1):
+    """Analyze one recording headlessly. Returns a summary dict (with the events for the JSONL sink)."""
+    from utils.multi_stream import MultiStreamEngine, StreamContext
+
+    collector = EventCollector(path) if sink == "jsonl" else None
+    stream = StreamContext(path, class_id, clock="stream", start_time=recording_start(path, start),
+                           stride=stride, log_sink=collector)
+    engine = MultiStreamEngine(_models['phone'], _models['face'], _models['pose'], [stream], batch_size=1)
+
+    started = time.time()
+    frames = 0
+    try:
+        while engine.active:
+            frames += len(engine.step())
+    finally:
+        engine.release()
+
+    if sink == "db":
+        # Pool workers exit without running atexit hooks, so drain the logger here
+        from Backend import db
+        from utils import async_logger
+        async_logger.flush()
+        db.log_batcher.flush()
+
+    elapsed = time.time() - started
+    return {
+        "class_id": class_id,
+        "video": path,
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "events": collector.events if collector else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze recorded exam videos without a display, several at a time.")
+    parser.add_argument("videos", nargs="+", type=parse_video,
+                        help="Video files, optionally as CLASS_ID=PATH (default class id: file name)")
+    parser.add_argument("--workers", type=int, default=2, help="Videos processed in parallel (one process each)")
+    parser.add_argument("--device", default="cpu", help="Device for the phone model")
+    parser.add_argument("--sink", choices=["jsonl", "db"], default="jsonl",
+                        help="jsonl: write events to --out; db: upload evidence and log to MongoDB like the live app")
+    parser.add_argument("--out", default="batch_events.jsonl", help="Output file for the jsonl sink")
+    parser.add_argument("--start", help="ISO time the recordings started (default: file mtime minus duration)")
+    parser.add_argument("--stride", type=int, default=1, help="Analyze every n-th frame")
+    args = parser.parse_args()
+
+    started = time.time()
+    total_frames = 0
+    out = open(args.out, "a", encoding="utf-8") if args.sink == "jsonl" else None
+    # spawn: CUDA cannot be re-initialized in forked children
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                                 initializer=init_worker, initargs=(args.device,)) as pool:
+            futures = {
+                pool.submit(process_video, class_id, path, args.sink, args.start, args.stride): path
+                for class_id, path in args.videos
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"[BATCH] {futures[future]} failed: {e}")
+                    continue
+                total_frames += result["frames"]
+                if out:
+                    for event in result["events"]:
+                        out.write(json.dumps(event) + "\n")
+                    out.flush()
+                print(f"[BATCH] {result['video']} ({result['class_id']}): {result['frames']} frames in "
+                      f"{result['seconds']:.1f}s ({result['fps']:.1f} FPS), {len(result['events'])} events")
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.time() - started
+    print(f"[BATCH] {len(args.videos)} videos, {total_frames} frames in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
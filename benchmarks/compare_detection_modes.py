@@ -0,0 +1,151 @@
+"""Compare classic (3 models) and fused (pose + phone pass) detection on a recorded video.
+
+Classic mode is used as the reference: fused faces and phones are matched to the
+classic ones by IoU and reported as precision/recall, together with the mean
+head-pose difference of matched faces and the per-frame latency of each mode.
+
+    python -m benchmarks.compare_detection_modes videos/cheating_video4.mp4 --frames 300
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from detection import face_detection, fused_detection, object_detection, pose_detection
+from utils.detection_helpers import iou_matrix
+
+
+def match_boxes(reference, candidates, iou_threshold=0.5):
+    """Greedy one-to-one matching. Returns a list of (ref_idx, cand_idx) pairs."""
+    ious = iou_matrix(reference, candidates)
+    pairs = sorted(((ious[i, j], i, j) for i, j in zip(*np.nonzero(ious >= iou_threshold))), reverse=True)
+    used_ref, used_cand, matches = set(), set(), []
+    for _, i, j in pairs:
+        if i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+        matches.append((i, j))
+    return matches
+
+
+class ModeStats:
+    def __init__(self):
+        self.latencies = []
+        self.faces = 0
+        self.phones = 0
+
+    def summary(self):
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "frames": len(self.latencies),
+            "latency_ms_mean": float(lat.mean()),
+            "latency_ms_p50": float(np.percentile(lat, 50)),
+            "latency_ms_p95": float(np.percentile(lat, 95)),
+            "fps": float(1000 / lat.mean()) if lat.mean() > 0 else 0.0,
+            "faces_per_frame": self.faces / max(1, len(self.latencies)),
+            "phones_per_frame": self.phones / max(1, len(self.latencies)),
+        }
+
+
+def compare(video_path, max_frames, iou_threshold, device):
+    phone_model = object_detection.load_model('models/yolov5su.pt', device=device)
+    pose_model = pose_detection.init_pose()
+    # Each mode gets its own FaceMesh, as each stream does in the detector
+    classic_models = {
+        'phone': phone_model, 'pose': pose_model,
+        'face': face_detection.load_face_model(), 'face_mesh': face_detection.create_face_mesh(),
+    }
+    fused_models = {'phone': phone_model, 'pose': pose_model, 'face_mesh': face_detection.create_face_mesh()}
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {video_path}")
+
+    stats = {"classic": ModeStats(), "fused": ModeStats()}
+    face_tp = face_ref = face_cand = 0
+    phone_tp = phone_ref = phone_cand = 0
+    yaw_err, pitch_err = [], []
+
+    frame_count = 0
+    while frame_count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_count += 1
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        start = time.perf_counter()
+        classic_phones, classic_faces, _ = fused_detection.run_detectors(classic_models, frame, rgb, mode="classic")
+        stats["classic"].latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        fused_phones, fused_faces, _ = fused_detection.run_detectors(fused_models, frame, rgb, mode="fused")
+        stats["fused"].latencies.append(time.perf_counter() - start)
+
+        stats["classic"].faces += len(classic_faces)
+        stats["classic"].phones += len(classic_phones)
+        stats["fused"].faces += len(fused_faces)
+        stats["fused"].phones += len(fused_phones)
+
+        face_matches = match_boxes([f['bbox'] for f in classic_faces], [f['bbox'] for f in fused_faces], iou_threshold)
+        face_tp += len(face_matches)
+        face_ref += len(classic_faces)
+        face_cand += len(fused_faces)
+        for i, j in face_matches:
+            yaw_err.append(abs(classic_faces[i]['yaw'] - fused_faces[j]['yaw']))
+            pitch_err.append(abs(classic_faces[i]['pitch'] - fused_faces[j]['pitch']))
+
+        phone_matches = match_boxes(classic_phones, fused_phones, iou_threshold)
+        phone_tp += len(phone_matches)
+        phone_ref += len(classic_phones)
+        phone_cand += len(fused_phones)
+
+    cap.release()
+
+    return {
+        "video": video_path,
+        "iou_threshold": iou_threshold,
+        "classic": stats["classic"].summary(),
+        "fused": stats["fused"].summary(),
+        "fused_vs_classic": {
+            "face_recall": face_tp / face_ref if face_ref else None,
+            "face_precision": face_tp / face_cand if face_cand else None,
+            "phone_recall": phone_tp / phone_ref if phone_ref else None,
+            "phone_precision": phone_tp / phone_cand if phone_cand else None,
+            "yaw_abs_err_mean": float(np.mean(yaw_err)) if yaw_err else None,
+            "pitch_abs_err_mean": float(np.mean(pitch_err)) if pitch_err else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Recorded exam video")
+    parser.add_argument("--frames", type=int, default=300, help="Maximum frames to compare")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed to count a fused box as matching")
+    parser.add_argument("--device", default="cpu", help="Device for the phone model")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = compare(args.video, args.frames, args.iou, args.device)
+
+    for mode in ("classic", "fused"):
+        s = report[mode]
+        print(f"{mode:8s} {s['frames']:5d} frames  mean {s['latency_ms_mean']:7.1f} ms  "
+              f"p95 {s['latency_ms_p95']:7.1f} ms  {s['fps']:5.1f} fps  "
+              f"{s['faces_per_frame']:.2f} faces/frame  {s['phones_per_frame']:.2f} phones/frame")
+    print("fused vs classic:")
+    for key, value in report["fused_vs_classic"].items():
+        print(f"  {key:20s} {'n/a' if value is None else f'{value:.3f}'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
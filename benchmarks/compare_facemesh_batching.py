@@ -0,0 +1,125 @@
+"""Check that batched (mosaic) FaceMesh gives the same head pose as meshing every face crop on its own.
+
+Faces come from the face YOLO on a recorded video. For every face the per-crop
+path (one FaceMesh call per face, as before batching) is the reference; the
+report gives how many faces each path meshed, how many the mosaics missed and
+had to retry per crop, and the yaw/pitch difference of faces meshed by both.
+Exits with status 1 when the batched path meshes fewer faces than the per-crop
+path or its mean angle error is above --max-error.
+
+    python -m benchmarks.compare_facemesh_batching videos/cheating_video4.mp4 --frames 300
+"""
+
+import argparse
+import json
+import sys
+
+import cv2
+import numpy as np
+
+from detection import face_detection
+
+
+def roi_angles(face_mesh, rgb, face_boxes):
+    """(N, 3) angles from the per-crop path, NaN where it found no mesh."""
+    angles = np.full((len(face_boxes), 3), np.nan)
+    for i, box in enumerate(face_boxes):
+        landmarks = face_detection.mesh_landmarks_roi(face_mesh, rgb, box)
+        if landmarks is not None:
+            angles[i] = face_detection.head_pose_angles(landmarks[face_detection.POSE_LANDMARK_IDS][np.newaxis], [box])[0]
+    return angles
+
+
+def mosaic_hits(face_mesh, rgb, face_boxes):
+    """How many faces the mosaics meshed before any per-crop retry."""
+    landmarks = [None] * len(face_boxes)
+    order = sorted(range(len(face_boxes)), key=lambda i: face_boxes[i][0])
+    per_mosaic = face_detection.MOSAIC_GRID ** 2
+    for start in range(0, len(order), per_mosaic):
+        face_detection.mesh_mosaic(face_mesh, rgb, face_boxes, order[start:start + per_mosaic], landmarks)
+    return sum(lm is not None for lm in landmarks)
+
+
+def compare(video_path, max_frames):
+    yolo_model = face_detection.load_face_model()
+    batched_mesh = face_detection.create_face_mesh()
+    roi_mesh = face_detection.create_face_mesh()
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {video_path}")
+
+    faces_total = batched_meshed = roi_meshed = mosaic_meshed = 0
+    yaw_err, pitch_err = [], []
+    frame_count = 0
+    while frame_count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_count += 1
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w = rgb.shape[:2]
+
+        results = yolo_model.predict(source=rgb, verbose=False, conf=0.4)
+        if not results or not results[0].boxes:
+            continue
+        boxes = [box.xyxy[0].tolist() for box in results[0].boxes]
+        faces = face_detection.faces_from_boxes(boxes, batched_mesh, rgb, w, h)
+        face_boxes = [face['bbox'] for face in faces]
+        reference = roi_angles(roi_mesh, rgb, face_boxes)
+
+        faces_total += len(faces)
+        mosaic_meshed += mosaic_hits(batched_mesh, rgb, face_boxes)
+        for face, ref in zip(faces, reference):
+            batched = face['landmarks'] is not None
+            batched_meshed += batched
+            roi_meshed += not np.isnan(ref[0])
+            if batched and not np.isnan(ref[0]):
+                pitch_err.append(abs(face['pitch'] - ref[0]))
+                yaw_err.append(abs(face['yaw'] - ref[1]))
+
+    cap.release()
+
+    return {
+        "video": video_path,
+        "frames": frame_count,
+        "faces": faces_total,
+        "meshed_per_crop": roi_meshed,
+        "meshed_batched": batched_meshed,
+        "meshed_by_mosaic": mosaic_meshed,
+        "yaw_abs_err_mean": float(np.mean(yaw_err)) if yaw_err else None,
+        "yaw_abs_err_p95": float(np.percentile(yaw_err, 95)) if yaw_err else None,
+        "pitch_abs_err_mean": float(np.mean(pitch_err)) if pitch_err else None,
+        "pitch_abs_err_p95": float(np.percentile(pitch_err, 95)) if pitch_err else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Recorded exam video")
+    parser.add_argument("--frames", type=int, default=300, help="Maximum frames to compare")
+    parser.add_argument("--max-error", type=float, default=5.0, help="Largest mean yaw/pitch error allowed, in degrees")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = compare(args.video, args.frames)
+    for key, value in report.items():
+        print(f"  {key:20s} {'n/a' if value is None else (f'{value:.3f}' if isinstance(value, float) else value)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    problems = []
+    if report["meshed_batched"] < report["meshed_per_crop"]:
+        problems.append(f"batched path meshed {report['meshed_batched']} faces, per-crop {report['meshed_per_crop']}")
+    for key in ("yaw_abs_err_mean", "pitch_abs_err_mean"):
+        if report[key] is not None and report[key] > args.max_error:
+            problems.append(f"{key} {report[key]:.2f} > {args.max_error}")
+    for problem in problems:
+        print(f"[CHECK] {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Synthetic scenes and stand-in models for the offline benchmarks.
+
+A scene is a sequence of frames plus the detections every model "finds" on
+them: face boxes on a grid, one COCO pose per face and phones near some of
+the faces. Scenes can be saved to / loaded from .npz so a run can be replayed
+exactly, and the frames can come from a recorded video instead of noise.
+
+The Mock* classes answer the same calls the detection modules make on the
+ultralytics / MediaPipe / DeepSort objects, returning the scene's detections,
+so every stage of the pipeline runs on CPU without model weights.
+"""
+
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from detection import face_detection
+
+PHONE_CLASS_ID = 67
+# Every HAND_NEAR_EVERY-th person holds a hand to their face, every PHONE_EVERY-th has a phone
+HAND_NEAR_EVERY = 3
+PHONE_EVERY = 5
+
+
+class Scene:
+    def __init__(self, frames, face_boxes, phone_boxes, keypoints, fps=30.0):
+        self.frames = frames            # (F, H, W, 3) uint8
+        self.face_boxes = face_boxes    # (F, N, 4) float
+        self.phone_boxes = phone_boxes  # (F, P, 4) float
+        self.keypoints = keypoints      # (F, N, 17, 3) float
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def num_faces(self):
+        return self.face_boxes.shape[1]
+
+    @property
+    def resolution(self):
+        return self.frames.shape[2], self.frames.shape[1]
+
+    def save(self, path):
+        np.savez_compressed(path, frames=self.frames, face_boxes=self.face_boxes,
+                            phone_boxes=self.phone_boxes, keypoints=self.keypoints, fps=self.fps)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["frames"], data["face_boxes"], data["phone_boxes"], data["keypoints"], float(data["fps"]))
+
+
+def read_video_frames(video_path, num_frames, width, height):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < num_frames:
+        ret, frame = cap.read()
+        if not ret:
+            if not frames:
+                raise SystemExit(f"Could not read frames from {video_path}")
+            # Loop short recordings
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frames.append(cv2.resize(frame, (width, height)))
+    cap.release()
+    return np.stack(frames)
+
+
+def make_scene(num_faces, width=1280, height=720, num_frames=100, fps=30.0, video_path=None, seed=0):
+    """Lay `num_faces` people out on a grid and let them sway a little from frame to frame."""
+    rng = np.random.default_rng(seed)
+    if video_path:
+        frames = read_video_frames(video_path, num_frames, width, height)
+    else:
+        base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        frames = np.stack([np.roll(base, i, axis=1) for i in range(num_frames)])
+
+    cols = int(np.ceil(np.sqrt(num_faces * width / height)))
+    rows = int(np.ceil(num_faces / cols))
+    cell_w, cell_h = width / cols, height / rows
+    face_size = 0.3 * min(cell_w, cell_h)
+
+    slots = np.arange(num_faces)
+    centers = np.stack([(slots % cols + 0.5) * cell_w, (slots // cols + 0.3) * cell_h], axis=1)
+    phase = rng.uniform(0, 2 * np.pi, size=num_faces)
+    t = np.arange(num_frames)[:, None] / fps
+    sway = 0.05 * face_size * np.sin(2 * np.pi * 0.5 * t + phase)
+    face_centers = centers[None].repeat(num_frames, axis=0)
+    face_centers[..., 0] += sway
+
+    half = face_size / 2
+    face_boxes = np.concatenate([face_centers - half, face_centers + half], axis=2)
+
+    keypoints = np.zeros((num_frames, num_faces, 17, 3))
+    keypoints[..., 2] = 0.9
+    # Seated people seen from the front of the room; compact enough not to reach the next row's faces
+    offsets = np.array([
+        (0, 0), (-0.2, -0.15), (0.2, -0.15), (-0.45, 0), (0.45, 0),  # nose, eyes, ears
+        (-0.9, 0.8), (0.9, 0.8), (-1.1, 1.3), (1.1, 1.3),            # shoulders, elbows
+        (-0.6, 1.6), (0.6, 1.6),                                     # wrists, resting on the desk
+        (-0.6, 1.9), (0.6, 1.9), (-0.6, 2.1), (0.6, 2.1), (-0.6, 2.3), (0.6, 2.3),
+    ]) * face_size
+    keypoints[..., :2] = face_centers[:, :, None, :] + offsets
+    hand_up = slots % HAND_NEAR_EVERY == 0
+    keypoints[:, hand_up, 10, :2] = face_centers[:, hand_up] + (0, 0.2 * face_size)
+
+    with_phone = slots[slots % PHONE_EVERY == 0]
+    phone_w, phone_h = max(30, 0.4 * face_size), max(50, 0.7 * face_size)
+    phone_tl = face_centers[:, with_phone] + (0.7 * face_size, 0.6 * face_size)
+    phone_boxes = np.concatenate([phone_tl, phone_tl + (phone_w, phone_h)], axis=2)
+
+    for boxes in (face_boxes, phone_boxes):
+        boxes[..., [0, 2]] = boxes[..., [0, 2]].clip(0, width - 1)
+        boxes[..., [1, 3]] = boxes[..., [1, 3]].clip(0, height - 1)
+    keypoints[..., 0] = keypoints[..., 0].clip(0, width - 1)
+    keypoints[..., 1] = keypoints[..., 1].clip(0, height - 1)
+    return Scene(frames, face_boxes, phone_boxes, keypoints, fps)
+
+
+# ======= Stand-in models =======
+class _Array:
+    """Mimics a torch tensor just enough for `.cpu().numpy()`."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data  # (N, 6): x1, y1, x2, y2, conf, cls
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for row in self.data:
+            yield SimpleNamespace(xyxy=row[None, :4])
+
+
+class MockModel:
+    """Stand-in for a YOLO model; returns the scene's detections of the current frame."""
+
+    def __init__(self, scene, kind):
+        self.scene = scene
+        self.kind = kind
+        self.frame_index = 0
+        self.names = {0: "person", PHONE_CLASS_ID: "cell phone"} if kind == "phone" else {0: "face"}
+
+    def predict(self, source=None, conf=0.25, verbose=False, **kwargs):
+        i = self.frame_index
+        if self.kind == "pose":
+            kpts = self.scene.keypoints[i]
+            keypoints = SimpleNamespace(xy=_Array(kpts[..., :2]), conf=_Array(kpts[..., 2]))
+            return [SimpleNamespace(keypoints=keypoints)]
+        if self.kind == "phone":
+            boxes, cls = self.scene.phone_boxes[i], PHONE_CLASS_ID
+        else:
+            boxes, cls = self.scene.face_boxes[i], 0
+        data = np.concatenate([boxes, np.full((len(boxes), 1), 0.9), np.full((len(boxes), 1), cls)], axis=1)
+        return [SimpleNamespace(boxes=_Boxes(data))]
+
+    def __call__(self, source=None, **kwargs):
+        return self.predict(source, **kwargs)
+
+
+class MockFaceMesh:
+    """Stand-in for MediaPipe FaceMesh: one mesh centred in every occupied mosaic tile."""
+
+    def __init__(self, num_faces, seed=0):
+        self.num_faces = num_faces
+        rng = np.random.default_rng(seed)
+        # 468 points spread over the middle of a tile, nose (landmark 1) in the centre
+        self.template = rng.uniform(0.25, 0.75, size=(468, 2)) * face_detection.FACE_TILE_SIZE
+        self.template[face_detection.POSE_LANDMARK_IDS[0]] = face_detection.FACE_TILE_SIZE / 2
+        self._cache = {}
+
+    def process(self, mosaic):
+        key = mosaic.shape
+        if key not in self._cache:
+            self._cache[key] = SimpleNamespace(multi_face_landmarks=self._meshes(mosaic.shape))
+        return self._cache[key]
+
+    def _meshes(self, shape):
+        h, w = shape[:2]
+        pad = face_detection.FACE_TILE_PAD
+        cell = face_detection.FACE_TILE_SIZE + pad
+        cols = max(1, (w - pad) // cell)
+        meshes = []
+        for slot in range(self.num_faces):
+            origin = np.array([pad + (slot % cols) * cell, pad + (slot // cols) * cell])
+            points = (self.template + origin) / (w, h)
+            meshes.append(SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=0.0) for x, y in points]))
+        return meshes
+
+
+class _Track:
+    def __init__(self, track_id, bbox):
+        self.track_id = track_id
+        self._bbox = bbox
+
+    def is_confirmed(self):
+        return True
+
+    def to_tlbr(self):
+        return self._bbox
+
+
+class MockTracker:
+    """Stand-in for DeepSort: detections keep the id of their position in the list."""
+
+    def update_tracks(self, detections, frame=None):
+        return [_Track(str(i), bbox) for i, (bbox, _, _) in enumerate(detections)]
+
+
+def mock_models(scene):
+    return {
+        'phone': MockModel(scene, "phone"),
+        'face': MockModel(scene, "face"),
+        'face_mesh': MockFaceMesh(scene.num_faces),
+        'pose': MockModel(scene, "pose"),
+        'tracker': MockTracker(),
+    }
@@ -0,0 +1,273 @@
+"""Rules engine vs. the per-face scoring loop it replaced.
+
+Feeds the same randomized frames (faces glancing, hands on faces, phones,
+people turning around) to cheating_logic.update_scores, which evaluates the
+rules in utils/scoring_rules.json over all faces at once, and to
+legacy_update_scores below, a frozen copy of the hard-coded per-face loop.
+Checks that both produce the same scores and log events, then reports the
+latency of each per face count.
+
+    python -m benchmarks.rules_benchmark --faces 1,10,40,100 --frames 300
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from functools import partial
+
+import cv2
+import numpy as np
+
+from benchmarks import fixtures
+from utils import cheating_logic
+from utils.cheating_logic import clamp_bbox, crop, is_turned_back, log_event, pose_bbox
+from utils.detection_helpers import associate_poses_to_faces, keypoint_array
+
+REPLAY_START = 1_700_000_000.0
+
+
+# ======= Legacy per-face loop =======
+def is_valid_phone_box(box, min_area=1000, min_aspect=0.4, max_aspect=2.5):
+    x1, y1, x2, y2 = box
+    width = x2 - x1
+    height = y2 - y1
+    if width <= 0 or height <= 0:
+        return False
+    aspect_ratio = height / width
+    area = width * height
+    return min_aspect < aspect_ratio < max_aspect and area >= min_area
+
+def boxes_intersect(b1, b2):
+    return not (b1[2] < b2[0] or b1[0] > b2[2] or b1[3] < b2[1] or b1[1] > b2[3])
+
+def is_near(box1, box2, max_dist=50):
+    x1c = (box1[0] + box1[2]) / 2
+    y1c = (box1[1] + box1[3]) / 2
+    x2c = (box2[0] + box2[2]) / 2
+    y2c = (box2[1] + box2[3]) / 2
+    dist = ((x1c - x2c)**2 + (y1c - y2c)**2)**0.5
+    return dist < max_dist
+
+def legacy_update_scores(faces, phone_boxes, hands_near_face_dict, now, frame, hand_boxes=None, pose_keypoints_list=None, state=None):
+    timestamp_str = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+
+    keypoints = keypoint_array(pose_keypoints_list)
+    turned_back = [is_turned_back(pose_kpts) for pose_kpts in keypoints]
+
+    frame_seq = state.frame_ring.push(frame) if faces else None
+    state.faces.evict(now)
+    store = state.faces
+
+    face_to_pose, unmatched_poses = associate_poses_to_faces(
+        keypoints, [face['bbox'] for face in faces], max_dist=100
+    )
+
+    for face_index, face in enumerate(faces):
+        face_id = face['id']
+        slot = store.slot(face_id, now)
+        pitch = face.get('pitch', 0)
+        yaw = face.get('yaw', 0)
+        suspicion_level = 0.0
+        is_glance = False
+        suspicious = False
+
+        store.push_frame_ref(slot, frame_seq, face['bbox'])
+
+        if abs(yaw) > 60 or pitch < -40:
+            suspicion_level += 0.15
+            is_glance = True
+            suspicious = True
+
+        if is_glance:
+            if store.add_glance(slot, now, 10) >= 6:
+                suspicion_level = 1.0
+                suspicious = True
+                cropped_face = partial(crop, frame, face['bbox'])
+                log_event(timestamp_str, face_id, "Looking around frequently", "warning", cropped_face, class_id=state.class_id, state=state, now=now)
+
+        if hands_near_face_dict.get(face_id, False):
+            suspicion_level += 0.4
+            suspicious = True
+
+        for (px1, py1, px2, py2) in phone_boxes:
+            if not is_valid_phone_box((px1, py1, px2, py2)):
+                continue
+            if boxes_intersect((px1, py1, px2, py2), face['bbox']):
+                suspicion_level += 0.7
+                suspicious = True
+                cropped_face = partial(crop, frame, face['bbox'])
+                log_event(timestamp_str, face_id, "Phone detected", "critical", cropped_face, class_id=state.class_id, state=state, now=now)
+                break
+
+        phone_near, phone_near_hand = False, False
+        for phone_box in phone_boxes:
+            if not is_valid_phone_box(phone_box):
+                continue
+            if is_near(phone_box, face['bbox']):
+                phone_near = True
+            if hand_boxes:
+                for hand_box in hand_boxes:
+                    if is_near(phone_box, hand_box):
+                        phone_near_hand = True
+                        break
+
+        if phone_near_hand:
+            suspicion_level += 0.9
+            suspicious = True
+            cropped_face = partial(crop, frame, face['bbox'])
+            log_event(timestamp_str, face_id, "Phone detected NEAR HAND", "critical", cropped_face, class_id=state.class_id, state=state, now=now)
+        elif phone_near:
+            suspicion_level += 0.7
+            suspicious = True
+            cropped_face = partial(crop, frame, face['bbox'])
+            log_event(timestamp_str, face_id, "Phone detected near face", "critical", cropped_face, class_id=state.class_id, state=state, now=now)
+
+        if hands_near_face_dict.get(face_id, False):
+            if np.isnan(store.hands_start[slot]):
+                store.hands_start[slot] = now
+            elif now - store.hands_start[slot] > 3.0:
+                suspicion_level += 0.4
+                suspicious = True
+        else:
+            store.hands_start[slot] = np.nan
+
+        pose_idx = face_to_pose.get(face_index)
+        if pose_idx is not None and turned_back[pose_idx]:
+            suspicion_level += 0.7
+            suspicious = True
+            cropped_face = partial(crop, frame, face['bbox'])
+            log_event(timestamp_str, face_id, "Turned back detected", "warning", cropped_face, class_id=state.class_id, state=state, now=now)
+
+        suspicion_level = min(1.0, suspicion_level)
+        alpha = 0.5
+        prev_score = store.score[slot]
+        new_score = prev_score * (1 - alpha) + suspicion_level * 100 * alpha
+
+        if store.glance_count[slot] >= 6:
+            new_score = min(100, new_score + 10)
+
+        if not suspicious:
+            time_since_last = now - store.last_suspicious[slot]
+            decay_amount = 5.0 * time_since_last
+            new_score = max(0, new_score - decay_amount)
+        else:
+            store.last_suspicious[slot] = now
+
+        store.score[slot] = max(0, min(100, new_score))
+
+        if store.score[slot] > 85:
+            cropped_face = partial(crop, frame, face['bbox'])
+            video_clip = partial(state.frame_ring.materialize, store.frame_refs(slot))
+            log_event(timestamp_str, face_id, "CHEATING LIKELY", "critical", cropped_face, class_id=state.class_id, video_clip=video_clip, state=state, now=now)
+        elif store.score[slot] > 50:
+            cropped_face = partial(crop, frame, face['bbox'])
+            log_event(timestamp_str, face_id, "Suspicious behavior", "warning", cropped_face, class_id=state.class_id, state=state, now=now)
+
+    for i in unmatched_poses:
+        pose_id = f"pose_only_{i}"
+        pose_kpts = keypoints[i]
+        suspicion_level = 0.0
+        if turned_back[i]:
+            suspicion_level += 0.7
+            bbox = pose_bbox(pose_kpts)
+            cropped_pose = partial(crop, frame, bbox) if bbox is not None else None
+            state.pose_only_scores[pose_id] = min(100, state.pose_only_scores.get(pose_id, 0) * 0.8 + suspicion_level * 100 * 0.2)
+            if state.pose_only_scores[pose_id] > 85:
+                log_event(timestamp_str, pose_id, "CHEATING LIKELY", "critical", cropped_pose, class_id=state.class_id, state=state, now=now)
+            elif state.pose_only_scores[pose_id] > 50:
+                log_event(timestamp_str, pose_id, "Suspicious behavior", "warning", cropped_pose, class_id=state.class_id, state=state, now=now)
+
+    for phone_box in phone_boxes:
+        if not is_valid_phone_box(phone_box):
+            continue
+        phone_logged = False
+        for face in faces:
+            if is_near(phone_box, face['bbox']):
+                phone_logged = True
+                break
+        if not phone_logged:
+            x1, y1, x2, y2 = clamp_bbox(phone_box, frame.shape)
+            cropped_phone = partial(crop, frame, (x1, y1, x2, y2))
+            log_event(timestamp_str, face_id="phone_only", activity="Phone detected (no face nearby)", severity="warning", cropped_face=cropped_phone, class_id=state.class_id, state=state, now=now)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            cv2.putText(frame, "Phone?", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+
+
+# ======= Inputs =======
+def make_inputs(num_faces, num_frames, seed=0):
+    """Per-frame update_scores arguments with every signal switching on and off over time."""
+    scene = fixtures.make_scene(num_faces, num_frames=min(num_frames, 60), seed=seed)
+    rng = np.random.default_rng(seed)
+    # Some people glance around a lot, some keep a hand on their face for seconds at a time
+    glance_rate = rng.choice([0.02, 0.3], size=num_faces, p=[0.7, 0.3])
+    hand_runs = rng.random((num_frames // 30 + 1, num_faces)) < 0.2
+    inputs = []
+    for i in range(num_frames):
+        j = i % len(scene)
+        glancing = rng.random(num_faces) < glance_rate
+        yaw = np.where(glancing, rng.choice([-75.0, 75.0], size=num_faces), rng.normal(0, 15, num_faces))
+        pitch = rng.normal(-5, 10, num_faces)
+        faces = [{'id': str(k), 'bbox': scene.face_boxes[j, k].astype(int).tolist(),
+                  'yaw': float(yaw[k]), 'pitch': float(pitch[k])} for k in range(num_faces)]
+        hands_near = {str(k): bool(hand_runs[i // 30, k]) for k in range(num_faces)}
+        keypoints = scene.keypoints[j].copy()
+        # Now and then someone turns around: nose no longer visible
+        keypoints[rng.random(num_faces) < 0.05, 0, 2] = 0.1
+        phone_boxes = scene.phone_boxes[j].astype(int).tolist()
+        if i % 10 == 0:
+            # A phone held right in front of someone's face
+            cx, cy = np.mean(np.reshape(faces[rng.integers(num_faces)]['bbox'], (2, 2)), axis=0).astype(int)
+            phone_boxes.append([cx - 20, cy - 35, cx + 20, cy + 35])
+        inputs.append((faces, phone_boxes, hands_near,
+                       REPLAY_START + i / scene.fps, scene.frames[j], keypoints))
+    return inputs
+
+
+def run(update, inputs):
+    events = []
+    sink = lambda timestamp_str, face_id, activity, *args, **kwargs: events.append((kwargs.get("now"), face_id, activity)) or True
+    state = cheating_logic.ScoreState(log_sink=sink)
+    times = []
+    for faces, phone_boxes, hands_near, now, frame, keypoints in inputs:
+        start = time.perf_counter()
+        update(faces, phone_boxes, hands_near, now, frame, pose_keypoints_list=keypoints, state=state)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000, events, state.faces.scores()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the scoring rules engine with the legacy per-face loop.")
+    parser.add_argument("--faces", default="1,10,40,100", help="Comma-separated face counts")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    mismatch = False
+    print(f"{'faces':>6}{'legacy p50 ms':>15}{'rules p50 ms':>14}{'speedup':>9}{'events':>8}  same output")
+    for num_faces in [int(n) for n in args.faces.split(",")]:
+        inputs = make_inputs(num_faces, args.frames, args.seed)
+        run(cheating_logic.update_scores, inputs[:5])  # warm-up
+        legacy_ms, legacy_events, legacy_scores = run(legacy_update_scores, inputs)
+        rules_ms, rules_events, rules_scores = run(cheating_logic.update_scores, inputs)
+        same = legacy_events == rules_events and legacy_scores == rules_scores
+        mismatch |= not same
+        legacy_p50, rules_p50 = float(np.percentile(legacy_ms, 50)), float(np.percentile(rules_ms, 50))
+        print(f"{num_faces:>6}{legacy_p50:>15.3f}{rules_p50:>14.3f}{legacy_p50 / rules_p50:>8.1f}x"
+              f"{len(rules_events):>8}  {'yes' if same else 'NO'}")
+        results[num_faces] = {"legacy_p50_ms": legacy_p50, "rules_p50_ms": rules_p50,
+                              "events": len(rules_events), "same_output": same}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if mismatch:
+        print("[BENCH] Rules engine output differs from the legacy loop")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Per-stage throughput and memory benchmark of the detection loop.
+
+Replays a scene (synthetic frames or a recorded video, see benchmarks/fixtures.py)
+through every stage main.py runs on a frame and reports, for each face count
+and resolution, the latency percentiles and the peak Python/numpy allocation of
+each stage. Models are mocked by default so the run is CPU-only, deterministic
+and measures this repo's code rather than the networks.
+
+    python -m benchmarks.stage_benchmark --faces 1,10,40 --resolutions 1280x720
+    python -m benchmarks.stage_benchmark --write-baseline benchmarks/baseline.json
+    python -m benchmarks.stage_benchmark --baseline benchmarks/baseline.json   # exits 1 on regression
+
+benchmarks/baseline.json is generated from the default synthetic scenes. Its
+outputs (detections, log events, scores) must match exactly on any machine;
+its timings are from the machine that wrote it, so on other hardware use
+--outputs-only or write a local baseline first.
+
+With --models real the YOLO/FaceMesh/DeepSort models are loaded from models/
+(use --video so they have something to detect).
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks import fixtures
+from detection import face_detection, object_detection, pose_detection
+from utils import cheating_logic, tracker
+from utils.detection_helpers import merge_pose_to_tracked
+
+# Event clock of the replay: a fixed epoch, so cooldowns and log events are the same on every run
+REPLAY_START = 1_700_000_000.0
+
+STAGES = ["detect_phones", "get_faces", "estimate_pose", "get_tracked_faces",
+          "merge_pose_to_tracked", "hands_near_faces", "update_scores"]
+
+
+def real_models():
+    return {
+        'phone': object_detection.load_model('models/yolov5su.pt', device='cpu'),
+        'face': face_detection.load_face_model(),
+        'face_mesh': face_detection.create_face_mesh(),
+        'pose': pose_detection.init_pose(),
+        'tracker': tracker.create_tracker(),
+    }
+
+
+class StageTimer:
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.times = {name: [] for name in STAGES}
+        self.peaks = {name: 0 for name in STAGES}
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = fn(*args, **kwargs)
+            self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1] - before)
+            return result
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.times[name].append(time.perf_counter() - start)
+        return result
+
+
+def replay(scene, models, timer, num_frames):
+    """Run every stage over the scene. Returns outputs that must not change between runs."""
+    face_tracker = models['tracker']
+    # Count log events instead of queueing uploads and DB writes
+    logged = []
+    state = cheating_logic.ScoreState(log_sink=lambda *args, **kwargs: logged.append(args[2]) or True)
+    phones = faces = merged = hands = 0
+    for i in range(num_frames):
+        i %= len(scene)
+        for model in (models['phone'], models['face'], models['pose']):
+            if isinstance(model, fixtures.MockModel):
+                model.frame_index = i
+        frame = scene.frames[i]
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w = frame.shape[:2]
+        now = REPLAY_START + i / scene.fps
+
+        phone_boxes = timer.run("detect_phones", object_detection.detect_phones, models['phone'], frame)
+        detected = timer.run("get_faces", face_detection.get_faces, models['face'], models['face_mesh'], rgb, w, h)
+        pose_result = timer.run("estimate_pose", pose_detection.estimate_pose, models['pose'], frame)
+        detections = [([f['bbox'][0], f['bbox'][1], f['bbox'][2], f['bbox'][3]], 1.0, 0) for f in detected]
+        tracked = timer.run("get_tracked_faces", tracker.get_tracked_faces, frame, detections, face_tracker)
+        tracked = timer.run("merge_pose_to_tracked", merge_pose_to_tracked, tracked, detected)
+        hands_near = timer.run("hands_near_faces", pose_detection.hands_near_faces, pose_result, tracked)
+        timer.run("update_scores", cheating_logic.update_scores, tracked, phone_boxes, hands_near, now,
+                  frame.copy(), pose_keypoints_list=pose_result, state=state)
+
+        phones += len(phone_boxes)
+        faces += len(detected)
+        merged += len(tracked)
+        hands += sum(hands_near.values())
+
+    return {
+        "phones": phones,
+        "faces": faces,
+        "tracked": merged,
+        "hands_near": hands,
+        "log_events": len(logged),
+        "score_sum": round(float(sum(state.cheating_scores.values())), 3),
+    }
+
+
+def bench_config(num_faces, width, height, args):
+    if args.fixture:
+        scene = fixtures.Scene.load(args.fixture)
+    else:
+        scene = fixtures.make_scene(num_faces, width, height, num_frames=min(args.frames, 120),
+                                    video_path=args.video, seed=args.seed)
+        if args.save_fixture:
+            path = args.save_fixture.format(faces=num_faces, width=width, height=height)
+            scene.save(path)
+            print(f"[BENCH] Scene saved to {path}")
+
+    def build_models():
+        return fixtures.mock_models(scene) if args.models == "mock" else real_models()
+
+    # Warm-up, then timing and memory in separate passes so tracemalloc does not skew the timings
+    replay(scene, build_models(), StageTimer(), min(5, args.frames))
+    timer = StageTimer()
+    outputs = replay(scene, build_models(), timer, args.frames)
+
+    mem_timer = StageTimer(track_memory=True)
+    tracemalloc.start()
+    try:
+        replay(scene, build_models(), mem_timer, min(args.memory_frames, args.frames))
+    finally:
+        tracemalloc.stop()
+
+    stages = {}
+    for name in STAGES:
+        ms = np.array(timer.times[name]) * 1000
+        stages[name] = {
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "calls_per_s": float(1000 / ms.mean()) if ms.mean() > 0 else 0.0,
+            "peak_kb": mem_timer.peaks[name] / 1024,
+        }
+    frame_ms = sum(s["mean_ms"] for s in stages.values())
+    return {
+        "faces": scene.num_faces,
+        "resolution": f"{scene.resolution[0]}x{scene.resolution[1]}",
+        "frames": args.frames,
+        "fps": 1000 / frame_ms if frame_ms > 0 else 0.0,
+        "stages": stages,
+        "outputs": outputs,
+    }
+
+
+def print_report(result):
+    print(f"\n=== {result['faces']} faces @ {result['resolution']} | {result['fps']:.1f} FPS (all stages) ===")
+    print(f"{'stage':<24}{'mean ms':>10}{'p95 ms':>10}{'calls/s':>12}{'peak KB':>12}")
+    for name, s in result["stages"].items():
+        print(f"{name:<24}{s['mean_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['calls_per_s']:>12.1f}{s['peak_kb']:>12.1f}")
+    print(f"outputs: {result['outputs']}")
+
+
+def compare_to_baseline(results, baseline, tolerance, memory_tolerance, outputs_only=False):
+    """List of human-readable regressions of `results` against `baseline`."""
+    problems = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"[BENCH] No baseline for {key}, skipping")
+            continue
+        for field, value in result["outputs"].items():
+            if base["outputs"].get(field) != value:
+                problems.append(f"{key}: {field} changed {base['outputs'].get(field)} -> {value}")
+        if outputs_only:
+            continue
+        for name, s in result["stages"].items():
+            b = base["stages"].get(name)
+            if b is None:
+                continue
+            if s["p50_ms"] > b["p50_ms"] * (1 + tolerance):
+                problems.append(f"{key} {name}: p50 {b['p50_ms']:.3f}ms -> {s['p50_ms']:.3f}ms")
+            if s["peak_kb"] > b["peak_kb"] * (1 + memory_tolerance) + 64:
+                problems.append(f"{key} {name}: peak memory {b['peak_kb']:.0f}KB -> {s['peak_kb']:.0f}KB")
+    return problems
+
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in res.lower().split("x")) for res in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", default="1,10,40", help="comma-separated face counts")
+    parser.add_argument("--resolutions", default="1280x720", help="comma-separated WxH")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--memory-frames", type=int, default=20)
+    parser.add_argument("--models", choices=["mock", "real"], default="mock")
+    parser.add_argument("--video", help="take frames from this recording instead of noise")
+    parser.add_argument("--fixture", help="replay a scene saved with --save-fixture")
+    parser.add_argument("--save-fixture", help="save each generated scene, e.g. scene_{faces}_{width}x{height}.npz")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="fail if results regress against this file")
+    parser.add_argument("--write-baseline", help="store the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.5, help="allowed peak memory growth")
+    parser.add_argument("--outputs-only", action="store_true", help="compare only the outputs with --baseline, not timings")
+    args = parser.parse_args()
+
+    results = {}
+    for width, height in parse_resolutions(args.resolutions):
+        for num_faces in [int(n) for n in args.faces.split(",")]:
+            result = bench_config(num_faces, width, height, args)
+            results[f"{result['faces']}faces@{result['resolution']}"] = result
+            print_report(result)
+            if args.fixture:
+                break
+        if args.fixture:
+            break
+
+    for path in filter(None, [args.json, args.write_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[BENCH] Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare_to_baseline(results, baseline, args.tolerance, args.memory_tolerance, args.outputs_only)
+        if problems:
+            print("\n[BENCH] REGRESSIONS against " + args.baseline)
+            for problem in problems:
+                print(f"  ✗ {problem}")
+            sys.exit(1)
+        print(f"\n[BENCH] No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import numpy as np
 import cv2
 from ultralytics import YOLO
 
+from utils.profiler import profiler
+
 mp_face_mesh = mp.solutions.face_mesh
 
 MODEL_POINTS = np.array([
@@ -14,61 +16,204 @@ MODEL_POINTS = np.array([
     (28.9, -28.9, -24.1)            # Right mouth corner
 ])
 
+FACE_TILE_SIZE = 192    # each face crop is letterboxed into a square tile of this size
+FACE_TILE_PAD = 16      # empty border between tiles so meshes never span two faces
+# FaceMesh finds faces with a 128 px detector, so a mosaic holds at most MOSAIC_GRID x MOSAIC_GRID
+# tiles; more faces are split over several mosaics
+MOSAIC_GRID = 4
+
+# FaceMesh landmark ids matching MODEL_POINTS, in the same order
+POSE_LANDMARK_IDS = np.array([
+    1,      # Nose tip
+    152,    # Chin
+    263,    # Right eye right corner
+    33,     # Left eye left corner
+    287,    # Right mouth corner
+    57      # Left mouth corner
+])
+
+def create_face_mesh():
+    # The mosaic layout changes whenever faces come, go or move, so FaceMesh must not track
+    # landmarks from one call to the next; it detects afresh in every mosaic.
+    return mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=MOSAIC_GRID * MOSAIC_GRID)
+
+def load_face_model():
+    return YOLO("models/yolov8s-face-lindevs.pt")
+
 def init_face_mesh():
-    yolo_model = YOLO("models/yolov8s-face-lindevs.pt")
-    face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=5)
+    yolo_model = load_face_model()
+    face_mesh = create_face_mesh()
     return yolo_model, face_mesh
 
 def get_faces(yolo_model, face_mesh, rgb_frame, frame_width, frame_height):
-    results = yolo_model.predict(source=rgb_frame, verbose=False, conf=0.4)
-    faces = []
+    with profiler.stage("face_yolo"):
+        results = yolo_model.predict(source=rgb_frame, verbose=False, conf=0.4)
+    if not results:
+        return []
+    return faces_from_result(results[0], face_mesh, rgb_frame, frame_width, frame_height)
 
-    if not results or not results[0].boxes:
-        return faces
+def get_faces_batch(yolo_model, face_meshes, rgb_frames):
+    """Run the face detector once over several frames.
 
-    for i, box in enumerate(results[0].boxes):
-        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+    face_meshes[i] is the FaceMesh instance belonging to the stream of rgb_frames[i].
+    """
+    if not rgb_frames:
+        return []
+    results = yolo_model.predict(source=list(rgb_frames), verbose=False, conf=0.4)
+    faces_per_frame = []
+    for result, face_mesh, rgb_frame in zip(results, face_meshes, rgb_frames):
+        h, w = rgb_frame.shape[:2]
+        faces_per_frame.append(faces_from_result(result, face_mesh, rgb_frame, w, h))
+    return faces_per_frame
+
+def faces_from_result(result, face_mesh, rgb_frame, frame_width, frame_height):
+    if not result.boxes:
+        return []
+    boxes = [box.xyxy[0].tolist() for box in result.boxes]
+    return faces_from_boxes(boxes, face_mesh, rgb_frame, frame_width, frame_height)
+
+@profiler.timed("facemesh")
+def faces_from_boxes(boxes, face_mesh, rgb_frame, frame_width, frame_height):
+    """Estimate head pose with FaceMesh inside each (x1, y1, x2, y2) face box.
+
+    All face crops of the frame are packed into one mosaic so FaceMesh runs once
+    per frame instead of once per face.
+    """
+    face_boxes = []
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box)
         x1, y1 = max(0, x1), max(0, y1)
         x2, y2 = min(frame_width - 1, x2), min(frame_height - 1, y2)
+        if x2 > x1 and y2 > y1:
+            face_boxes.append((x1, y1, x2, y2))
 
-        face_roi = cv2.cvtColor(rgb_frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
-        mesh_results = face_mesh.process(face_roi)
-
-        pitch, yaw, roll = 0, 0, 0
-        if mesh_results.multi_face_landmarks:
-            landmarks = mesh_results.multi_face_landmarks[0]
-            image_points = np.array([
-                (landmarks.landmark[1].x * (x2 - x1), landmarks.landmark[1].y * (y2 - y1)),     # Nose tip
-                (landmarks.landmark[152].x * (x2 - x1), landmarks.landmark[152].y * (y2 - y1)), # Chin
-                (landmarks.landmark[263].x * (x2 - x1), landmarks.landmark[263].y * (y2 - y1)), # Right eye right corner
-                (landmarks.landmark[33].x * (x2 - x1), landmarks.landmark[33].y * (y2 - y1)),   # Left eye left corner
-                (landmarks.landmark[287].x * (x2 - x1), landmarks.landmark[287].y * (y2 - y1)), # Right mouth corner
-                (landmarks.landmark[57].x * (x2 - x1), landmarks.landmark[57].y * (y2 - y1))    # Left mouth corner
-            ], dtype="double")
-
-            focal_length = x2 - x1
-            center = (focal_length / 2, (y2 - y1) / 2)
-            camera_matrix = np.array([
-                [focal_length, 0, center[0]],
-                [0, focal_length, center[1]],
-                [0, 0, 1]
-            ], dtype="double")
-
-            dist_coeffs = np.zeros((4, 1))
-            success, rvec, tvec = cv2.solvePnP(MODEL_POINTS, image_points, camera_matrix, dist_coeffs)
-            if success:
-                rmat, _ = cv2.Rodrigues(rvec)
-                proj_matrix = np.hstack((rmat, tvec))
-                _, _, _, _, _, _, angles = cv2.decomposeProjectionMatrix(proj_matrix)
-                pitch, yaw, roll = [angle[0] for angle in angles]
+    landmarks_per_face = mesh_landmarks_batch(face_mesh, rgb_frame, face_boxes)
+    angles = np.zeros((len(face_boxes), 3))
+    with_mesh = [i for i, lm in enumerate(landmarks_per_face) if lm is not None]
+    if with_mesh:
+        image_points = np.stack([landmarks_per_face[i][POSE_LANDMARK_IDS] for i in with_mesh])
+        angles[with_mesh] = head_pose_angles(image_points, [face_boxes[i] for i in with_mesh])
 
+    faces = []
+    for i, (x1, y1, x2, y2) in enumerate(face_boxes):
+        pitch, yaw, roll = angles[i]
         faces.append({
             'id': i,
             'bbox': (x1, y1, x2, y2),
             'pitch': pitch,
             'yaw': yaw,
             'roll': roll,
-            'landmarks': mesh_results.multi_face_landmarks[0] if mesh_results.multi_face_landmarks else None
+            'landmarks': landmarks_per_face[i]
         })
 
     return faces
+
+# === Batched FaceMesh ===
+def mesh_landmarks_batch(face_mesh, rgb_frame, face_boxes):
+    """Run FaceMesh over the face crops of a frame, up to MOSAIC_GRID**2 crops per call.
+
+    Returns, for each box, a (468, 2) array of landmark pixel coordinates relative
+    to the box's top-left corner, or None where no mesh was found. Faces the mosaic
+    missed are retried one crop at a time.
+    """
+    landmarks_per_face = [None] * len(face_boxes)
+    # Tiles follow left-to-right order so a face keeps roughly the same place from frame to frame
+    order = sorted(range(len(face_boxes)), key=lambda i: face_boxes[i][0])
+    per_mosaic = MOSAIC_GRID * MOSAIC_GRID
+    for start in range(0, len(order), per_mosaic):
+        mesh_mosaic(face_mesh, rgb_frame, face_boxes, order[start:start + per_mosaic], landmarks_per_face)
+
+    for i, landmarks in enumerate(landmarks_per_face):
+        if landmarks is None:
+            landmarks_per_face[i] = mesh_landmarks_roi(face_mesh, rgb_frame, face_boxes[i])
+    return landmarks_per_face
+
+def mesh_mosaic(face_mesh, rgb_frame, face_boxes, order, landmarks_per_face):
+    """Mesh the boxes listed in `order` in one FaceMesh call; fills landmarks_per_face in place."""
+    cols = int(np.ceil(np.sqrt(len(order))))
+    rows = int(np.ceil(len(order) / cols))
+    cell = FACE_TILE_SIZE + FACE_TILE_PAD
+    mosaic = np.zeros((rows * cell + FACE_TILE_PAD, cols * cell + FACE_TILE_PAD, 3), dtype=np.uint8)
+
+    tile_origin = {}
+    tile_scale = {}
+    for slot, i in enumerate(order):
+        x1, y1, x2, y2 = face_boxes[i]
+        scale = FACE_TILE_SIZE / max(x2 - x1, y2 - y1)
+        tw, th = max(1, round((x2 - x1) * scale)), max(1, round((y2 - y1) * scale))
+        tx = FACE_TILE_PAD + (slot % cols) * cell
+        ty = FACE_TILE_PAD + (slot // cols) * cell
+        mosaic[ty:ty + th, tx:tx + tw] = cv2.resize(rgb_frame[y1:y2, x1:x2], (tw, th))
+        tile_origin[i] = np.array([tx, ty])
+        tile_scale[i] = scale
+
+    mesh_results = face_mesh.process(mosaic)
+    if not mesh_results.multi_face_landmarks:
+        return
+
+    mosaic_size = np.array([mosaic.shape[1], mosaic.shape[0]], dtype=np.float64)
+    for mesh in mesh_results.multi_face_landmarks:
+        points = np.array([(lm.x, lm.y) for lm in mesh.landmark]) * mosaic_size
+        nose = points[POSE_LANDMARK_IDS[0]]
+        col = int((nose[0] - FACE_TILE_PAD / 2) // cell)
+        row = int((nose[1] - FACE_TILE_PAD / 2) // cell)
+        slot = row * cols + col
+        if not (0 <= col < cols and 0 <= slot < len(order)):
+            continue
+        i = order[slot]
+        if landmarks_per_face[i] is None:
+            landmarks_per_face[i] = (points - tile_origin[i]) / tile_scale[i]
+
+def mesh_landmarks_roi(face_mesh, rgb_frame, face_box):
+    """FaceMesh on a single face crop; same return value as one entry of mesh_landmarks_batch."""
+    x1, y1, x2, y2 = face_box
+    mesh_results = face_mesh.process(np.ascontiguousarray(rgb_frame[y1:y2, x1:x2]))
+    if not mesh_results.multi_face_landmarks:
+        return None
+    landmarks = mesh_results.multi_face_landmarks[0].landmark
+    return np.array([(lm.x, lm.y) for lm in landmarks]) * (x2 - x1, y2 - y1)
+
+# === Vectorized head pose ===
+# Reused between calls; only the per-face intrinsics are rewritten
+_camera_matrix = np.eye(3, dtype=np.float64)
+_dist_coeffs = np.zeros((4, 1))
+
+def head_pose_angles(image_points, face_boxes):
+    """Return an (N, 3) array of (pitch, yaw, roll) in degrees.
+
+    image_points is (N, 6, 2) in box-relative pixels, ordered like MODEL_POINTS.
+    """
+    rvecs = np.zeros((len(face_boxes), 3))
+    solved = np.zeros(len(face_boxes), dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(face_boxes):
+        focal_length = x2 - x1
+        _camera_matrix[0, 0] = _camera_matrix[1, 1] = focal_length
+        _camera_matrix[0, 2] = focal_length / 2
+        _camera_matrix[1, 2] = (y2 - y1) / 2
+        success, rvec, _ = cv2.solvePnP(MODEL_POINTS, image_points[i], _camera_matrix, _dist_coeffs)
+        if success:
+            rvecs[i] = rvec.ravel()
+            solved[i] = True
+
+    angles = rotation_matrices_to_euler(rotation_vectors_to_matrices(rvecs))
+    angles[~solved] = 0
+    return angles
+
+def rotation_vectors_to_matrices(rvecs):
+    """Vectorized cv2.Rodrigues for an (N, 3) array of rotation vectors."""
+    theta = np.linalg.norm(rvecs, axis=1)
+    k = rvecs / np.where(theta > 1e-12, theta, 1.0)[:, np.newaxis]
+    K = np.zeros((len(rvecs), 3, 3))
+    K[:, 0, 1], K[:, 0, 2] = -k[:, 2], k[:, 1]
+    K[:, 1, 0], K[:, 1, 2] = k[:, 2], -k[:, 0]
+    K[:, 2, 0], K[:, 2, 1] = -k[:, 1], k[:, 0]
+    sin = np.sin(theta)[:, np.newaxis, np.newaxis]
+    cos = np.cos(theta)[:, np.newaxis, np.newaxis]
+    return np.eye(3) + sin * K + (1 - cos) * (K @ K)
+
+def rotation_matrices_to_euler(rmats):
+    """Euler angles in degrees as returned by cv2.decomposeProjectionMatrix (R = Rz @ Ry @ Rx)."""
+    pitch = np.arctan2(rmats[:, 2, 1], rmats[:, 2, 2])
+    yaw = np.arctan2(-rmats[:, 2, 0], np.hypot(rmats[:, 2, 1], rmats[:, 2, 2]))
+    roll = np.arctan2(rmats[:, 1, 0], rmats[:, 0, 0])
+    return np.degrees(np.stack((pitch, yaw, roll), axis=1))
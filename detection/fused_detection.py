@@ -0,0 +1,155 @@
+import numpy as np
+
+from detection import face_detection, object_detection, pose_detection
+from utils import config
+from utils.detection_helpers import compute_iou
+from utils.profiler import profiler
+
+# COCO keypoint indices
+HEAD_KEYPOINTS = [0, 1, 2, 3, 4]          # nose, left/right eye, left/right ear
+LEFT_SHOULDER, RIGHT_SHOULDER = 5, 6
+
+HEAD_BOX_SCALE = 1.8        # head box side relative to the eye/ear spread
+MIN_HEAD_SIZE = 24          # pixels
+PERSON_CROP_MARGIN = 0.25   # extra context around a person for the phone pass
+MIN_PERSON_CROP = 64        # pixels
+
+
+# === Head boxes from pose keypoints ===
+def head_boxes_from_pose(pose_result, frame_width, frame_height, min_conf=pose_detection.KEYPOINT_CONF_THRESHOLD):
+    boxes = []
+    for kpts in pose_result:
+        head = kpts[HEAD_KEYPOINTS]
+        head = head[head[:, 2] > min_conf]
+        if len(head) < 2:
+            continue
+
+        cx, cy = head[:, :2].mean(axis=0)
+        spread = np.ptp(head[:, 0])
+        shoulders = kpts[[LEFT_SHOULDER, RIGHT_SHOULDER]]
+        if (shoulders[:, 2] > min_conf).all():
+            # Eyes alone under-estimate the head of someone seen from the side
+            spread = max(spread, 0.5 * abs(shoulders[0, 0] - shoulders[1, 0]))
+        size = max(spread * HEAD_BOX_SCALE, MIN_HEAD_SIZE)
+
+        # Eyes and nose sit in the upper half of the face, so extend further towards the chin
+        x1 = int(max(0, cx - size / 2))
+        y1 = int(max(0, cy - size * 0.5))
+        x2 = int(min(frame_width - 1, cx + size / 2))
+        y2 = int(min(frame_height - 1, cy + size * 0.7))
+        if x2 > x1 and y2 > y1:
+            boxes.append((x1, y1, x2, y2))
+    return boxes
+
+
+# === Crops around each person for the secondary phone pass ===
+def person_crop_boxes(pose_result, frame_width, frame_height, min_conf=pose_detection.KEYPOINT_CONF_THRESHOLD):
+    boxes = []
+    for kpts in pose_result:
+        visible = kpts[kpts[:, 2] > min_conf][:, :2]
+        if len(visible) == 0:
+            continue
+        x1, y1 = visible.min(axis=0)
+        x2, y2 = visible.max(axis=0)
+        mx = max((x2 - x1) * PERSON_CROP_MARGIN, MIN_PERSON_CROP / 2)
+        my = max((y2 - y1) * PERSON_CROP_MARGIN, MIN_PERSON_CROP / 2)
+        x1, y1 = int(max(0, x1 - mx)), int(max(0, y1 - my))
+        x2, y2 = int(min(frame_width, x2 + mx)), int(min(frame_height, y2 + my))
+        if x2 > x1 and y2 > y1:
+            boxes.append((x1, y1, x2, y2))
+    return boxes
+
+
+@profiler.timed("phone_yolo")
+def detect_phones_in_crops(model, frame, crop_boxes, conf_threshold=0.5):
+    return detect_phones_in_crops_batch(model, [frame], [crop_boxes], conf_threshold)[0]
+
+
+def detect_phones_in_crops_batch(model, frames, crop_boxes_per_frame, conf_threshold=0.5):
+    """Run one phone pass over the person crops of several frames and map boxes back to each frame."""
+    crops, owners = [], []
+    for frame_idx, (frame, crop_boxes) in enumerate(zip(frames, crop_boxes_per_frame)):
+        for crop_box in crop_boxes:
+            x1, y1, x2, y2 = crop_box
+            crops.append(frame[y1:y2, x1:x2])
+            owners.append((frame_idx, crop_box))
+
+    phone_boxes_per_frame = [[] for _ in frames]
+    if not crops:
+        return phone_boxes_per_frame
+
+    results = model.predict(crops, conf=conf_threshold, verbose=False)
+    phone_class_ids = object_detection.get_phone_class_ids(model)
+    for (frame_idx, (cx1, cy1, _, _)), result in zip(owners, results):
+        phone_boxes = phone_boxes_per_frame[frame_idx]
+        for (x1, y1, x2, y2) in object_detection.phone_boxes_from_result(result, phone_class_ids):
+            box = (x1 + cx1, y1 + cy1, x2 + cx1, y2 + cy1)
+            # Neighbouring people share pixels, so the same phone can show up in two crops
+            if all(compute_iou(box, kept) < 0.5 for kept in phone_boxes):
+                phone_boxes.append(box)
+    return phone_boxes_per_frame
+
+
+# === Detection modes ===
+def detect_classic(models, frame, rgb_frame):
+    h, w = frame.shape[:2]
+    phone_boxes = object_detection.detect_phones(models['phone'], frame)
+    faces = face_detection.get_faces(models['face'], models['face_mesh'], rgb_frame, w, h)
+    pose_result = pose_detection.estimate_pose(models['pose'], frame)
+    return phone_boxes, faces, pose_result
+
+
+def detect_fused(models, frame, rgb_frame, phone_pass=None):
+    if phone_pass is None:
+        phone_pass = config.FUSED_PHONE_PASS
+    h, w = frame.shape[:2]
+    pose_result = pose_detection.estimate_pose(models['pose'], frame)
+
+    head_boxes = head_boxes_from_pose(pose_result, w, h)
+    faces = face_detection.faces_from_boxes(head_boxes, models['face_mesh'], rgb_frame, w, h)
+    phone_boxes = fused_phone_boxes(models['phone'], frame, pose_result, phone_pass)
+    return phone_boxes, faces, pose_result
+
+
+def fused_phone_boxes(phone_model, frame, pose_result, phone_pass=None):
+    if phone_pass is None:
+        phone_pass = config.FUSED_PHONE_PASS
+    if phone_pass == "crops":
+        h, w = frame.shape[:2]
+        return detect_phones_in_crops(phone_model, frame, person_crop_boxes(pose_result, w, h))
+    if phone_pass == "full":
+        return object_detection.detect_phones(phone_model, frame)
+    return []
+
+
+def detect_fused_batch(models, frames, rgb_frames, face_meshes, phone_pass=None):
+    """Fused detection over frames from several streams; returns one (phone_boxes, faces, pose_result) per frame."""
+    if phone_pass is None:
+        phone_pass = config.FUSED_PHONE_PASS
+    pose_results = pose_detection.estimate_pose_batch(models['pose'], frames)
+
+    faces_per_frame, crop_boxes_per_frame = [], []
+    for frame, rgb_frame, face_mesh, pose_result in zip(frames, rgb_frames, face_meshes, pose_results):
+        h, w = frame.shape[:2]
+        head_boxes = head_boxes_from_pose(pose_result, w, h)
+        faces_per_frame.append(face_detection.faces_from_boxes(head_boxes, face_mesh, rgb_frame, w, h))
+        crop_boxes_per_frame.append(person_crop_boxes(pose_result, w, h))
+
+    if phone_pass == "crops":
+        phone_boxes_per_frame = detect_phones_in_crops_batch(models['phone'], frames, crop_boxes_per_frame)
+    elif phone_pass == "full":
+        phone_boxes_per_frame = object_detection.detect_phones_batch(models['phone'], frames)
+    else:
+        phone_boxes_per_frame = [[] for _ in frames]
+    return list(zip(phone_boxes_per_frame, faces_per_frame, pose_results))
+
+
+def run_detectors(models, frame, rgb_frame, mode=None):
+    """Return (phone_boxes, faces, pose_result) using config.DETECTION_MODE unless `mode` is given."""
+    if mode is None:
+        mode = config.DETECTION_MODE
+    if mode == "fused":
+        return detect_fused(models, frame, rgb_frame)
+    if mode == "classic":
+        return detect_classic(models, frame, rgb_frame)
+    raise ValueError(f"Unknown detection mode: {mode}")
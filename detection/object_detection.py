@@ -1,6 +1,8 @@
 from ultralytics import YOLO
 import cv2
 
+from utils.profiler import profiler
+
 # === Load YOLO Model ===
 def load_model(model_path, device='cpu'):
     model = YOLO(model_path)
@@ -20,17 +22,15 @@ def is_valid_phone_box(box, min_area=1000, min_aspect=0.4, max_aspect=2.5):
     return min_aspect < aspect_ratio < max_aspect and area >= min_area
 
 # === Detect phones ===
-def detect_phones(model, frame, conf_threshold=0.5):
-    phone_boxes = []
+def get_phone_class_ids(model):
+    return [cls_id for cls_id, name in model.names.items()
+            if name.lower() in ['cell phone', 'mobile phone', 'phone']]
 
-    # Run detection
-    results = model.predict(frame, conf=conf_threshold, verbose=False)[0]
-    class_names = model.names
-    phone_class_ids = [cls_id for cls_id, name in class_names.items()
-                       if name.lower() in ['cell phone', 'mobile phone', 'phone']]
+def phone_boxes_from_result(result, phone_class_ids):
+    phone_boxes = []
 
     # Process detections
-    for box in results.boxes.data.tolist():
+    for box in result.boxes.data.tolist():
         x1, y1, x2, y2, conf, cls_id = box
         cls_id = int(cls_id)
         if cls_id in phone_class_ids and is_valid_phone_box((x1, y1, x2, y2)):
@@ -40,4 +40,18 @@ def detect_phones(model, frame, conf_threshold=0.5):
             # cv2.putText(frame, f"{class_names[cls_id]} {conf:.2f}", (int(x1), int(y1) - 5),
             #             cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
 
-    return phone_boxes
\ No newline at end of file
+    return phone_boxes
+
+@profiler.timed("phone_yolo")
+def detect_phones(model, frame, conf_threshold=0.5):
+    # Run detection
+    results = model.predict(frame, conf=conf_threshold, verbose=False)[0]
+    return phone_boxes_from_result(results, get_phone_class_ids(model))
+
+# === Detect phones on several frames in one forward pass ===
+def detect_phones_batch(model, frames, conf_threshold=0.5):
+    if not frames:
+        return []
+    results = model.predict(list(frames), conf=conf_threshold, verbose=False)
+    phone_class_ids = get_phone_class_ids(model)
+    return [phone_boxes_from_result(result, phone_class_ids) for result in results]
@@ -3,49 +3,94 @@ import torch
 import numpy as np
 import cv2  # Required for visualization
 
+from utils.detection_helpers import box_centers, distance_matrix
+from utils.profiler import profiler
+
 def init_pose():
     model = YOLO('models/yolov8s-pose.pt')
     if torch.cuda.is_available():
         model.to('cuda')
     return model
 
-def detect_pose_keypoints(pose_model, rgb_frame):
-    results = pose_model(rgb_frame)
-    if not results or len(results) == 0 or results[0].keypoints is None:
+LEFT_WRIST, RIGHT_WRIST = 9, 10
+KEYPOINT_CONF_THRESHOLD = 0.3
+
+class PoseResult:
+    """Pose keypoints for every person in one frame, from a single model call.
+
+    keypoints has shape (num_people, 17, 3) holding (x, y, confidence).
+    """
+
+    def __init__(self, keypoints=None):
+        if keypoints is None:
+            keypoints = np.zeros((0, 17, 3), dtype=np.float32)
+        self.keypoints = keypoints
+
+    @classmethod
+    def from_results(cls, results):
+        if not results:
+            return cls()
+        return cls.from_result(results[0])
+
+    @classmethod
+    def from_result(cls, result):
+        if result.keypoints is None or result.keypoints.xy is None:
+            return cls()
+        kpts = result.keypoints
+        xy = kpts.xy.cpu().numpy()
+        if kpts.conf is not None:
+            conf = kpts.conf.cpu().numpy()
+        else:
+            conf = np.ones(xy.shape[:2], dtype=xy.dtype)
+        return cls(np.concatenate((xy, conf[..., np.newaxis]), axis=2))
+
+    def __len__(self):
+        return len(self.keypoints)
+
+    def __iter__(self):
+        return iter(self.keypoints)
+
+    def __getitem__(self, index):
+        return self.keypoints[index]
+
+    @property
+    def xy(self):
+        return self.keypoints[..., :2]
+
+    @property
+    def conf(self):
+        return self.keypoints[..., 2]
+
+    def wrists(self, min_conf=KEYPOINT_CONF_THRESHOLD):
+        """Return (x, y) of every wrist above min_conf, as an (M, 2) array."""
+        if len(self.keypoints) == 0 or self.keypoints.shape[1] <= RIGHT_WRIST:
+            return np.zeros((0, 2), dtype=np.float32)
+        wrists = self.keypoints[:, [LEFT_WRIST, RIGHT_WRIST]].reshape(-1, 3)
+        return wrists[wrists[:, 2] > min_conf][:, :2]
+
+@profiler.timed("pose")
+def estimate_pose(pose_model, frame):
+    """Run the pose model once on a BGR frame and wrap the output."""
+    return PoseResult.from_results(pose_model(frame, verbose=False))
+
+def estimate_pose_batch(pose_model, frames):
+    """Run the pose model once over several BGR frames, one PoseResult per frame."""
+    if not frames:
         return []
-    keypoints_list = results[0].keypoints.cpu().numpy()  # (num_people, 17, 3)
-    return keypoints_list
-
-def hands_near_faces(pose_model, rgb_frame, faces, distance_threshold=50):
-    keypoints_list = detect_pose_keypoints(pose_model, rgb_frame)
-
-    hands_near_face = {face['id']: False for face in faces}
-    for person_kpts in keypoints_list:
-        if len(person_kpts) < 11:
-            continue  # not enough keypoints for wrists
-
-        left_wrist = person_kpts[9]   # (x, y, confidence)
-        right_wrist = person_kpts[10]
-
-        wrists = []
-        if left_wrist[2] > 0.3:
-            wrists.append(left_wrist[:2])
-        if right_wrist[2] > 0.3:
-            wrists.append(right_wrist[:2])
-
-        for face in faces:
-            if hands_near_face[face['id']]:
-                continue
-
-            x1, y1, x2, y2 = face['bbox']
-            face_center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
-
-            for wrist in wrists:
-                dist = np.linalg.norm(np.array(wrist) - face_center)
-                if dist < distance_threshold:
-                    hands_near_face[face['id']] = True
-                    break
-    return hands_near_face
+    return [PoseResult.from_result(result) for result in pose_model(list(frames), verbose=False)]
+
+def detect_pose_keypoints(pose_model, frame):
+    return estimate_pose(pose_model, frame).keypoints
+
+def hands_near_faces(pose_result, faces, distance_threshold=50):
+    wrists = pose_result.wrists()
+    if len(wrists) == 0 or not faces:
+        return {face['id']: False for face in faces}
+
+    # One wrists x faces distance matrix instead of a norm per pair
+    dist = distance_matrix(wrists, box_centers([face['bbox'] for face in faces]))
+    near = (dist < distance_threshold).any(axis=0)
+    return {face['id']: bool(is_near) for face, is_near in zip(faces, near)}
 
 # Pose connections for drawing (COCO format)
 POSE_CONNECTIONS = [
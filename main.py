@@ -1,47 +1,194 @@
 import cv2
 import time
 import os
-import numpy as np
 
-from detection import face_detection, object_detection, pose_detection
-from utils import cheating_logic
+from detection import face_detection, fused_detection, object_detection, pose_detection
+from utils import cheating_logic, config
 from utils import tracker
+from utils.detection_helpers import merge_pose_to_tracked
 from detection.pose_detection import draw_pose
+from utils.pipeline import FramePipeline, Stage
+from utils.profiler import profiler
+from utils.scheduler import CadencedDetector
 
 DEBUG_MODE = True
 
-def compute_iou(boxA, boxB):
-    xA, yA = max(boxA[0], boxB[0]), max(boxA[1], boxB[1])
-    xB, yB = min(boxA[2], boxB[2]), min(boxA[3], boxB[3])
-    interArea = max(0, xB - xA) * max(0, yB - yA)
-    areaA = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-    areaB = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-    return interArea / float(areaA + areaB - interArea) if areaA + areaB - interArea > 0 else 0
-
-def merge_pose_to_tracked(tracked_faces, detected_faces):
-    merged = []
-    for t in tracked_faces:
-        best_match, best_iou = None, 0
-        for d in detected_faces:
-            iou = compute_iou(t['bbox'], d['bbox'])
-            if iou > best_iou:
-                best_iou, best_match = iou, d
-        merged.append({
-            'id': t['id'],
-            'bbox': tuple(map(int, best_match['bbox'])) if best_match else tuple(map(int, t['bbox'])),
-            'pitch': best_match.get('pitch', 0) if best_match else 0,
-            'yaw': best_match.get('yaw', 0) if best_match else 0,
-            'roll': best_match.get('roll', 0) if best_match else 0,
-            'landmarks': None
-        })
-    return merged
+# Threaded decode -> detect -> score -> render pipeline.
+# PIPELINE_DROP_POLICY is one of "block", "drop_oldest", "drop_newest" (see utils/pipeline.py);
+# use "drop_oldest" for live cameras so the display never lags behind the room.
+PIPELINED = True
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_DROP_POLICY = "block"
 
-def main():
+def load_models():
     print("Loading models...")
     yolo_model = object_detection.load_model('models/yolov5su.pt').to("cuda")
-    yolo_face_model, face_mesh = face_detection.init_face_mesh()
+    if config.DETECTION_MODE == "fused":
+        # Face boxes come from the pose keypoints, so the face YOLO is not needed
+        yolo_face_model, face_mesh = None, face_detection.create_face_mesh()
+    else:
+        yolo_face_model, face_mesh = face_detection.init_face_mesh()
     pose_detector = pose_detection.init_pose()
-    print("Models loaded.")
+    print(f"Models loaded ({config.DETECTION_MODE} detection).")
+    return {
+        'phone': yolo_model,
+        'face': yolo_face_model,
+        'face_mesh': face_mesh,
+        'pose': pose_detector,
+    }
+
+def read_frames(cap):
+    """Decode stage: yields one packet per frame read from the capture."""
+    index = 0
+    while True:
+        profiler.begin_frame(index)
+        now = time.time()
+        with profiler.stage("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        yield {'index': index, 'frame': frame, 'now': now}
+        index += 1
+
+def detect_frame(models, packet, cadence=None):
+    """Detect stage: runs the models that are due on the frame and tracks faces."""
+    profiler.begin_frame(packet['index'])
+    frame = packet['frame']
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    try:
+        if cadence is not None:
+            phone_boxes, faces, pose_result, faces_fresh = cadence.detect(frame, rgb, packet['now'])
+        else:
+            phone_boxes, faces, pose_result = fused_detection.run_detectors(models, frame, rgb)
+            faces_fresh = True
+        if DEBUG_MODE:
+            print(f"[DEBUG] Phone boxes: {phone_boxes}")
+            print(f"[DEBUG] Faces detected: {len(faces)}")
+
+        # Between face detector runs the faces are the last detections moved by optical flow
+        face_detections = [
+            ([face['bbox'][0], face['bbox'][1], face['bbox'][2], face['bbox'][3]], 1.0, 0)
+            for face in faces
+        ]
+        deleted_track_ids = []
+        with profiler.stage("deepsort"):
+            tracked_faces = tracker.get_tracked_faces(frame, face_detections, deleted=deleted_track_ids)
+        # Tracks keep their own box and get no head pose until the face detector runs again
+        tracked_faces = merge_pose_to_tracked(tracked_faces, faces if faces_fresh else [])
+
+        hands_near = pose_detection.hands_near_faces(pose_result, tracked_faces)
+        hands_near_face_dict = {face['id']: hands_near.get(face['id'], False) for face in tracked_faces}
+        if DEBUG_MODE:
+            print(f"[DEBUG] Hands near face dict: {hands_near_face_dict}")
+            for i, avg_conf in enumerate(pose_result.conf.mean(axis=1)):
+                print(f"[DEBUG] Pose {i} confidence: avg={avg_conf:.2f}")
+
+    except Exception as e:
+        print(f"[❌] Detection error: {e}")
+        return None
+
+    packet.update({
+        'phone_boxes': phone_boxes,
+        'tracked_faces': tracked_faces,
+        'deleted_track_ids': deleted_track_ids,
+        'hands_near_face_dict': hands_near_face_dict,
+        'pose_result': pose_result,
+    })
+    return packet
+
+def score_frame(packet, cadence=None):
+    """Score stage: updates cheating scores and queues log events."""
+    profiler.begin_frame(packet['index'])
+    packet['display'] = packet['frame'].copy()
+    with profiler.stage("update_scores"):
+        cheating_logic.update_scores(
+            packet['tracked_faces'],
+            packet['phone_boxes'],
+            packet['hands_near_face_dict'],
+            packet['now'],
+            packet['display'],
+            hand_boxes=None,
+            pose_keypoints_list=packet['pose_result'],
+            deleted_track_ids=packet['deleted_track_ids']
+        )
+    # Snapshot for the render thread: update_scores keeps changing the live state while it draws
+    packet['scores'] = cheating_logic.default_state.cheating_scores
+    packet['pose_scores'] = dict(cheating_logic.default_state.pose_only_scores)
+    if cadence is not None:
+        cadence.scheduler.check_scores(packet['scores'])
+    return packet
+
+def render_frame(packet):
+    """Render stage: draws overlays and shows the frame. Returns False when the user quits."""
+    profiler.begin_frame(packet['index'])
+    display = packet['display']
+    tracked_faces = packet['tracked_faces']
+    phone_boxes = packet['phone_boxes']
+
+    with profiler.stage("draw"):
+        draw_overlays(display, tracked_faces, phone_boxes, packet['pose_result'], packet['scores'], packet['pose_scores'])
+
+    with profiler.stage("display"):
+        cv2.imshow("Cheating Detection", display)
+        keep_going = not (cv2.waitKey(1) & 0xFF == ord('q'))
+    profiler.end_frame(packet['index'], packet['now'])
+    return keep_going
+
+def draw_overlays(display, tracked_faces, phone_boxes, pose_result, scores=None, pose_scores=None):
+    for i, keypoints in enumerate(pose_result):
+        if i < len(tracked_faces):
+            draw_pose(display, keypoints, color=(0, 255, 255))
+        else:
+            draw_pose(display, keypoints, color=(0, 165, 255))
+
+    for (x1, y1, x2, y2) in phone_boxes:
+        cv2.rectangle(display, (x1, y1), (x2, y2), (255, 0, 0), 2)
+        cv2.putText(display, "Phone", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+
+    cheating_logic.visualize(display, tracked_faces, scores=scores, pose_scores=pose_scores)
+
+    if DEBUG_MODE:
+        debug_text = f"Faces: {len(tracked_faces)} | Phones: {len(phone_boxes)}"
+        cv2.putText(display, debug_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+    if config.PROFILE_OVERLAY:
+        profiler.draw_overlay(display)
+
+def run_serial(models, cap, cadence=None):
+    for packet in read_frames(cap):
+        packet = detect_frame(models, packet, cadence)
+        if packet is None:
+            continue
+        if not render_frame(score_frame(packet, cadence)):
+            break
+
+def run_pipelined(models, cap, cadence=None):
+    # Detection keeps the DeepSort state, so it has to see frames in order on one thread.
+    # Frames are only dropped in front of detection and rendering, never between
+    # detection and scoring, so every tracked frame still reaches update_scores.
+    frame_pipeline = FramePipeline(
+        read_frames(cap),
+        [
+            Stage("detect", lambda packet: detect_frame(models, packet, cadence),
+                  queue_size=PIPELINE_QUEUE_SIZE, drop_policy=PIPELINE_DROP_POLICY),
+            Stage("score", lambda packet: score_frame(packet, cadence), queue_size=PIPELINE_QUEUE_SIZE),
+        ],
+        output_queue_size=PIPELINE_QUEUE_SIZE,
+        output_drop_policy=PIPELINE_DROP_POLICY,
+    ).start()
+
+    try:
+        for packet in frame_pipeline.results():
+            if not render_frame(packet):
+                break
+    finally:
+        frame_pipeline.stop()
+        if DEBUG_MODE:
+            print(f"[DEBUG] Pipeline stats: {frame_pipeline.stats()}")
+
+def main():
+    models = load_models()
 
     video_path = 'videos/cheating_video4.mp4'
     if not os.path.exists(video_path):
@@ -57,95 +204,21 @@ def main():
     frame_duration = 1.0 / fps if fps > 0 else 1 / 30
     print(f"Video FPS: {fps}, frame duration: {frame_duration:.3f}s")
 
-    tracked_faces = []
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        now = time.time()
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w = frame.shape[:2]
-        display = frame.copy()
-
-        try:
-            phone_boxes = object_detection.detect_phones(yolo_model, frame)
-            if DEBUG_MODE:
-                print(f"[DEBUG] Phone boxes: {phone_boxes}")
-
-            faces = face_detection.get_faces(yolo_face_model, face_mesh, rgb, w, h)
-            if DEBUG_MODE:
-                print(f"[DEBUG] Faces detected: {len(faces)}")
-
-            face_detections = [
-                ([face['bbox'][0], face['bbox'][1], face['bbox'][2], face['bbox'][3]], 1.0, 0)
-                for face in faces
-            ]
-            tracked_faces = tracker.get_tracked_faces(frame, face_detections)
-            tracked_faces = merge_pose_to_tracked(tracked_faces, faces)
-
-            hands_near = pose_detection.hands_near_faces(pose_detector, rgb, tracked_faces)
-            hands_near_face_dict = {face['id']: hands_near.get(face['id'], False) for face in tracked_faces}
-            if DEBUG_MODE:
-                print(f"[DEBUG] Hands near face dict: {hands_near_face_dict}")
-
-            # ✅ Improved pose detection parsing
-            pose_results = pose_detector(frame)
-            pose_keypoints_list = []
-            try:
-                for result in pose_results:
-                    if result.keypoints is not None and result.keypoints.xy is not None:
-                        xy = result.keypoints.xy.cpu().numpy()
-                        conf = result.keypoints.conf.cpu().numpy()
-                        for i in range(xy.shape[0]):
-                            keypoints = np.hstack((xy[i], conf[i][:, np.newaxis]))  # shape (17, 3)
-                            pose_keypoints_list.append(keypoints)
-            except Exception as e:
-                if DEBUG_MODE:
-                    print(f"[DEBUG] Error parsing pose keypoints: {e}")
-
-            for i, keypoints in enumerate(pose_keypoints_list):
-                confs = keypoints[:, 2]
-                avg_conf = confs.mean()
-                print(f"[DEBUG] Pose {i} confidence: avg={avg_conf:.2f}")
-
-        except Exception as e:
-            print(f"[❌] Detection error: {e}")
-            continue
-
-        cheating_logic.update_scores(
-            tracked_faces,
-            phone_boxes,
-            hands_near_face_dict,
-            now,
-            display,
-            hand_boxes=None,
-            pose_keypoints_list=pose_keypoints_list
-        )
-
-        for i, keypoints in enumerate(pose_keypoints_list):
-            if i < len(tracked_faces):
-                draw_pose(display, keypoints, color=(0, 255, 255))
-            else:
-                draw_pose(display, keypoints, color=(0, 165, 255))
-
-        for (x1, y1, x2, y2) in phone_boxes:
-            cv2.rectangle(display, (x1, y1), (x2, y2), (255, 0, 0), 2)
-            cv2.putText(display, "Phone", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-
-        cheating_logic.visualize(display, tracked_faces)
+    cadence = CadencedDetector(models) if config.ADAPTIVE_CADENCE else None
 
-        if DEBUG_MODE:
-            debug_text = f"Faces: {len(tracked_faces)} | Phones: {len(phone_boxes)}"
-            cv2.putText(display, debug_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-        cv2.imshow("Cheating Detection", display)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    if PIPELINED:
+        run_pipelined(models, cap, cadence)
+    else:
+        run_serial(models, cap, cadence)
 
     cap.release()
     cv2.destroyAllWindows()
+    print(f"[RATE] {cheating_logic.default_state.limiter.stats()}")
+
+    if profiler.enabled:
+        profiler.print_summary()
+        if config.PROFILE_TRACE_PATH:
+            profiler.export(config.PROFILE_TRACE_PATH)
 
 
 if __name__ == "__main__":
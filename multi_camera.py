@@ -0,0 +1,63 @@
+import argparse
+import cv2
+
+from detection import face_detection, object_detection, pose_detection
+from detection.pose_detection import draw_pose
+from utils import cheating_logic, config
+from utils.multi_stream import MultiStreamEngine, StreamContext
+
+
+def parse_source(spec):
+    """Parse CLASS_ID=SOURCE, where SOURCE is a video path or a camera index."""
+    if "=" not in spec:
+        raise argparse.ArgumentTypeError(f"Expected CLASS_ID=SOURCE, got {spec!r}")
+    class_id, source = spec.split("=", 1)
+    return class_id, int(source) if source.isdigit() else source
+
+
+def render_stream(stream, packet):
+    display = packet['display']
+    for keypoints in packet['pose_result']:
+        draw_pose(display, keypoints, color=(0, 255, 255))
+    for (x1, y1, x2, y2) in packet['phone_boxes']:
+        cv2.rectangle(display, (x1, y1), (x2, y2), (255, 0, 0), 2)
+    cheating_logic.visualize(display, packet['tracked_faces'], state=stream.score_state)
+    cv2.imshow(f"Cheating Detection - {stream.class_id}", display)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proctor several rooms from one process with batched inference.")
+    parser.add_argument("sources", nargs="+", type=parse_source,
+                        help="One CLASS_ID=SOURCE per room, e.g. LR-10=videos/room10.mp4 LR-11=0")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per YOLO forward pass")
+    parser.add_argument("--device", default="cpu", help="Device for the phone model")
+    parser.add_argument("--no-display", action="store_true", help="Do not open a window per stream")
+    args = parser.parse_args()
+
+    print("Loading models...")
+    phone_model = object_detection.load_model('models/yolov5su.pt', device=args.device)
+    face_model = face_detection.load_face_model() if config.DETECTION_MODE == "classic" else None
+    pose_model = pose_detection.init_pose()
+    print(f"Models loaded ({config.DETECTION_MODE} detection).")
+
+    streams = [StreamContext(source, class_id) for class_id, source in args.sources]
+    engine = MultiStreamEngine(phone_model, face_model, pose_model, streams, batch_size=args.batch_size)
+
+    try:
+        while engine.active:
+            packets = engine.step()
+            if args.no_display:
+                continue
+            for stream, packet in packets:
+                render_stream(stream, packet)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        engine.release()
+        cv2.destroyAllWindows()
+        for stream in streams:
+            print(f"[RATE] {stream.class_id}: {stream.score_state.limiter.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("mediapipe")
+pytest.importorskip("ultralytics")
+deepsort_tracker = pytest.importorskip("deep_sort_realtime.deepsort_tracker")
+
+from benchmarks import fixtures  # noqa: E402
+from utils import tracker  # noqa: E402
+from utils.scheduler import CadencedDetector, DetectionScheduler  # noqa: E402
+
+
+class ColorEmbedder:
+    """Appearance embedding from the mean colour of the crop, so no re-id model is needed."""
+
+    def predict(self, crops):
+        embeds = [np.append(crop.reshape(-1, 3).mean(axis=0), 1.0) for crop in crops]
+        return [e / np.linalg.norm(e) for e in embeds]
+
+
+def replay(scene, face_hz):
+    """Run the cadenced detector over the scene; returns the track ids confirmed on the last frame."""
+    models = fixtures.mock_models(scene)
+    scheduler = DetectionScheduler(rates_hz={"phone": 0, "face": face_hz, "pose": 0})
+    cadence = CadencedDetector(models, scheduler, mode="classic")
+    face_tracker = deepsort_tracker.DeepSort(max_age=30, embedder=None)
+    face_tracker.embedder = ColorEmbedder()
+
+    tracked = []
+    for i, frame in enumerate(scene.frames):
+        for name in ("phone", "face", "pose"):
+            models[name].frame_index = i
+        _, faces, _, _ = cadence.detect(frame, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), i / scene.fps)
+        detections = [(list(face['bbox']), 1.0, 0) for face in faces]
+        tracked = tracker.get_tracked_faces(frame, detections, face_tracker=face_tracker)
+    return {face['id'] for face in tracked}
+
+
+@pytest.mark.parametrize("face_hz", [0, 5, 2])
+def test_tracks_survive_sparse_face_detection(face_hz):
+    # 0 Hz runs the face detector every frame; 5 Hz is every 6th frame of the 30 fps scene
+    scene = fixtures.make_scene(num_faces=4, width=640, height=360, num_frames=60)
+    assert len(replay(scene, face_hz)) == scene.num_faces
@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils.frame_ring import FrameRingBuffer
+
+
+def frame(value, shape=(1080, 1920, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_clips_are_downscaled_while_copying():
+    ring = FrameRingBuffer(capacity=4, budget_mb=1000)
+    seqs = [ring.push(frame(i)) for i in range(3)]
+
+    clip = ring.materialize(seqs, max_side=640)
+    assert [f.shape for f in clip] == [(360, 640, 3)] * 3
+    assert [int(f[0, 0, 0]) for f in clip] == [0, 1, 2]
+
+
+def test_small_frames_are_copied_not_shared():
+    ring = FrameRingBuffer(capacity=2, budget_mb=10)
+    seq = ring.push(frame(7, shape=(48, 64, 3)))
+
+    [copy] = ring.materialize([seq], max_side=640)
+    ring.push(frame(8, shape=(48, 64, 3)))
+    ring.push(frame(9, shape=(48, 64, 3)))
+    assert int(copy[0, 0, 0]) == 7
+
+
+def test_overwritten_frames_are_left_out():
+    ring = FrameRingBuffer(capacity=2, budget_mb=10)
+    seqs = [ring.push(frame(i, shape=(48, 64, 3))) for i in range(3)]
+
+    assert [int(f[0, 0, 0]) for f in ring.materialize(seqs)] == [1, 2]
@@ -0,0 +1,137 @@
+import time
+
+import mongomock
+import pytest
+from bson import json_util
+from pymongo.errors import ServerSelectionTimeoutError
+
+from Backend.log_batcher import LogBatcher
+
+
+class FlakyCollection:
+    """mongomock collection whose insert_many fails like an unreachable server while `down` is set."""
+
+    def __init__(self):
+        self.collection = mongomock.MongoClient().db.logs
+        self.down = False
+
+    def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise ServerSelectionTimeoutError("no servers available")
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+@pytest.fixture
+def logs():
+    return FlakyCollection()
+
+
+@pytest.fixture
+def make_batcher(tmp_path, logs):
+    batchers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("journal_path", str(tmp_path / "journal.jsonl"))
+        kwargs.setdefault("backoff_base", 0)
+        kwargs.setdefault("start", False)
+        batcher = LogBatcher(logs, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close(timeout=1)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_flushes_when_batch_is_full(logs, make_batcher):
+    batcher = make_batcher(batch_size=3, flush_interval=60, start=True)
+    for i in range(2):
+        batcher.add({"n": i})
+    time.sleep(0.1)
+    assert logs.collection.count_documents({}) == 0
+
+    batcher.add({"n": 2})
+    assert wait_for(lambda: logs.collection.count_documents({}) == 3)
+
+
+def test_flushes_on_interval(logs, make_batcher):
+    batcher = make_batcher(batch_size=100, flush_interval=0.05, start=True)
+    batcher.add({"n": 0})
+    assert wait_for(lambda: logs.collection.count_documents({}) == 1)
+
+
+def test_retry_skips_documents_an_earlier_attempt_stored(logs, make_batcher):
+    stored = []
+    batcher = make_batcher(on_stored=stored.extend)
+    logs.collection.insert_one({"_id": "a", "n": 0})
+
+    for doc_id in ("a", "b", "c"):
+        batcher.add({"_id": doc_id})
+    assert batcher.flush() == 3
+    assert sorted(logs.collection.distinct("_id")) == ["a", "b", "c"]
+    # Only the documents this attempt actually inserted reach the rollups
+    assert [doc["_id"] for doc in stored] == ["b", "c"]
+    assert batcher.journaled == 0
+
+
+def test_journals_while_down_and_replays_after_next_write(tmp_path, logs, make_batcher):
+    stored = []
+    batcher = make_batcher(max_retries=1, on_stored=stored.extend)
+    logs.down = True
+    batcher.add({"n": 0})
+    batcher.add({"n": 1})
+    assert batcher.flush() == 0
+    assert batcher.journaled == 2
+    assert (tmp_path / "journal.jsonl").exists()
+
+    logs.down = False
+    batcher.add({"n": 2})
+    assert batcher.flush() == 1
+    assert sorted(logs.collection.distinct("n")) == [0, 1, 2]
+    assert batcher.replayed == 2
+    assert len(stored) == 3
+    assert not (tmp_path / "journal.jsonl").exists()
+    assert not (tmp_path / "journal.jsonl.replay").exists()
+
+
+def test_buffer_spills_to_journal_past_its_limit(logs, make_batcher):
+    batcher = make_batcher(batch_size=2, max_buffered=4)
+    for i in range(5):
+        batcher.add({"n": i})
+    assert batcher._buffer == []
+    assert batcher.journaled == 5
+
+    batcher.add({"n": 5})
+    assert batcher.flush() == 1
+    assert sorted(logs.collection.distinct("n")) == list(range(6))
+    assert batcher.replayed == 5
+
+
+def test_replay_picks_up_a_replay_file_left_by_a_crash(tmp_path, logs, make_batcher):
+    (tmp_path / "journal.jsonl.replay").write_text(json_util.dumps({"n": 0}) + "\n", encoding="utf-8")
+    (tmp_path / "journal.jsonl").write_text(json_util.dumps({"n": 1}) + "\n", encoding="utf-8")
+    batcher = make_batcher()
+
+    batcher.add({"n": 2})
+    assert batcher.flush() == 1
+    assert sorted(logs.collection.distinct("n")) == [0, 1, 2]
+    assert batcher.replayed == 2
+    assert not (tmp_path / "journal.jsonl.replay").exists()
+
+
+def test_closing_again_stores_logs_added_after_the_first_close(logs, make_batcher):
+    # atexit closes the batcher before the async logger's lanes are drained into it
+    batcher = make_batcher(start=True)
+    batcher.close(timeout=1)
+    batcher.add({"n": 0})
+    batcher.close(timeout=1)
+    assert logs.collection.count_documents({}) == 1
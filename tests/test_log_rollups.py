@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import mongomock
+
+from Backend import log_rollups
+
+
+def make_log(hour, activity="Phone detected", severity="critical"):
+    return {"class_id": "LR-10", "activity": activity, "severity": severity,
+            "timestamp": datetime(2026, 5, 4, hour, 17, 3)}
+
+
+def test_rebuild_replaces_the_rollups_in_one_step():
+    database = mongomock.MongoClient().db
+    logs, rollups = database.logs, database.log_rollups
+    logs.insert_many([make_log(9), make_log(9), make_log(10, "Suspicious behavior", "warning")])
+    log_rollups.ensure_rollup_indexes(rollups)
+    # Stale counters from before the rebuild are replaced, not added to
+    rollups.insert_one({"class_id": "LR-10", "activity": "Phone detected", "severity": "critical",
+                        "bucket": datetime(2026, 5, 4, 9), "count": 5})
+
+    log_rollups.rebuild_rollups(logs, rollups)
+
+    assert log_rollups.counts_by(rollups, "activity") == {"Phone detected": 2, "Suspicious behavior": 1}
+    assert {doc["bucket"] for doc in rollups.find()} == {datetime(2026, 5, 4, 9), datetime(2026, 5, 4, 10)}
+    assert "log_rollups_rebuild" not in database.list_collection_names()
+    # The unique key survives the rename, so apply_rollups keeps upserting into the same documents
+    assert any(index.get("unique") for index in rollups.index_information().values())
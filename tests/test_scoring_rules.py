@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from utils import config
+from utils.scoring_rules import RuleError, RuleSet
+
+
+@pytest.fixture
+def spec():
+    with open(config.SCORING_RULES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_shipped_rules_load(spec):
+    RuleSet(spec)
+
+
+def test_unknown_activity_is_rejected(spec):
+    spec["rules"][1]["log"]["activity"] = "Looking arround frequently"
+    with pytest.raises(RuleError, match="unknown activity"):
+        RuleSet(spec)
+
+
+def test_unknown_severity_is_rejected(spec):
+    spec["rules"][1]["log"]["severity"] = "critcal"
+    with pytest.raises(RuleError, match="unknown severity"):
+        RuleSet(spec)
+
+
+def test_frequent_glance_count_must_fit_the_history(spec):
+    spec["features"]["frequent_glance_count"] = 17
+    with pytest.raises(RuleError, match="frequent_glance_count"):
+        RuleSet(spec)
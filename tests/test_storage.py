@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from Backend import storage
+
+
+def files_under(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, names in os.walk(root) for f in names)
+
+
+def test_base_class_needs_exists_and_write():
+    with pytest.raises(TypeError):
+        storage.ContentAddressedStorage()
+
+
+def test_identical_bytes_are_written_once(tmp_path, monkeypatch):
+    store = storage.LocalStorage(tmp_path)
+    writes = []
+    write = store.write
+    monkeypatch.setattr(store, "write", lambda key, data: writes.append(key) or write(key, data))
+
+    key = store.put_bytes(b"evidence", ".jpg")
+    assert store.put_bytes(b"evidence", ".jpg") == key
+    assert writes == [key]
+    assert key == storage.content_key(b"evidence", ".jpg")
+    assert files_under(tmp_path) == [os.path.join(*key.split("/"))]
+
+    other = store.put_bytes(b"other evidence", ".jpg")
+    assert other != key
+    assert writes == [key, other]
+
+
+def test_write_renames_a_temp_file_into_place(tmp_path, monkeypatch):
+    store = storage.LocalStorage(tmp_path)
+    renames = []
+    replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: renames.append((src, dst)) or replace(src, dst))
+
+    key = store.put_bytes(b"clip bytes", ".mp4")
+    [(src, dst)] = renames
+    assert src.endswith(".part") and os.path.dirname(src) == os.path.dirname(dst)
+    assert dst == store.path(key)
+    with open(dst, "rb") as f:
+        assert f.read() == b"clip bytes"
+    assert not any(name.endswith(".part") for name in files_under(tmp_path))
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path, monkeypatch):
+    store = storage.LocalStorage(tmp_path)
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        store.put_bytes(b"evidence", ".jpg")
+    assert files_under(tmp_path) == []
+    assert not store.exists(storage.content_key(b"evidence", ".jpg"))
+
+
+def test_refs_resolve_to_the_stored_files(tmp_path, monkeypatch):
+    store = storage.LocalStorage(tmp_path)
+    monkeypatch.setitem(storage._instances, "local", store)
+
+    image = np.full((48, 64, 3), 127, dtype=np.uint8)
+    ref = store.put_image(image)
+    assert ref.startswith(storage.LOCAL_SCHEME) and storage.is_ref(ref)
+    assert storage.backend_for(ref) is store
+    path = storage.resolve_url(ref)
+    assert path == store.path(store.key_of(ref)) and os.path.isfile(path)
+    assert storage.thumbnail_url(ref) == path
+
+    clip_ref = "local://ab/cd/abcd.mp4"
+    assert storage.thumbnail_url(clip_ref, resource_type="video") == store.path("ab/cd/abcd.jpg")
@@ -1,19 +1,138 @@
+import atexit
+import heapq
+import itertools
+import sys
 import threading
-import queue
 import time
-import tempfile
-import os
-import cv2
 import numpy as np
-from collections import defaultdict
-from Backend import db
-from Backend.cloud_uploader import upload_image_to_cloudinary, upload_video_to_cloudinary
+from collections import deque
+from datetime import datetime
+from Backend import evidence_dedup, storage
+from utils import config
 
-log_queue = queue.Queue()
-_last_log_time = defaultdict(lambda: defaultdict(lambda: 0))
-LOG_COOLDOWN_SECONDS = 10
+# Critical events are served first and are the last to be dropped when the queue is full
+SEVERITY_PRIORITY = {"critical": 0, "warning": 1}
 
-def enqueue_log(timestamp_str, face_id, activity, severity, cropped_face=None, class_id="LR-10", video_clip=None):
+
+class LogJob:
+    __slots__ = ("timestamp_str", "face_id", "activity", "severity", "cropped_face", "class_id",
+                 "video_clip", "image_url", "video_url", "clip_key", "timestamp", "now", "enqueued_at", "priority")
+
+    def __init__(self, timestamp_str, face_id, activity, severity, cropped_face, class_id, video_clip):
+        self.timestamp_str = timestamp_str
+        self.face_id = face_id
+        self.activity = activity
+        self.severity = severity
+        self.cropped_face = cropped_face
+        self.class_id = class_id
+        self.video_clip = video_clip
+        self.image_url = None
+        self.video_url = None
+        self.clip_key = None
+        self.timestamp = None
+        self.now = None
+        self.enqueued_at = time.time()
+        self.priority = SEVERITY_PRIORITY.get(severity, len(SEVERITY_PRIORITY))
+
+
+class LaneQueue:
+    """Bounded priority queue feeding one lane of workers.
+
+    With drop=True a full queue evicts its least important, newest job to make
+    room for a more important one (or rejects the incoming job if nothing
+    queued is less important). With drop=False put() blocks, which pushes
+    backpressure to the lane in front of it.
+    """
+
+    def __init__(self, name, maxsize, drop=False, on_drop=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop = drop
+        self.on_drop = on_drop
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self.dropped = 0
+        self.processed = 0
+        self.service_times = deque(maxlen=500)
+
+    def put(self, job):
+        victim = None
+        with self._cond:
+            while len(self._heap) >= self.maxsize:
+                if not self.drop:
+                    self._cond.wait()
+                    continue
+                worst = max((entry for entry in self._heap if entry[2] is not None), default=None)
+                if worst is None or job.priority >= worst[0]:
+                    self.dropped += 1
+                    victim = job
+                    break
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self._unfinished -= 1
+                self.dropped += 1
+                victim = worst[2]
+            if victim is not job:
+                heapq.heappush(self._heap, (job.priority, next(self._counter), job))
+                self._unfinished += 1
+                self._cond.notify_all()
+        if victim is not None and self.on_drop:
+            self.on_drop(victim)
+        return victim is not job
+
+    def put_stop(self):
+        with self._cond:
+            # Sorts after every real job so queued work is finished first
+            heapq.heappush(self._heap, (float("inf"), next(self._counter), None))
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            item = heapq.heappop(self._heap)[2]
+            self._cond.notify_all()
+            return item
+
+    def task_done(self, service_time):
+        with self._cond:
+            self._unfinished -= 1
+            self.processed += 1
+            self.service_times.append(service_time)
+            self._cond.notify_all()
+
+    def wait_idle(self, deadline):
+        with self._cond:
+            while self._unfinished > 0:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def depth(self):
+        with self._cond:
+            return len(self._heap)
+
+
+# Clip jobs (encode + upload) currently queued or running, keyed by (class_id, face_id, activity)
+_pending_clip_jobs = set()
+_pending_lock = threading.Lock()
+
+def enqueue_log(timestamp_str, face_id, activity, severity, cropped_face=None, class_id="LR-10", video_clip=None, now=None):
+    """Queue a log event for upload and DB insert. Returns True if it was queued.
+
+    Cooldowns are applied before this by the caller's rate limiter
+    (utils/rate_limiter.py, see cheating_logic.log_event).
+    video_clip may be a list of frames, an existing URL, or a callable returning
+    the frames. Jobs with a clip go through the clip lane, whose worker calls the
+    callable (copying the frames off the caller's thread), and then straight to
+    the video lane; only one per face and activity is in flight at a time. `now`
+    is the event time (epoch seconds); recorded videos pass their own stream
+    clock so the stored timestamp follows the recording.
+    """
     valid_activities = {
         "Looking around frequently",
         "Phone detected",
@@ -26,103 +145,228 @@ def enqueue_log(timestamp_str, face_id, activity, severity, cropped_face=None, c
     }
 
     if activity not in valid_activities or severity not in ["warning", "critical"]:
+        return False
+
+    if now is None:
+        now = time.time()
+
+    clip_key = None
+    if video_clip is not None and not isinstance(video_clip, str):
+        clip_key = (class_id, face_id, activity)
+        with _pending_lock:
+            if clip_key in _pending_clip_jobs:
+                return False
+            _pending_clip_jobs.add(clip_key)
+
+    job = LogJob(timestamp_str, face_id, activity, severity, cropped_face, class_id, video_clip)
+    job.clip_key = clip_key
+    job.timestamp = datetime.utcfromtimestamp(now)
+    job.now = now
+    if clip_key is not None and not _lanes["clip"].put(job):
+        # Too many clips waiting to be copied: the event is still logged, just without its clip
+        print(f"[ASYNC] Clip lane full, logging face {face_id} without a clip, activity={activity}")
+        job.video_clip = job.clip_key = clip_key = None
+    if clip_key is None and not _lanes["image"].put(job):
+        print(f"[ASYNC] Log queue full, dropped {severity} log for face {face_id}, activity={activity}")
+        return False
+
+    print(f"[ASYNC] Enqueued log for face {face_id}, activity={activity}")
+    return True
+
+def _release_clip_key(job):
+    if job.clip_key is not None:
+        with _pending_lock:
+            _pending_clip_jobs.discard(job.clip_key)
+
+def _job_tags(job):
+    return [job.class_id, f"face_{job.face_id}", job.activity, job.severity]
+
+def _job_suffix(job):
+    return f"{job.timestamp_str.replace(':', '-').replace(' ', '_')}_face{job.face_id}"
+
+def _store_snapshot(job):
+    """Store the job's crop, or reuse the ref of a near-identical recent snapshot of the same face."""
+    key = (job.class_id, job.face_id)
+    image_hash = evidence_dedup.dhash(job.cropped_face) if evidence_dedup.DEDUP_ENABLED else None
+    ref = evidence_dedup.deduper.lookup(key, image_hash, job.now)
+    if ref:
+        print(f"[Storage] Reusing snapshot of face {job.face_id} for {job.activity}")
+        return ref
+    ref = storage.store_image(
+        job.cropped_face,
+        public_id=_job_suffix(job),
+        tags=_job_tags(job),
+        class_id=job.class_id,
+        face_id=job.face_id
+    )
+    evidence_dedup.deduper.remember(key, image_hash, ref, job.now)
+    return ref
+
+def _upload_snapshot(job):
+    if job.cropped_face is None:
         return
+    try:
+        job.image_url = _store_snapshot(job)
+        if not job.image_url:
+            print("[Storage] Image upload failed.")
+    except Exception as e:
+        print(f"[Storage Image Upload Error] {e}")
+        job.image_url = None
+    job.cropped_face = None
+
+# ======= Lane handlers =======
+def copy_clip_job(job):
+    """Copy the clip's frames out of the stream's frame ring, then hand the job to the video lane.
 
-    now = time.time()
-    if now - _last_log_time[face_id][activity] < LOG_COOLDOWN_SECONDS:
+    Clip jobs skip the image lane, so full clips only ever wait in the small video lane.
+    """
+    if callable(job.video_clip):
+        job.video_clip = job.video_clip()
+    _lanes["video"].put(job)
+
+def upload_image_job(job):
+    _upload_snapshot(job)
+    if storage.is_ref(job.video_clip):
+        job.video_url = job.video_clip
+    job.video_clip = None
+    _lanes["db"].put(job)
+
+def upload_video_job(job):
+    _upload_snapshot(job)
+    video_clip, job.video_clip = job.video_clip, None
+    if not video_clip:
+        _lanes["db"].put(job)
         return
-    _last_log_time[face_id][activity] = now
+    try:
+        job.video_url = storage.store_clip(
+            video_clip,
+            public_id=_job_suffix(job),
+            tags=_job_tags(job),
+            class_id=job.class_id,
+            face_id=job.face_id
+        )
+        print(f"[DEBUG] Uploaded video URL: {job.video_url}")
+    except Exception as e:
+        print(f"[Storage Video Upload Error] {e}")
+        job.video_url = None
+    _lanes["db"].put(job)
 
-    log_queue.put((timestamp_str, face_id, activity, severity, cropped_face, class_id, video_clip))
-    print(f"[ASYNC] Enqueued log for face {face_id}, activity={activity}")
+def write_db_job(job):
+    face_id, image_url, video_url = job.face_id, job.image_url, job.video_url
+
+    # ======= Type Safety Before DB =======
+    if isinstance(image_url, np.ndarray):
+        print(f"[CRITICAL FIX] image_url was ndarray, setting to None for face {face_id}")
+        image_url = None
+    if isinstance(video_url, list) or (
+        hasattr(video_url, '__len__') and len(video_url) > 0 and isinstance(video_url[0], np.ndarray)
+    ):
+        print(f"[CRITICAL FIX] video_url is raw frames! Clearing before DB insert for face {face_id}")
+        video_url = None
+
+    print(f"[DEBUG] enqueue_log: image_url={image_url}, video_url={video_url}")
 
-def logging_worker():
+    try:
+        # Imported here so that loading the logger does not connect to MongoDB
+        from Backend import db
+        db.insert_log(
+            class_id=job.class_id,
+            face_id=f"S{int(face_id):03d}" if str(face_id).isdigit() else face_id,
+            activity=job.activity,
+            severity=job.severity,
+            image_url=image_url,
+            video_url=video_url,
+            timestamp=job.timestamp
+        )
+        print(f"[ASYNC] Log written to DB for face {face_id}")
+    except Exception as e:
+        print(f"[DB ERROR] {e}")
+
+    _release_clip_key(job)
+    _latencies.append(time.time() - job.enqueued_at)
+
+# ======= Worker pool =======
+# Jobs without a clip enter the image lane; jobs with one enter the clip lane and then go
+# through the video lane (which also stores their snapshot). All end in the db lane.
+# Only the entry lanes drop jobs when full, so work that has started is never thrown away.
+LANE_ORDER = ("clip", "image", "video", "db")
+_lane_handlers = {"clip": copy_clip_job, "image": upload_image_job, "video": upload_video_job, "db": write_db_job}
+_lanes = {
+    "clip": LaneQueue("clip", config.LOG_CLIP_QUEUE_MAX_ITEMS, drop=True, on_drop=_release_clip_key),
+    "image": LaneQueue("image", config.LOG_QUEUE_MAX_ITEMS, drop=True, on_drop=_release_clip_key),
+    "video": LaneQueue("video", config.LOG_VIDEO_QUEUE_MAX_ITEMS),
+    "db": LaneQueue("db", config.LOG_QUEUE_MAX_ITEMS),
+}
+_latencies = deque(maxlen=500)
+_workers = []
+
+def _lane_worker(lane, handler):
     while True:
-        item = log_queue.get()
-        if item is None:
+        job = lane.get()
+        if job is None:
             break
-
-        timestamp_str, face_id, activity, severity, cropped_face, class_id, video_clip = item
-        image_url, video_url = None, None
-        suffix = f"{timestamp_str.replace(':', '-').replace(' ', '_')}_face{face_id}"
-
-        # ======= Upload Image to Cloudinary =======
-        if cropped_face is not None:
-            try:
-                image_url = upload_image_to_cloudinary(
-                    cropped_face,
-                    public_id=suffix,
-                    tags=[class_id, f"face_{face_id}", activity, severity],
-                    class_id=class_id,
-                    face_id=face_id
-                )
-                if not image_url:
-                    print("[Cloudinary] Image upload failed.")
-            except Exception as e:
-                print(f"[Cloudinary Image Upload Error] {e}")
-                image_url = None
-
-        # ======= Upload Video to Cloudinary or Use Existing URL =======
-        if video_clip is not None:
-            if isinstance(video_clip, list) and len(video_clip) > 0:
-                try:
-                    height, width = video_clip[0].shape[:2]
-                    fd, temp_path = tempfile.mkstemp(suffix=".mp4")
-                    os.close(fd)
-
-                    out = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (width, height))
-                    for frame in video_clip:
-                        out.write(frame)
-                    out.release()
-
-                    if os.path.exists(temp_path) and os.path.getsize(temp_path) > 1000:
-                        video_url = upload_video_to_cloudinary(
-                            temp_path,
-                            public_id=suffix,
-                            tags=[class_id, f"face_{face_id}", activity, severity],
-                            class_id=class_id,
-                            face_id=face_id
-                        )
-                        print(f"[DEBUG] Uploaded video URL: {video_url}")
-                    else:
-                        print(f"[ERROR] Video file not saved properly or too small: {temp_path}")
-
-                    os.remove(temp_path)
-
-                except Exception as e:
-                    print(f"[Cloudinary Video Upload Error] {e}")
-                    video_url = None
-            elif isinstance(video_clip, str) and video_clip.startswith("http"):
-                video_url = video_clip
-
-        # ======= Type Safety Before DB =======
-        if isinstance(image_url, np.ndarray):
-            print(f"[CRITICAL FIX] image_url was ndarray, setting to None for face {face_id}")
-            image_url = None
-        if isinstance(video_url, list) or (
-            hasattr(video_url, '__len__') and len(video_url) > 0 and isinstance(video_url[0], np.ndarray)
-        ):
-            print(f"[CRITICAL FIX] video_url is raw frames! Clearing before DB insert for face {face_id}")
-            video_url = None
-
-        print(f"[DEBUG] enqueue_log: image_url={image_url}, video_url={video_url}")
-
-        # ======= Log to Database =======
+        start = time.time()
         try:
-            db.insert_log(
-                class_id=class_id,
-                face_id=f"S{int(face_id):03d}" if str(face_id).isdigit() else face_id,
-                activity=activity,
-                severity=severity,
-                image_url=image_url,
-                video_url=video_url
-            )
-            print(f"[ASYNC] Log written to DB for face {face_id}")
+            handler(job)
         except Exception as e:
-            print(f"[DB ERROR] {e}")
+            print(f"[ASYNC] {lane.name} worker error: {e}")
+            _release_clip_key(job)
+        lane.task_done(time.time() - start)
+
+def _percentile_ms(values, q):
+    return float(np.percentile(np.asarray(values) * 1000, q)) if values else 0.0
+
+def get_metrics():
+    """Queue depth, drops and latency per lane, plus end-to-end enqueue->DB latency."""
+    return {
+        "lanes": {
+            name: {
+                "workers": config.LOG_WORKERS[name],
+                "depth": lane.depth(),
+                "dropped": lane.dropped,
+                "processed": lane.processed,
+                "service_ms_p50": _percentile_ms(list(lane.service_times), 50),
+                "service_ms_p95": _percentile_ms(list(lane.service_times), 95),
+            }
+            for name, lane in _lanes.items()
+        },
+        "latency_ms_p50": _percentile_ms(list(_latencies), 50),
+        "latency_ms_p95": _percentile_ms(list(_latencies), 95),
+        "snapshot_dedup_hits": evidence_dedup.deduper.hits,
+        "snapshot_dedup_misses": evidence_dedup.deduper.misses,
+    }
+
+def flush(timeout=None):
+    """Block until every queued job is written. Returns False if the timeout ran out first."""
+    deadline = None if timeout is None else time.time() + timeout
+    return all(_lanes[name].wait_idle(deadline) for name in LANE_ORDER)
+
+def shutdown(timeout=10.0):
+    """Flush pending jobs, stop the workers, then write out the DB batcher."""
+    if not _workers:
+        return
+    if not flush(timeout):
+        print(f"[ASYNC] Shutdown timed out with jobs pending: {get_metrics()['lanes']}")
+    for t in _workers:
+        _lanes[t.lane_name].put_stop()
+    for t in _workers:
+        t.join(timeout=1.0)
+    _workers.clear()
+    # Backend.db is imported lazily, after this module registered its atexit hook, so its own
+    # hook closes the batcher before the lanes are drained; close it again to store what they added.
+    db = sys.modules.get("Backend.db")
+    if db is not None:
+        db.log_batcher.close()
 
-        log_queue.task_done()
+def start_workers():
+    for name in LANE_ORDER:
+        for i in range(config.LOG_WORKERS[name]):
+            t = threading.Thread(target=_lane_worker, args=(_lanes[name], _lane_handlers[name]),
+                                 name=f"log-{name}-{i}", daemon=True)
+            t.lane_name = name
+            t.start()
+            _workers.append(t)
 
-# ===== Start Background Thread =====
-logging_thread = threading.Thread(target=logging_worker, daemon=True)
-logging_thread.start()
+# ===== Start Background Workers =====
+start_workers()
+atexit.register(shutdown)
@@ -0,0 +1,88 @@
+# utils/config.py
+# Runtime settings shared by main.py, multi_camera.py and the benchmark scripts.
+# Every value can be overridden with the environment variable read next to it.
+
+import os
+
+# Detection mode:
+#   "classic" - phone YOLO + face YOLO + pose YOLO, three model passes per frame
+#   "fused"   - the pose model finds people and their head boxes; phones come from
+#               a secondary pass selected by FUSED_PHONE_PASS
+DETECTION_MODE = os.getenv("DETECTION_MODE", "classic")
+
+# Phone pass used in fused mode:
+#   "crops" - one batched phone pass over crops around each detected person
+#   "full"  - phone model on the whole frame
+#   "none"  - no phone detection
+FUSED_PHONE_PASS = os.getenv("FUSED_PHONE_PASS", "crops")
+
+# Adaptive detection cadence (utils/scheduler.py): each detector runs at its own rate and
+# boxes/keypoints are carried forward with DeepSort and optical flow in between.
+# A rate of 0 means "every frame". Off by default; set ADAPTIVE_CADENCE=1 to enable.
+ADAPTIVE_CADENCE = os.getenv("ADAPTIVE_CADENCE", "0") == "1"
+DETECTOR_RATES_HZ = {
+    "phone": float(os.getenv("PHONE_DETECTION_HZ", "2")),
+    "face": float(os.getenv("FACE_DETECTION_HZ", "5")),
+    "pose": float(os.getenv("POSE_DETECTION_HZ", "10")),
+}
+# Re-run every detector immediately when a face's score rises by at least this many points
+SCORE_RISE_RETRIGGER = float(os.getenv("SCORE_RISE_RETRIGGER", "10"))
+
+# Evidence clips (utils/frame_ring.py): one shared ring of recent frames per stream.
+# The ring holds CLIP_MAX_FRAMES frames, or fewer if they would not fit in EVIDENCE_BUFFER_MB.
+CLIP_MAX_FRAMES = int(os.getenv("CLIP_MAX_FRAMES", "60"))
+EVIDENCE_BUFFER_MB = float(os.getenv("EVIDENCE_BUFFER_MB", "400"))
+
+# Async logger (utils/async_logger.py): worker threads per lane and the bound of each lane's queue.
+# When the queue is full, warnings are dropped before critical events.
+LOG_QUEUE_MAX_ITEMS = int(os.getenv("LOG_QUEUE_MAX_ITEMS", "200"))
+# Clip jobs queue in the clip lane holding only frame references; its worker copies the frames
+# (downscaled to EVIDENCE_MAX_CLIP_SIDE, ~40 MB per 60-frame clip) and passes them to the video
+# lane. That lane is kept small and blocks the clip worker when full, so at most
+# LOG_VIDEO_QUEUE_MAX_ITEMS + clip and video workers copied clips are held at once.
+LOG_CLIP_QUEUE_MAX_ITEMS = int(os.getenv("LOG_CLIP_QUEUE_MAX_ITEMS", "8"))
+LOG_VIDEO_QUEUE_MAX_ITEMS = int(os.getenv("LOG_VIDEO_QUEUE_MAX_ITEMS", "2"))
+LOG_WORKERS = {
+    "clip": int(os.getenv("LOG_CLIP_WORKERS", "1")),
+    "image": int(os.getenv("LOG_IMAGE_WORKERS", "2")),
+    "video": int(os.getenv("LOG_VIDEO_WORKERS", "1")),
+    "db": int(os.getenv("LOG_DB_WORKERS", "1")),
+}
+
+# Stage profiler (utils/profiler.py): per-stage latency percentiles over the last PROFILE_WINDOW
+# samples, an optional on-screen overlay and a per-frame trace (.json or .csv) written on exit.
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "0") == "1"
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "300"))
+PROFILE_OVERLAY = os.getenv("PROFILE_OVERLAY", "1") == "1"
+PROFILE_TRACE_PATH = os.getenv("PROFILE_TRACE_PATH", "")
+
+# Pose-to-face association (utils/detection_helpers.py): "greedy" pairs the closest face and
+# pose first; "hungarian" minimizes the total distance (needs scipy, otherwise greedy is used).
+ASSOCIATION_METHOD = os.getenv("ASSOCIATION_METHOD", "greedy")
+
+# Per-face scoring state (utils/face_state.py): a face unseen for FACE_STATE_TTL_SECONDS is
+# forgotten and its slot reused. FACE_STATE_CAPACITY is the initial number of slots per stream.
+FACE_STATE_TTL_SECONDS = float(os.getenv("FACE_STATE_TTL_SECONDS", "30"))
+FACE_STATE_CAPACITY = int(os.getenv("FACE_STATE_CAPACITY", "64"))
+
+# Event rate limiting (utils/rate_limiter.py): each (stream, face, activity) may log EVENT_BURST
+# events, then one more per cooldown. The cooldown is per severity unless the activity has its
+# own in EVENT_ACTIVITY_COOLDOWNS ("Phone detected=5;CHEATING LIKELY=30"). Each stream may log
+# at most ROOM_EVENT_BUDGET_PER_MINUTE events (0 = no limit).
+EVENT_COOLDOWN_SECONDS = {
+    "warning": float(os.getenv("WARNING_COOLDOWN_SECONDS", "10")),
+    "critical": float(os.getenv("CRITICAL_COOLDOWN_SECONDS", "10")),
+}
+EVENT_ACTIVITY_COOLDOWN_SECONDS = {
+    activity.strip(): float(seconds)
+    for activity, seconds in (
+        item.rsplit("=", 1) for item in os.getenv("EVENT_ACTIVITY_COOLDOWNS", "").split(";") if "=" in item
+    )
+}
+EVENT_BURST = int(os.getenv("EVENT_BURST", "1"))
+ROOM_EVENT_BUDGET_PER_MINUTE = float(os.getenv("ROOM_EVENT_BUDGET_PER_MINUTE", "0"))
+
+# Scoring rules (utils/scoring_rules.py): signal weights and thresholds live in a JSON file that is
+# re-read when it changes, checked at most every SCORING_RULES_RELOAD_SECONDS (0 = never).
+SCORING_RULES_PATH = os.getenv("SCORING_RULES_PATH", os.path.join(os.path.dirname(__file__), "scoring_rules.json"))
+SCORING_RULES_RELOAD_SECONDS = float(os.getenv("SCORING_RULES_RELOAD_SECONDS", "2"))
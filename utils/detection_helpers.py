@@ -1,5 +1,9 @@
 # utils/detection_helpers.py
 
+import numpy as np
+
+from utils import config
+
 def compute_iou(boxA, boxB):
     xA = max(boxA[0], boxB[0])
     yA = max(boxA[1], boxB[1])
@@ -11,34 +15,121 @@ def compute_iou(boxA, boxB):
     iou = interArea / float(boxAArea + boxBArea - interArea) if (boxAArea + boxBArea - interArea) > 0 else 0
     return iou
 
+def iou_matrix(boxes_a, boxes_b):
+    """(len(boxes_a), len(boxes_b)) IoU of every pair of (x1, y1, x2, y2) boxes."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(a[:, np.newaxis, :2], b[np.newaxis, :, :2])
+    bottom_right = np.minimum(a[:, np.newaxis, 2:], b[np.newaxis, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, np.newaxis] + area_b[np.newaxis, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
 def merge_pose_to_tracked(tracked_faces, detected_faces):
+    """Give every track the box, head pose and landmarks of the detection it overlaps most.
+
+    Tracks without an overlapping detection keep their own box and get zero angles.
+    """
+    if not tracked_faces:
+        return []
+    track_boxes = np.array([t['bbox'] for t in tracked_faces], dtype=np.float64).reshape(-1, 4)
+    best = np.full(len(tracked_faces), -1)
+    if detected_faces:
+        ious = iou_matrix(track_boxes, [d['bbox'] for d in detected_faces])
+        best = np.where(ious.max(axis=1) > 0, ious.argmax(axis=1), -1)
+        det_boxes = np.array([d['bbox'] for d in detected_faces], dtype=np.float64).astype(int).tolist()
+    track_boxes = track_boxes.astype(int).tolist()
+
     merged = []
-    for t in tracked_faces:
-        t_box = t['bbox']
-        best_match = None
-        best_iou = 0
-        for d in detected_faces:
-            d_box = d['bbox']
-            iou = compute_iou(t_box, d_box)
-            if iou > best_iou:
-                best_iou = iou
-                best_match = d
-        if best_match is not None:
+    for t, track_box, d_idx in zip(tracked_faces, track_boxes, best.tolist()):
+        if d_idx >= 0:
+            d = detected_faces[d_idx]
             merged.append({
                 'id': t['id'],
-                'bbox': tuple(map(int, best_match['bbox'])),
-                'pitch': best_match.get('pitch', 0),
-                'yaw': best_match.get('yaw', 0),
-                'roll': best_match.get('roll', 0),
-                'landmarks': best_match.get('landmarks', None)
+                'bbox': tuple(det_boxes[d_idx]),
+                'pitch': d.get('pitch', 0),
+                'yaw': d.get('yaw', 0),
+                'roll': d.get('roll', 0),
+                'landmarks': d.get('landmarks', None)
             })
         else:
             merged.append({
                 'id': t['id'],
-                'bbox': tuple(map(int, t_box)),
+                'bbox': tuple(track_box),
                 'pitch': 0,
                 'yaw': 0,
                 'roll': 0,
                 'landmarks': None
             })
     return merged
+
+# === Vectorized association ===
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+def box_centers(boxes):
+    """(N, 2) centers of (x1, y1, x2, y2) boxes."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+def keypoint_array(pose_keypoints_list):
+    """(P, K, 3) array from a PoseResult or a list of per-person keypoint arrays."""
+    keypoints = getattr(pose_keypoints_list, "keypoints", pose_keypoints_list)
+    if keypoints is None or len(keypoints) == 0:
+        return np.zeros((0, 17, 3))
+    return np.asarray(keypoints, dtype=np.float64)
+
+def pose_centers(keypoints, min_conf=0.3):
+    """Mean position of each person's confident keypoints.
+
+    Returns ((P, 2) centers, (P,) bool mask of people with at least one confident keypoint).
+    """
+    valid = keypoints[..., 2] > min_conf
+    counts = valid.sum(axis=1)
+    sums = (keypoints[..., :2] * valid[..., np.newaxis]).sum(axis=1)
+    centers = sums / np.maximum(counts, 1)[:, np.newaxis]
+    return centers, counts > 0
+
+def distance_matrix(a, b):
+    """(len(a), len(b)) Euclidean distances between two sets of 2-D points."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 2)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 2)
+    return np.sqrt(((a[:, np.newaxis, :] - b[np.newaxis, :, :]) ** 2).sum(axis=2))
+
+def assign(dist, max_dist, method=None):
+    """One-to-one assignment of rows to columns closer than max_dist. Returns {row: column}."""
+    method = method or config.ASSOCIATION_METHOD
+    if dist.size == 0:
+        return {}
+    if method == "hungarian" and linear_sum_assignment is not None:
+        # Pairs beyond max_dist are made too expensive to be worth taking, then dropped
+        rows, cols = linear_sum_assignment(np.where(dist < max_dist, dist, max_dist * dist.size + 1))
+        return {int(r): int(c) for r, c in zip(rows, cols) if dist[r, c] < max_dist}
+
+    rows, cols = np.nonzero(dist < max_dist)
+    order = np.argsort(dist[rows, cols], kind="stable")
+    assigned, used_cols = {}, set()
+    for r, c in zip(rows[order], cols[order]):
+        if r in assigned or c in used_cols:
+            continue
+        assigned[int(r)] = int(c)
+        used_cols.add(c)
+    return assigned
+
+def associate_poses_to_faces(pose_keypoints_list, face_boxes, max_dist=100, min_conf=0.3, method=None):
+    """Match every face to at most one pose by the distance between face and pose centers.
+
+    Returns ({face_index: pose_index}, [indices of poses left without a face]).
+    """
+    keypoints = keypoint_array(pose_keypoints_list)
+    centers, has_points = pose_centers(keypoints, min_conf)
+    candidates = np.flatnonzero(has_points)
+    dist = distance_matrix(box_centers(face_boxes), centers[candidates])
+    face_to_pose = {face: int(candidates[col]) for face, col in assign(dist, max_dist, method).items()}
+    matched = set(face_to_pose.values())
+    unmatched = [i for i in range(len(keypoints)) if i not in matched]
+    return face_to_pose, unmatched
@@ -0,0 +1,152 @@
+# utils/face_state.py
+
+import numpy as np
+
+from utils import config
+
+# Glance timestamps kept per face; the most glances a rule can count inside its window
+GLANCE_HISTORY = 16
+
+
+class FaceStateStore:
+    """Per-face scoring state of one stream, kept as numpy columns indexed by slot.
+
+    Track ids map to slots through `index`. A track DeepSort deletes is released
+    (see update_scores), and a face that has not been seen for `ttl_seconds` is
+    evicted; either way its slot is reused by the next new track, so
+    the store stays at the size of the room no matter how many ids DeepSort
+    hands out over an exam. Columns grow (doubling) only when every slot is live.
+    """
+
+    def __init__(self, capacity=None, ttl_seconds=None, clip_frames=None, glance_history=GLANCE_HISTORY):
+        capacity = config.FACE_STATE_CAPACITY if capacity is None else capacity
+        self.ttl_seconds = config.FACE_STATE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.clip_frames = config.CLIP_MAX_FRAMES if clip_frames is None else clip_frames
+        self.glance_history = glance_history
+
+        self.index = {}
+        self.ids = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.live = np.zeros(capacity, dtype=bool)
+        self.score = np.zeros(capacity)
+        self.last_seen = np.zeros(capacity)
+        self.last_suspicious = np.zeros(capacity)
+        self.hands_start = np.full(capacity, np.nan)
+        # Glance times in a small ring per face; only the count inside the rolling window matters
+        self.glance_times = np.full((capacity, self.glance_history), -np.inf)
+        self.glance_pos = np.zeros(capacity, dtype=np.int64)
+        self.glance_count = np.zeros(capacity, dtype=np.int64)
+        # Sequence numbers (in the stream's FrameRingBuffer) and boxes of the face's recent frames
+        self.ref_seqs = np.full((capacity, self.clip_frames), -1, dtype=np.int64)
+        self.ref_boxes = np.zeros((capacity, self.clip_frames, 4), dtype=np.int32)
+        self.ref_pos = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self):
+        old_capacity = len(self.ids)
+        columns = {name: value for name, value in vars(self).items()
+                   if isinstance(value, np.ndarray) and value.shape[:1] == (old_capacity,)}
+        self._allocate(old_capacity * 2)
+        for name, old in columns.items():
+            getattr(self, name)[:old_capacity] = old
+        self.ids.extend([None] * old_capacity)
+        self._free.extend(range(2 * old_capacity - 1, old_capacity - 1, -1))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, track_id):
+        return track_id in self.index
+
+    # ======= Slots =======
+    def get(self, track_id):
+        return self.index.get(track_id)
+
+    def slot(self, track_id, now):
+        """Slot of `track_id`, allocating a fresh one for a new track. Marks the face as seen at `now`."""
+        slot = self.index.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._reset(slot)
+            self.index[track_id] = slot
+            self.ids[slot] = track_id
+            self.live[slot] = True
+        self.last_seen[slot] = now
+        return slot
+
+    def _reset(self, slot):
+        self.score[slot] = 0.0
+        self.last_suspicious[slot] = 0.0
+        self.hands_start[slot] = np.nan
+        self.glance_times[slot] = -np.inf
+        self.glance_pos[slot] = 0
+        self.glance_count[slot] = 0
+        self.ref_seqs[slot] = -1
+        self.ref_pos[slot] = 0
+
+    def slots(self, track_ids, now):
+        """Slots of several tracks at once, as an int array (see slot())."""
+        return np.fromiter((self.slot(track_id, now) for track_id in track_ids), dtype=np.int64, count=len(track_ids))
+
+    def release(self, track_id):
+        slot = self.index.pop(track_id, None)
+        if slot is not None:
+            self.ids[slot] = None
+            self.live[slot] = False
+            self._free.append(slot)
+
+    def evict(self, now):
+        """Free the slots of faces not seen for ttl_seconds. Returns the evicted track ids."""
+        stale = np.flatnonzero(self.live & (now - self.last_seen > self.ttl_seconds))
+        evicted = [self.ids[slot] for slot in stale]
+        for track_id in evicted:
+            self.release(track_id)
+        return evicted
+
+    # ======= Per-face history =======
+    def add_glance(self, slot, now, window):
+        """Record a glance and return how many glances fall inside the last `window` seconds."""
+        self.glance_times[slot, self.glance_pos[slot] % self.glance_history] = now
+        self.glance_pos[slot] += 1
+        self.glance_count[slot] = int(np.count_nonzero(now - self.glance_times[slot] <= window))
+        return self.glance_count[slot]
+
+    def add_glances(self, slots, now, window):
+        """add_glance() for several distinct slots; returns their glance counts."""
+        self.glance_times[slots, self.glance_pos[slots] % self.glance_history] = now
+        self.glance_pos[slots] += 1
+        self.glance_count[slots] = np.count_nonzero(now - self.glance_times[slots] <= window, axis=1)
+        return self.glance_count[slots]
+
+    def push_frame_ref(self, slot, seq, bbox):
+        pos = self.ref_pos[slot] % self.clip_frames
+        self.ref_seqs[slot, pos] = -1 if seq is None else seq
+        self.ref_boxes[slot, pos] = bbox
+        self.ref_pos[slot] += 1
+
+    def push_frame_refs(self, slots, seq, boxes):
+        """push_frame_ref() of the same frame for several distinct slots."""
+        pos = self.ref_pos[slots] % self.clip_frames
+        self.ref_seqs[slots, pos] = -1 if seq is None else seq
+        self.ref_boxes[slots, pos] = boxes
+        self.ref_pos[slots] += 1
+
+    def frame_refs(self, slot):
+        """Sequence numbers of the face's recent frames, oldest first."""
+        n = min(self.ref_pos[slot], self.clip_frames)
+        order = (np.arange(self.ref_pos[slot] - n, self.ref_pos[slot]) % self.clip_frames)
+        seqs = self.ref_seqs[slot, order]
+        return seqs[seqs >= 0].tolist()
+
+    # ======= Reading =======
+    def score_of(self, track_id, default=0.0):
+        slot = self.index.get(track_id)
+        return default if slot is None else float(self.score[slot])
+
+    def scores(self):
+        """{track_id: score} of every live face."""
+        return {track_id: float(self.score[slot]) for track_id, slot in self.index.items()}
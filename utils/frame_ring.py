@@ -0,0 +1,79 @@
+# utils/frame_ring.py
+
+import numpy as np
+
+from Backend.evidence_encoding import MAX_CLIP_SIDE, limit_size
+from utils import config
+
+
+class FrameRingBuffer:
+    """Preallocated ring of the most recent frames of one stream.
+
+    Every face of the stream shares the same ring and only keeps the sequence
+    numbers (and boxes) of the frames it appeared in. Frames are copied out only
+    when a clip is actually needed, so memory stays at `capacity` frames no
+    matter how many faces are tracked.
+
+    push() runs on the scoring thread while materialize() may run on a logger
+    thread: a slot's sequence number is cleared while its frame is rewritten, and
+    a frame whose number changed during the copy is left out of the clip.
+    """
+
+    def __init__(self, capacity=None, budget_mb=None):
+        self.max_frames = config.CLIP_MAX_FRAMES if capacity is None else capacity
+        self.budget_bytes = (config.EVIDENCE_BUFFER_MB if budget_mb is None else budget_mb) * 1024 * 1024
+        self.capacity = 0
+        self._frames = None
+        self._seqs = None
+        self.next_seq = 0
+
+    def _allocate(self, frame):
+        # Allocated lazily because the resolution is only known once the first frame arrives
+        frame_bytes = max(1, frame.nbytes)
+        self.capacity = int(max(1, min(self.max_frames, self.budget_bytes // frame_bytes)))
+        self._frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+        self._seqs = np.full(self.capacity, -1, dtype=np.int64)
+
+    def push(self, frame):
+        """Copy a frame into the ring and return its sequence number."""
+        if self._frames is None or self._frames.shape[1:] != frame.shape or self._frames.dtype != frame.dtype:
+            self._allocate(frame)
+        seq = self.next_seq
+        slot = seq % self.capacity
+        self._seqs[slot] = -1
+        np.copyto(self._frames[slot], frame)
+        self._seqs[slot] = seq
+        self.next_seq += 1
+        return seq
+
+    def get(self, seq):
+        """Return a view of the frame with this sequence number, or None if it was overwritten."""
+        if self._frames is None or seq < 0:
+            return None
+        slot = seq % self.capacity
+        if self._seqs[slot] != seq:
+            return None
+        return self._frames[slot]
+
+    def materialize(self, seqs, max_side=None):
+        """Copy out the frames still held for `seqs`, in order, skipping overwritten ones.
+
+        Frames are downscaled to `max_side` (EVIDENCE_MAX_CLIP_SIDE by default) while
+        copying, so a clip waiting for upload holds no more than the encoder will use.
+        """
+        max_side = MAX_CLIP_SIDE if max_side is None else max_side
+        frames, seqs_held = self._frames, self._seqs
+        clip = []
+        for seq in seqs:
+            frame = self.get(seq)
+            if frame is None:
+                continue
+            copy = limit_size(frame, max_side)
+            copy = frame.copy() if copy is frame else copy
+            if self._frames is frames and seqs_held[seq % len(seqs_held)] == seq:
+                clip.append(copy)
+        return clip
+
+    @property
+    def nbytes(self):
+        return 0 if self._frames is None else self._frames.nbytes
@@ -0,0 +1,152 @@
+# utils/multi_stream.py
+
+import time
+import cv2
+
+from detection import face_detection, fused_detection, object_detection, pose_detection
+from utils import cheating_logic, config, tracker
+from utils.detection_helpers import merge_pose_to_tracked
+
+
+class StreamContext:
+    """One camera or video file together with the state that must not be shared between rooms.
+
+    With clock="stream" the event time of a frame is `start_time` plus its
+    CAP_PROP_POS_MSEC position, so a recording can be processed faster than real
+    time and still get the timestamps and cooldowns it had when it was recorded.
+    `stride` analyzes only every n-th frame; the others are grabbed but not decoded.
+    """
+
+    def __init__(self, source, class_id, clock="wall", start_time=0.0, stride=1, log_sink=None):
+        self.source = source
+        self.class_id = class_id
+        self.clock = clock
+        self.start_time = start_time
+        self.stride = max(1, stride)
+        self.cap = cv2.VideoCapture(source)
+        self.face_tracker = tracker.create_tracker()
+        self.face_mesh = face_detection.create_face_mesh()
+        self.score_state = cheating_logic.ScoreState(class_id=class_id, log_sink=log_sink)
+        self.frame_index = 0
+        self.now = None
+        self.finished = not self.cap.isOpened()
+        if self.finished:
+            print(f"[STREAM] Could not open source {source} for {class_id}")
+
+    def read(self):
+        if self.finished:
+            return None
+        for _ in range(self.stride - 1):
+            if not self.cap.grab():
+                break
+            self.frame_index += 1
+        ret, frame = self.cap.read()
+        if not ret:
+            self.finished = True
+            self.cap.release()
+            return None
+        self.frame_index += 1
+        if self.clock == "stream":
+            self.now = self.start_time + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        else:
+            self.now = time.time()
+        return frame
+
+    def release(self):
+        if not self.finished:
+            self.cap.release()
+        self.finished = True
+
+
+class MultiStreamEngine:
+    """Runs the phone, face and pose models on batches of frames gathered from N streams.
+
+    Every step() reads one frame from each live stream, runs each YOLO model over the
+    frames in batches of `batch_size`, then splits the detections back to their stream
+    and updates that stream's own tracker and scores.
+    """
+
+    def __init__(self, phone_model, face_model, pose_model, streams, batch_size=8, mode=None):
+        self.phone_model = phone_model
+        self.face_model = face_model
+        self.pose_model = pose_model
+        self.streams = streams
+        self.batch_size = max(1, batch_size)
+        self.mode = mode or config.DETECTION_MODE
+
+    @property
+    def active(self):
+        return any(not stream.finished for stream in self.streams)
+
+    def step(self):
+        """Process one frame per stream. Returns a list of (stream, packet) pairs."""
+        batch = []
+        for stream in self.streams:
+            frame = stream.read()
+            if frame is not None:
+                batch.append((stream, frame))
+        if not batch:
+            return []
+
+        frames = [frame for _, frame in batch]
+        rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        face_meshes = [stream.face_mesh for stream, _ in batch]
+
+        detections = []
+        for start in range(0, len(batch), self.batch_size):
+            end = start + self.batch_size
+            detections.extend(self._detect_batch(frames[start:end], rgb_frames[start:end], face_meshes[start:end]))
+
+        packets = []
+        for (stream, frame), (phone_boxes, faces, pose_result) in zip(batch, detections):
+            try:
+                packets.append((stream, self._score_stream(stream, frame, stream.now, phone_boxes, faces, pose_result)))
+            except Exception as e:
+                print(f"[STREAM] Error scoring {stream.class_id}: {e}")
+        return packets
+
+    def _detect_batch(self, frames, rgb_frames, face_meshes):
+        if self.mode == "fused":
+            models = {'phone': self.phone_model, 'pose': self.pose_model}
+            return fused_detection.detect_fused_batch(models, frames, rgb_frames, face_meshes)
+        return list(zip(
+            object_detection.detect_phones_batch(self.phone_model, frames),
+            face_detection.get_faces_batch(self.face_model, face_meshes, rgb_frames),
+            pose_detection.estimate_pose_batch(self.pose_model, frames),
+        ))
+
+    def _score_stream(self, stream, frame, now, phone_boxes, faces, pose_result):
+        face_detections = [(list(face['bbox']), 1.0, 0) for face in faces]
+        deleted_track_ids = []
+        tracked_faces = tracker.get_tracked_faces(frame, face_detections, face_tracker=stream.face_tracker, deleted=deleted_track_ids)
+        tracked_faces = merge_pose_to_tracked(tracked_faces, faces)
+
+        hands_near = pose_detection.hands_near_faces(pose_result, tracked_faces)
+        hands_near_face_dict = {face['id']: hands_near.get(face['id'], False) for face in tracked_faces}
+
+        display = frame.copy()
+        cheating_logic.update_scores(
+            tracked_faces,
+            phone_boxes,
+            hands_near_face_dict,
+            now,
+            display,
+            hand_boxes=None,
+            pose_keypoints_list=pose_result,
+            state=stream.score_state,
+            deleted_track_ids=deleted_track_ids
+        )
+        return {
+            'index': stream.frame_index,
+            'frame': frame,
+            'display': display,
+            'now': now,
+            'phone_boxes': phone_boxes,
+            'tracked_faces': tracked_faces,
+            'hands_near_face_dict': hands_near_face_dict,
+            'pose_result': pose_result,
+        }
+
+    def release(self):
+        for stream in self.streams:
+            stream.release()
@@ -0,0 +1,180 @@
+# utils/pipeline.py
+
+import queue
+import threading
+
+# Queue policies when a downstream stage falls behind:
+#   "block"        - wait for space (backpressure all the way to the source)
+#   "drop_oldest"  - evict the oldest queued item to make room (keeps latency low for live cameras)
+#   "drop_newest"  - discard the incoming item
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+_STOP = object()
+
+
+class StageQueue:
+    """Bounded queue between two pipeline stages with a configurable drop policy."""
+
+    def __init__(self, maxsize=4, drop_policy="block", stop_event=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.drop_policy = drop_policy
+        self.stop_event = stop_event or threading.Event()
+        self.dropped = 0
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def put(self, item):
+        if self.drop_policy == "drop_newest":
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+            return
+
+        if self.drop_policy == "drop_oldest":
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+        self._put_blocking(item)
+
+    def put_stop(self):
+        # The stop marker is never dropped, otherwise downstream threads would hang.
+        self._put_blocking(_STOP, force=True)
+
+    def _put_blocking(self, item, force=False):
+        while force or not self.stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if force and self.stop_event.is_set():
+                    self.drain()
+
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def drain(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                self._queue.put_nowait(item)
+                return
+
+
+class Stage:
+    """A named step of the pipeline running `fn` on its own thread.
+
+    `fn(item)` returns the item for the next stage, or None to drop it.
+    """
+
+    def __init__(self, name, fn, queue_size=4, drop_policy="block"):
+        self.name = name
+        self.fn = fn
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.processed = 0
+        self.errors = 0
+
+
+class FramePipeline:
+    """Runs a frame source and a chain of stages on separate threads.
+
+    Items flow source -> stage 1 -> ... -> stage N -> results(), with a
+    bounded StageQueue in front of every stage and in front of the consumer.
+    The consumer side (results()) runs on the caller's thread so that
+    rendering with cv2.imshow stays on the main thread.
+    """
+
+    def __init__(self, source, stages, output_queue_size=4, output_drop_policy="block"):
+        self.source = source
+        self.stages = stages
+        self.stop_event = threading.Event()
+        self.queues = [
+            StageQueue(stage.queue_size, stage.drop_policy, self.stop_event) for stage in stages
+        ]
+        self.queues.append(StageQueue(output_queue_size, output_drop_policy, self.stop_event))
+        self._threads = []
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._run_source, name="pipeline-source", daemon=True))
+        for i, stage in enumerate(self.stages):
+            self._threads.append(threading.Thread(
+                target=self._run_stage, args=(stage, self.queues[i], self.queues[i + 1]),
+                name=f"pipeline-{stage.name}", daemon=True
+            ))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _run_source(self):
+        out_q = self.queues[0]
+        try:
+            for item in self.source:
+                if self.stop_event.is_set():
+                    break
+                out_q.put(item)
+        except Exception as e:
+            print(f"[PIPELINE] Source error: {e}")
+        finally:
+            out_q.put_stop()
+
+    def _run_stage(self, stage, in_q, out_q):
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            if self.stop_event.is_set():
+                continue
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                stage.errors += 1
+                print(f"[PIPELINE] Error in stage '{stage.name}': {e}")
+                continue
+            stage.processed += 1
+            if result is not None:
+                out_q.put(result)
+        out_q.put_stop()
+
+    def results(self):
+        """Yield finished items until the source is exhausted or stop() is called."""
+        out_q = self.queues[-1]
+        while True:
+            try:
+                item = out_q.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop_event.is_set() and not any(t.is_alive() for t in self._threads):
+                    return
+                continue
+            if item is _STOP:
+                return
+            yield item
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for q in self.queues:
+            q.drain()
+        for t in self._threads:
+            t.join(timeout=timeout)
+
+    def stats(self):
+        return {
+            "queue_depths": {stage.name: q.qsize() for stage, q in zip(self.stages, self.queues)},
+            "dropped": {stage.name: q.dropped for stage, q in zip(self.stages, self.queues)},
+            "processed": {stage.name: stage.processed for stage in self.stages},
+            "errors": {stage.name: stage.errors for stage in self.stages},
+        }
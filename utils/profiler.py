@@ -0,0 +1,151 @@
+# utils/profiler.py
+
+import csv
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from utils import config
+
+# Stages in the order they run on a frame; unknown stage names are appended after these
+STAGES = [
+    "decode", "phone_yolo", "face_yolo", "facemesh", "pose", "deepsort",
+    "update_scores", "draw", "display",
+]
+
+
+class StageProfiler:
+    """Per-stage wall-time profiler for the detection loop.
+
+    Every pipeline stage calls `begin_frame(index)` before working on a frame,
+    so timings taken with `stage(name)` / `timed(name)` on that thread are
+    attributed to the right frame even when stages run on different threads.
+    Keeps a rolling window of timings per stage for p50/p95/p99 and FPS, and
+    a bounded per-frame trace that can be exported to JSON or CSV.
+    """
+
+    def __init__(self, enabled=False, window=300, trace_max_frames=100000):
+        self.enabled = enabled
+        self.window = window
+        self._samples = {}
+        self._frames = {}
+        self._trace = deque(maxlen=trace_max_frames)
+        self._frame_ends = deque(maxlen=window)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ======= Recording =======
+    def begin_frame(self, index):
+        self._local.frame = index
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def timed(self, name):
+        """Decorator form of `stage`."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, ms):
+        frame = getattr(self._local, "frame", None)
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(ms)
+            if frame is not None:
+                timings = self._frames.setdefault(frame, {})
+                timings[name] = timings.get(name, 0.0) + ms
+
+    def end_frame(self, index, started=None):
+        """Close a frame's trace row; `started` is the time.time() it was decoded at."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            timings = self._frames.pop(index, {})
+            # Frames finish in order; older partial rows belong to frames that were dropped
+            for stale in [i for i in self._frames if i < index]:
+                del self._frames[stale]
+            self._frame_ends.append(now)
+            row = {"frame": index, "end": now}
+            if started is not None:
+                row["latency"] = (now - started) * 1000.0
+            row.update(timings)
+            self._trace.append(row)
+
+    # ======= Reporting =======
+    def fps(self):
+        with self._lock:
+            ends = list(self._frame_ends)
+        if len(ends) < 2 or ends[-1] == ends[0]:
+            return 0.0
+        return (len(ends) - 1) / (ends[-1] - ends[0])
+
+    def summary(self):
+        """{stage: {"p50", "p95", "p99", "mean", "count"}} in milliseconds over the rolling window."""
+        with self._lock:
+            samples = {name: np.array(values) for name, values in self._samples.items() if values}
+        stats = {}
+        for name in _ordered(samples):
+            p50, p95, p99 = np.percentile(samples[name], [50, 95, 99])
+            stats[name] = {
+                "p50": float(p50), "p95": float(p95), "p99": float(p99),
+                "mean": float(samples[name].mean()), "count": int(len(samples[name])),
+            }
+        return stats
+
+    def draw_overlay(self, frame, origin=(10, 60)):
+        if not self.enabled:
+            return
+        x, y = origin
+        lines = [f"FPS {self.fps():.1f}   p50 / p95 / p99 ms"]
+        lines += [f"{name:<14}{s['p50']:6.1f} {s['p95']:6.1f} {s['p99']:6.1f}" for name, s in self.summary().items()]
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (x, y + 18 * i), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 255, 255), 1)
+
+    def export(self, path):
+        """Write the per-frame trace to `path`; .csv gets one row per frame, anything else JSON."""
+        with self._lock:
+            trace = list(self._trace)
+        if path.endswith(".csv"):
+            names = _ordered({name for row in trace for name in row} - {"frame", "end", "latency"})
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["frame", "end", "latency"] + names)
+                writer.writeheader()
+                writer.writerows(trace)
+        else:
+            with open(path, "w") as f:
+                json.dump({"fps": self.fps(), "summary": self.summary(), "frames": trace}, f, indent=2)
+        print(f"[PROFILE] Trace of {len(trace)} frames written to {path}")
+
+    def print_summary(self):
+        print(f"[PROFILE] FPS: {self.fps():.1f}")
+        for name, s in self.summary().items():
+            print(f"[PROFILE] {name:<14} p50={s['p50']:.1f}ms p95={s['p95']:.1f}ms p99={s['p99']:.1f}ms (n={s['count']})")
+
+
+def _ordered(names):
+    return [name for name in STAGES if name in names] + sorted(name for name in names if name not in STAGES)
+
+
+profiler = StageProfiler(enabled=config.PROFILE_STAGES, window=config.PROFILE_WINDOW)
@@ -0,0 +1,110 @@
+# utils/rate_limiter.py
+
+import threading
+from collections import Counter
+
+from utils import config
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "interval", "capacity")
+
+    def __init__(self, capacity, interval, now):
+        self.tokens = capacity
+        self.capacity = capacity
+        self.interval = interval
+        self.updated = now
+
+    def refill(self, now):
+        if self.interval <= 0:
+            self.tokens = self.capacity
+        elif now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = max(self.updated, now)
+
+    def full_at(self):
+        """Time at which the bucket is full again."""
+        return self.updated + (self.capacity - self.tokens) * max(self.interval, 0.0)
+
+
+class EventRateLimiter:
+    """Token buckets deciding which scoring events get logged.
+
+    Every (stream, face, activity) has a bucket holding up to `burst` tokens that
+    refills one token per cooldown, the cooldown coming from the activity if it has
+    its own and from the severity otherwise. With burst=1 this is exactly a
+    cooldown: one event, then silence for the cooldown. On top of that every
+    stream has a room budget of `room_budget_per_minute` events (0 = unlimited).
+
+    A bucket that has refilled completely behaves like a new one, so it is
+    dropped on the next sweep; the table only holds faces that logged recently.
+    """
+
+    def __init__(self, severity_cooldowns=None, activity_cooldowns=None, burst=None,
+                 room_budget_per_minute=None, sweep_seconds=30.0):
+        self.severity_cooldowns = dict(config.EVENT_COOLDOWN_SECONDS if severity_cooldowns is None else severity_cooldowns)
+        self.activity_cooldowns = dict(config.EVENT_ACTIVITY_COOLDOWN_SECONDS if activity_cooldowns is None else activity_cooldowns)
+        self.burst = max(1, config.EVENT_BURST if burst is None else burst)
+        self.room_budget = config.ROOM_EVENT_BUDGET_PER_MINUTE if room_budget_per_minute is None else room_budget_per_minute
+        self.sweep_seconds = sweep_seconds
+        self._buckets = {}
+        self._rooms = {}
+        self._last_sweep = None
+        self._lock = threading.Lock()
+        self.allowed = Counter()
+        self.suppressed = Counter()
+
+    def cooldown(self, activity, severity):
+        cooldown = self.activity_cooldowns.get(activity)
+        if cooldown is None:
+            cooldown = self.severity_cooldowns.get(severity, 0.0)
+        return cooldown
+
+    def allow(self, stream, face_id, activity, severity, now):
+        """Take a token for the event if both its bucket and the room budget have one."""
+        key = (stream, face_id, activity)
+        with self._lock:
+            self._maybe_sweep(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.burst, self.cooldown(activity, severity), now)
+            bucket.refill(now)
+            if bucket.tokens < 1:
+                self.suppressed[("cooldown", activity)] += 1
+                return False
+
+            if self.room_budget > 0:
+                room = self._rooms.get(stream)
+                if room is None:
+                    room = self._rooms[stream] = _Bucket(self.room_budget, 60.0 / self.room_budget, now)
+                room.refill(now)
+                if room.tokens < 1:
+                    self.suppressed[("room_budget", activity)] += 1
+                    return False
+                room.tokens -= 1
+
+            bucket.tokens -= 1
+            self.allowed[activity] += 1
+            return True
+
+    def _maybe_sweep(self, now):
+        if self._last_sweep is None:
+            self._last_sweep = now
+        if now - self._last_sweep < self.sweep_seconds:
+            return
+        self._last_sweep = now
+        for key, bucket in list(self._buckets.items()):
+            if bucket.full_at() <= now:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def stats(self):
+        """Allowed events per activity and suppressed ones per (reason, activity)."""
+        with self._lock:
+            return {
+                "tracked_keys": len(self._buckets),
+                "allowed": dict(self.allowed),
+                "suppressed": {f"{reason}:{activity}": n for (reason, activity), n in self.suppressed.items()},
+            }
@@ -0,0 +1,125 @@
+# utils/scheduler.py
+
+import threading
+import cv2
+
+from detection import face_detection, fused_detection, object_detection, pose_detection
+from detection.pose_detection import PoseResult
+from utils import config
+from utils.tracker import propagate_boxes, propagate_points
+
+
+class DetectionScheduler:
+    """Decides which detectors are due on a frame, each at its own rate in Hz."""
+
+    def __init__(self, rates_hz=None, score_rise_threshold=None):
+        self.rates_hz = dict(config.DETECTOR_RATES_HZ if rates_hz is None else rates_hz)
+        self.score_rise_threshold = (config.SCORE_RISE_RETRIGGER
+                                     if score_rise_threshold is None else score_rise_threshold)
+        self._last_run = {}
+        self._forced = set()
+        self._prev_scores = {}
+        self._lock = threading.Lock()
+
+    def due(self, name, now):
+        with self._lock:
+            if name in self._forced:
+                return True
+        rate = self.rates_hz.get(name, 0)
+        if rate <= 0 or name not in self._last_run:
+            return True
+        return now - self._last_run[name] >= 1.0 / rate
+
+    def mark_run(self, name, now):
+        self._last_run[name] = now
+        with self._lock:
+            self._forced.discard(name)
+
+    def trigger(self, name=None):
+        """Force one detector (or all of them) to run on the next frame."""
+        with self._lock:
+            if name is None:
+                self._forced.update(self.rates_hz)
+            else:
+                self._forced.add(name)
+
+    def check_scores(self, scores):
+        """Re-trigger every detector when any face's cheating score rose sharply."""
+        rising = False
+        scores = dict(scores)
+        for face_id, score in scores.items():
+            if score - self._prev_scores.get(face_id, 0) >= self.score_rise_threshold:
+                rising = True
+        # Faces missing from the map have been evicted; forget them
+        self._prev_scores = scores
+        if rising:
+            self.trigger()
+        return rising
+
+
+class CadencedDetector:
+    """Runs phone, face and pose detection according to a DetectionScheduler.
+
+    On frames where a detector is not due, its last output is carried forward
+    with Lucas-Kanade optical flow: phone boxes, pose keypoints and face boxes.
+    detect() returns (phone_boxes, faces, pose_result, faces_fresh). The faces
+    are fed to DeepSort on every frame, since it deletes a tentative track after
+    a single frame without a detection. When faces_fresh is False their head
+    pose is that of the last detection and should not be used.
+    """
+
+    def __init__(self, models, scheduler=None, mode=None):
+        self.models = models
+        self.scheduler = scheduler or DetectionScheduler()
+        self.mode = mode or config.DETECTION_MODE
+        self.prev_gray = None
+        self.phone_boxes = []
+        self.faces = []
+        self.pose_result = PoseResult()
+
+    def detect(self, frame, rgb_frame, now):
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.scheduler.due("pose", now):
+            self.pose_result = pose_detection.estimate_pose(self.models['pose'], frame)
+            self.scheduler.mark_run("pose", now)
+        else:
+            self.pose_result = self._propagate_pose(gray)
+
+        faces_fresh = self.scheduler.due("face", now)
+        if faces_fresh:
+            if self.mode == "fused":
+                head_boxes = fused_detection.head_boxes_from_pose(self.pose_result, w, h)
+                self.faces = face_detection.faces_from_boxes(head_boxes, self.models['face_mesh'], rgb_frame, w, h)
+            else:
+                self.faces = face_detection.get_faces(self.models['face'], self.models['face_mesh'], rgb_frame, w, h)
+            self.scheduler.mark_run("face", now)
+        else:
+            boxes = propagate_boxes(self.prev_gray, gray, [face['bbox'] for face in self.faces])
+            self.faces = [dict(face, bbox=tuple(box)) for face, box in zip(self.faces, boxes)]
+
+        if self.scheduler.due("phone", now):
+            self.phone_boxes = self._detect_phones(frame)
+            self.scheduler.mark_run("phone", now)
+        else:
+            self.phone_boxes = propagate_boxes(self.prev_gray, gray, self.phone_boxes)
+
+        self.prev_gray = gray
+        return self.phone_boxes, self.faces, self.pose_result, faces_fresh
+
+    def _detect_phones(self, frame):
+        if self.mode == "fused":
+            return fused_detection.fused_phone_boxes(self.models['phone'], frame, self.pose_result)
+        return object_detection.detect_phones(self.models['phone'], frame)
+
+    def _propagate_pose(self, gray):
+        keypoints = self.pose_result.keypoints
+        if len(keypoints) == 0:
+            return self.pose_result
+        moved, ok = propagate_points(self.prev_gray, gray, keypoints[..., :2].reshape(-1, 2))
+        keypoints = keypoints.copy()
+        xy = keypoints[..., :2].reshape(-1, 2)
+        xy[ok] = moved[ok]
+        keypoints[..., :2] = xy.reshape(keypoints.shape[0], -1, 2)
+        return PoseResult(keypoints)
@@ -0,0 +1,224 @@
+# utils/scoring_rules.py
+
+import ast
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils import config
+from utils.face_state import GLANCE_HISTORY
+
+# Boolean per-face features computed every frame; rule conditions are written in terms of these
+FEATURES = [
+    "glance", "frequent_glances", "hands_near", "hands_held",
+    "phone_intersect", "phone_near", "phone_near_hand", "turned_back",
+]
+SEVERITIES = ("warning", "critical")
+# Activities log_event accepts; anything else is dropped there, so rules are checked against it at load time
+ACTIVITIES = [
+    "Looking around frequently", "Phone detected", "Phone detected NEAR HAND",
+    "Phone detected near face", "Suspicious behavior", "CHEATING LIKELY", "Turned back detected",
+    "Phone detected (no face nearby)"
+]
+
+
+class RuleError(ValueError):
+    pass
+
+
+# ======= Compiling conditions =======
+def compile_condition(expression):
+    """Turn "phone_near and not phone_near_hand" into a function of the feature arrays.
+
+    Only feature names, and/or/not and parentheses are accepted; the result
+    combines whole (num_faces,) boolean arrays with &, | and ~.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval").body
+    except SyntaxError as e:
+        raise RuleError(f"Invalid condition {expression!r}: {e.msg}")
+
+    def build(node):
+        if isinstance(node, ast.Name):
+            if node.id not in FEATURES:
+                raise RuleError(f"Unknown feature {node.id!r} in {expression!r}, expected one of {FEATURES}")
+            name = node.id
+            return lambda features: features[name]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = build(node.operand)
+            return lambda features: ~operand(features)
+        if isinstance(node, ast.BoolOp):
+            operands = [build(value) for value in node.values]
+            combine = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+            return lambda features: combine([operand(features) for operand in operands])
+        raise RuleError(f"Unsupported syntax in condition {expression!r}")
+
+    return build(tree)
+
+
+class Rule:
+    """One signal: when its condition holds for a face it adds to (or sets) the face's suspicion level."""
+
+    def __init__(self, spec):
+        self.name = spec.get("name") or spec.get("when")
+        self.when = spec["when"]
+        self.condition = compile_condition(self.when)
+        if ("add" in spec) == ("set" in spec):
+            raise RuleError(f"Rule {self.name!r} needs exactly one of 'add' or 'set'")
+        self.op = "add" if "add" in spec else "set"
+        self.value = float(spec[self.op])
+        self.suspicious = bool(spec.get("suspicious", True))
+        log = spec.get("log")
+        self.activity = log["activity"] if log else None
+        self.severity = log["severity"] if log else None
+        if log and self.activity not in ACTIVITIES:
+            raise RuleError(f"Rule {self.name!r} has unknown activity {self.activity!r}, expected one of {ACTIVITIES}")
+        if log and self.severity not in SEVERITIES:
+            raise RuleError(f"Rule {self.name!r} has unknown severity {self.severity!r}, expected one of {list(SEVERITIES)}")
+
+
+class RuleSet:
+    """Compiled contents of a scoring rules file (see utils/scoring_rules.json)."""
+
+    def __init__(self, spec):
+        features = spec.get("features", {})
+        self.glance_yaw = float(features.get("glance_yaw_deg", 60))
+        self.glance_pitch = float(features.get("glance_pitch_deg", -40))
+        self.glance_window = float(features.get("glance_window_seconds", 10))
+        self.frequent_glance_count = int(features.get("frequent_glance_count", 6))
+        if not 1 <= self.frequent_glance_count <= GLANCE_HISTORY:
+            # The per-face glance ring could never hold that many, so the rule would silently never fire
+            raise RuleError(f"frequent_glance_count must be between 1 and {GLANCE_HISTORY}, got {self.frequent_glance_count}")
+        self.hands_held_seconds = float(features.get("hands_held_seconds", 3.0))
+        self.phone_near_px = float(features.get("phone_near_px", 50))
+        self.phone_min_area = float(features.get("phone_min_area", 1000))
+        self.phone_min_aspect = float(features.get("phone_min_aspect", 0.4))
+        self.phone_max_aspect = float(features.get("phone_max_aspect", 2.5))
+
+        self.rules = [Rule(rule) for rule in spec.get("rules", [])]
+        self.log_rules = [i for i, rule in enumerate(self.rules) if rule.activity]
+
+        score = spec.get("score", {})
+        self.alpha = float(score.get("alpha", 0.5))
+        self.frequent_glance_bonus = float(score.get("frequent_glance_bonus", 10))
+        self.decay_per_second = float(score.get("decay_per_second", 5.0))
+        self.suspicious_above = float(score.get("suspicious_above", 50))
+        self.cheating_above = float(score.get("cheating_above", 85))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # ======= Features =======
+    def phone_mask(self, phones):
+        """Which rows of a (P, 4) box array have a phone-like size and aspect ratio."""
+        width = phones[:, 2] - phones[:, 0]
+        height = phones[:, 3] - phones[:, 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            aspect = height / width
+        valid = ((width > 0) & (height > 0) & (aspect > self.phone_min_aspect)
+                 & (aspect < self.phone_max_aspect) & (width * height >= self.phone_min_area))
+        return valid
+
+    def near(self, boxes_a, boxes_b):
+        """(A, B) matrix of boxes whose centres are closer than phone_near_px."""
+        centers_a = (boxes_a[:, None, :2] + boxes_a[:, None, 2:]) / 2
+        centers_b = (boxes_b[None, :, :2] + boxes_b[None, :, 2:]) / 2
+        return np.sqrt(((centers_a - centers_b) ** 2).sum(axis=2)) < self.phone_near_px
+
+    def features(self, store, slots, face_boxes, yaw, pitch, hands_near, turned_back, phones, hand_boxes, now):
+        """Boolean feature arrays for all faces of the frame; updates the glance and hand-hold history."""
+        n = len(slots)
+        glance = (np.abs(yaw) > self.glance_yaw) | (pitch < self.glance_pitch)
+        glance_counts = store.add_glances(slots[glance], now, self.glance_window)
+        frequent_glances = np.zeros(n, dtype=bool)
+        frequent_glances[glance] = glance_counts >= self.frequent_glance_count
+
+        started = store.hands_start[slots]
+        hands_held = hands_near & ~np.isnan(started) & (now - started > self.hands_held_seconds)
+        store.hands_start[slots] = np.where(hands_near, np.where(np.isnan(started), now, started), np.nan)
+
+        intersect = ~((phones[None, :, 2] < face_boxes[:, None, 0]) | (phones[None, :, 0] > face_boxes[:, None, 2])
+                      | (phones[None, :, 3] < face_boxes[:, None, 1]) | (phones[None, :, 1] > face_boxes[:, None, 3]))
+        near_hand = bool(len(hand_boxes) and self.near(phones, hand_boxes).any())
+        return {
+            "glance": glance,
+            "frequent_glances": frequent_glances,
+            "hands_near": hands_near,
+            "hands_held": hands_held,
+            "phone_intersect": intersect.any(axis=1),
+            "phone_near": self.near(face_boxes, phones).any(axis=1),
+            "phone_near_hand": np.full(n, near_hand),
+            "turned_back": turned_back,
+        }
+
+    # ======= Evaluation =======
+    def evaluate(self, features, store, slots, now):
+        """Apply every rule to all faces at once and update their scores.
+
+        Returns the (num_faces, num_rules) matrix of fired rules.
+        """
+        n = len(slots)
+        level = np.zeros(n)
+        suspicious = np.zeros(n, dtype=bool)
+        fired = np.zeros((n, len(self.rules)), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            mask = fired[:, i] = rule.condition(features)
+            if rule.op == "add":
+                level += rule.value * mask
+            else:
+                level = np.where(mask, rule.value, level)
+            if rule.suspicious:
+                suspicious |= mask
+
+        level = np.minimum(1.0, level)
+        score = store.score[slots] * (1 - self.alpha) + level * 100 * self.alpha
+        score = np.where(store.glance_count[slots] >= self.frequent_glance_count,
+                         np.minimum(100, score + self.frequent_glance_bonus), score)
+        decayed = np.maximum(0, score - self.decay_per_second * (now - store.last_suspicious[slots]))
+        score = np.where(suspicious, score, decayed)
+        store.last_suspicious[slots[suspicious]] = now
+        store.score[slots] = np.clip(score, 0, 100)
+        return fired
+
+
+class RuleEngine:
+    """Holds the current RuleSet and reloads it when the rules file changes.
+
+    The file's mtime is checked at most every `reload_seconds`. A file that no
+    longer parses keeps the previous rules in place.
+    """
+
+    def __init__(self, path=None, reload_seconds=None):
+        self.path = path or config.SCORING_RULES_PATH
+        self.reload_seconds = config.SCORING_RULES_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self._lock = threading.Lock()
+        self._mtime = os.path.getmtime(self.path)
+        self._rules = RuleSet.load(self.path)
+        self._checked = time.monotonic()
+
+    def current(self):
+        if self.reload_seconds > 0 and time.monotonic() - self._checked >= self.reload_seconds:
+            self._maybe_reload()
+        return self._rules
+
+    def _maybe_reload(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime == self._mtime:
+                    return
+                self._mtime = mtime
+                self._rules = RuleSet.load(self.path)
+                print(f"[RULES] Reloaded {len(self._rules.rules)} scoring rules from {self.path}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[RULES] Keeping previous scoring rules, could not load {self.path}: {e}")
+
+
+# Shared by every ScoreState unless one is given its own
+engine = RuleEngine()
@@ -1,20 +1,34 @@
 # utils/tracker.py
 
+import cv2
+import numpy as np
 from deep_sort_realtime.deepsort_tracker import DeepSort
 
+def create_tracker():
+    """Create an independent DeepSort tracker, e.g. one per camera stream."""
+    return DeepSort(max_age=30)  # You can tweak max_age and other params if needed
+
 # Initialize DeepSort tracker globally (do this once to keep track states)
-tracker = DeepSort(max_age=30)  # You can tweak max_age and other params if needed
+tracker = create_tracker()
 
-def get_tracked_faces(frame, detections):
+def get_tracked_faces(frame, detections, face_tracker=None, deleted=None):
     """
     Args:
         frame: Current video frame (numpy array).
         detections: List of detections in format [x1, y1, x2, y2, confidence].
+        face_tracker: DeepSort instance to update. Defaults to the global tracker.
+        deleted: Optional list; the ids of tracks DeepSort dropped in this update are appended to it.
 
     Returns:
         List of dicts: [{'id': track_id, 'bbox': [x1, y1, x2, y2]}, ...]
     """
-    tracks = tracker.update_tracks(detections, frame=frame)
+    if face_tracker is None:
+        face_tracker = tracker
+    known = {track.track_id for track in face_tracker.tracker.tracks} if deleted is not None else None
+    tracks = face_tracker.update_tracks(detections, frame=frame)
+    if deleted is not None:
+        # update_tracks returns the tracks DeepSort still holds; the rest were deleted
+        deleted.extend(known - {track.track_id for track in tracks})
 
     tracked_faces = []
     for track in tracks:
@@ -27,3 +41,45 @@ def get_tracked_faces(frame, detections):
             'bbox': bbox
         })
     return tracked_faces
+
+# === Optical-flow propagation between detector runs ===
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+def propagate_points(prev_gray, gray, points):
+    """Move (N, 2) points from prev_gray to gray with pyramidal Lucas-Kanade.
+
+    Returns (new_points, ok) where ok marks the points that were tracked.
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    if prev_gray is None or len(points) == 0:
+        return points, np.zeros(len(points), dtype=bool)
+    new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points.reshape(-1, 1, 2), None, **LK_PARAMS)
+    if new_points is None:
+        return points, np.zeros(len(points), dtype=bool)
+    return new_points.reshape(-1, 2), status.ravel() == 1
+
+def propagate_boxes(prev_gray, gray, boxes, max_corners=20):
+    """Shift each (x1, y1, x2, y2) box by the median flow of the corners found inside it."""
+    if prev_gray is None:
+        return list(boxes)
+    h, w = gray.shape[:2]
+    moved = []
+    for (x1, y1, x2, y2) in boxes:
+        if x2 <= x1 or y2 <= y1:
+            moved.append((x1, y1, x2, y2))
+            continue
+        corners = cv2.goodFeaturesToTrack(prev_gray[y1:y2, x1:x2], max_corners, 0.01, 3)
+        if corners is None:
+            moved.append((x1, y1, x2, y2))
+            continue
+        old = corners.reshape(-1, 2) + (x1, y1)
+        new, ok = propagate_points(prev_gray, gray, old)
+        if not ok.any():
+            moved.append((x1, y1, x2, y2))
+            continue
+        dx, dy = np.median(new[ok] - old[ok], axis=0)
+        dx = int(round(np.clip(dx, -x1, w - 1 - x2)))
+        dy = int(round(np.clip(dy, -y1, h - 1 - y2)))
+        moved.append((x1 + dx, y1 + dy, x2 + dx, y2 + dy))
+    return moved